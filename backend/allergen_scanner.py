@@ -0,0 +1,235 @@
+"""
+Allergen and aversion conflict scanner for generated plans.
+
+The user's allergens (with their ALLERGEN_KEYWORDS synonyms and every food
+of the food database tagged with them) and unwanted foods are compiled into
+one Aho-Corasick automaton. Names, ingredients and substitutions of every
+option are normalized and scanned as a single text in one linear pass;
+matches are mapped back to the day, meal and option they came from.
+Matches are whole words (Spanish plurals allowed), and "safe" phrases such
+as "leche de almendra" or "sin gluten" cancel the allergen they overlap.
+
+Automata are cached per (allergens, aversions) set, so users with the same
+restrictions share the compiled one.
+"""
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from recipe_library import ALLERGEN_KEYWORDS, normalize_text, user_allergens
+
+# Phrases that contain an allergen keyword but not the allergen
+SAFE_TERMS = {
+    "lactosa": ["leche de almendra", "leche de soya", "leche de coco", "leche de avena", "leche de arroz",
+                "leche vegetal", "deslactosada", "deslactosado", "crema de cacahuate", "crema de mani",
+                "crema de almendra", "yogur de coco", "yogurt de coco", "mantequilla de mani",
+                "mantequilla de cacahuate"],
+    "gluten": ["harina de almendra", "harina de coco", "harina de arroz", "harina de maiz", "tortilla de maiz",
+               "pan sin gluten", "pasta de arroz", "pasta de lenteja", "pasta de garbanzo"],
+    "huevo": ["huevo vegano"],
+}
+AUTOMATON_CACHE_SIZE = 256
+
+Label = Tuple[str, str]  # ("alergia" | "no_deseado" | "seguro", allergen or unwanted food)
+
+
+class Automaton:
+    """Aho-Corasick automaton over normalized terms, reporting whole-word matches"""
+
+    def __init__(self, terms: Iterable[Tuple[str, Label]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Label]]] = [[]]
+        for term, label in terms:
+            self._add(term, label)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def _add(self, term: str, label: Label):
+        state = 0
+        for char in term:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        if (len(term), label) not in self._out[state]:
+            self._out[state].append((len(term), label))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, Label]]:
+        """(start, end, label) of every whole-word match; `end` includes a plural suffix"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, label in self._out[state]:
+                start = i - length + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                end = _word_end(text, i + 1)
+                if end is not None:
+                    yield start, end, label
+
+
+def _word_end(text: str, end: int) -> Optional[int]:
+    for suffix in ("", "s", "es"):
+        stop = end + len(suffix)
+        if text.startswith(suffix, end) and (stop == len(text) or not text[stop].isalnum()):
+            return stop
+    return None
+
+
+def _aversion_terms(food: str) -> List[str]:
+    term = normalize_text(food)
+    terms = [term]
+    # "champiñones" must also match "champiñón"
+    if term.endswith("es") and len(term) > 4:
+        terms.append(term[:-2])
+    elif term.endswith("s") and len(term) > 3:
+        terms.append(term[:-1])
+    return terms
+
+
+class ConflictScanner:
+    """Flags options of plan_data that contain the user's allergens or unwanted foods"""
+
+    def __init__(self, family_terms: Optional[Dict[str, Iterable[str]]] = None):
+        # Extra terms per allergen, e.g. the foods of the food database tagged with it
+        self.family_terms = {a: sorted({normalize_text(t) for t in terms}) for a, terms in (family_terms or {}).items()}
+        self.automaton = lru_cache(maxsize=AUTOMATON_CACHE_SIZE)(self._compile)
+
+    def _compile(self, allergens: FrozenSet[str], aversions: FrozenSet[str]) -> Automaton:
+        terms: List[Tuple[str, Label]] = []
+        for allergen in sorted(allergens):
+            for term in set(ALLERGEN_KEYWORDS.get(allergen, [])) | set(self.family_terms.get(allergen, [])):
+                terms.append((normalize_text(term), ("alergia", allergen)))
+                terms.append((f"sin {normalize_text(term)}", ("seguro", allergen)))
+            for term in SAFE_TERMS.get(allergen, []):
+                terms.append((term, ("seguro", allergen)))
+        for food in sorted(aversions):
+            terms += [(term, ("no_deseado", food)) for term in _aversion_terms(food)]
+        return Automaton(t for t in terms if t[0].strip())
+
+    def automaton_for(self, q_data: dict) -> Optional[Automaton]:
+        allergens = frozenset(user_allergens(q_data.get("alergias") or []))
+        aversions = frozenset(normalize_text(f) for f in q_data.get("alimentos_no_deseados") or []
+                              if normalize_text(f) and normalize_text(f) != "ninguno")
+        if not allergens and not aversions:
+            return None
+        return self.automaton(allergens, aversions)
+
+    def scan(self, plan_data: dict, q_data: dict) -> List[dict]:
+        """Conflicts as {dia, tipo, opcion, campo, texto, termino, motivo, restriccion}, in plan order"""
+        automaton = self.automaton_for(q_data)
+        if automaton is None:
+            return []
+
+        # One text for the whole plan; segment offsets map matches back to their field
+        segments: List[Tuple[int, int, int, str, str]] = []
+        starts: List[int] = []
+        parts: List[str] = []
+        offset = 0
+        for day_number, day in enumerate(plan_data.get("dias") or [], start=1):
+            for meal_index, comida in enumerate(day.get("comidas") or []):
+                for option_index, option in enumerate(comida.get("opciones") or [comida]):
+                    if not isinstance(option, dict):
+                        continue
+                    for field, text in _option_texts(option):
+                        normalized = normalize_text(text)
+                        starts.append(offset)
+                        segments.append((day_number, meal_index, option_index, field, text))
+                        parts.append(normalized)
+                        offset += len(normalized) + 1
+        text = "\n".join(parts)
+
+        safe: Dict[str, List[Tuple[int, int]]] = {}
+        hits = []
+        for start, end, (kind, name) in automaton.finditer(text):
+            if kind == "seguro":
+                safe.setdefault(name, []).append((start, end))
+            else:
+                hits.append((start, end, kind, name))
+
+        conflicts, seen = [], set()
+        for start, end, kind, name in hits:
+            if kind == "alergia" and any(s <= start and end <= e for s, e in safe.get(name, [])):
+                continue
+            segment = bisect_right(starts, start) - 1
+            day_number, meal_index, option_index, field, original = segments[segment]
+            key = (segment, kind, name)
+            if key in seen:
+                continue
+            seen.add(key)
+            comida = plan_data["dias"][day_number - 1]["comidas"][meal_index]
+            conflicts.append({
+                "dia": day_number, "tipo": comida.get("tipo"), "opcion": option_index, "campo": field,
+                "texto": original, "termino": text[start:end], "motivo": kind, "restriccion": name,
+            })
+        return conflicts
+
+
+def _option_texts(option: dict) -> Iterator[Tuple[str, str]]:
+    if option.get("nombre"):
+        yield "nombre", str(option["nombre"])
+    for ingredient in option.get("ingredientes") or []:
+        yield "ingredientes", str(ingredient.get("item", "") if isinstance(ingredient, dict) else ingredient)
+    for substitution in option.get("sustituciones") or []:
+        # "Yogurt griego: kéfir natural" - only the alternative is offered to the user
+        yield "sustituciones", str(substitution).split(":", 1)[-1].strip()
+
+
+def remove_conflicts(plan_data: dict, conflicts: List[dict]) -> Dict[int, List[str]]:
+    """Drop conflicting options and substitutions in place; returns the meals left without options"""
+    options: Dict[Tuple[int, str], set] = {}
+    substitutions: Dict[Tuple[int, str, int], set] = {}
+    for conflict in conflicts:
+        key = (conflict["dia"], conflict["tipo"])
+        if conflict["campo"] == "sustituciones":
+            substitutions.setdefault(key + (conflict["opcion"],), set()).add(conflict["texto"])
+        else:
+            options.setdefault(key, set()).add(conflict["opcion"])
+
+    emptied: Dict[int, List[str]] = {}
+    for number, day in enumerate(plan_data.get("dias") or [], start=1):
+        for comida in day.get("comidas") or []:
+            opciones = comida.get("opciones")
+            for index, option in enumerate(opciones or []):
+                offending = substitutions.get((number, comida.get("tipo"), index))
+                if offending and isinstance(option, dict):
+                    option["sustituciones"] = [s for s in option.get("sustituciones") or []
+                                               if str(s).split(":", 1)[-1].strip() not in offending]
+            dropped = options.get((number, comida.get("tipo")))
+            if not dropped:
+                continue
+            kept = [o for i, o in enumerate(opciones or []) if i not in dropped]
+            if kept:
+                comida["opciones"] = kept
+            else:
+                emptied.setdefault(number, []).append(comida.get("tipo"))
+    return emptied
+
+
+def meals_with_conflicts(conflicts: List[dict]) -> Dict[int, List[str]]:
+    """Day number -> meal types with an allergen or unwanted food in a name or ingredient"""
+    meals: Dict[int, List[str]] = {}
+    for conflict in conflicts:
+        if conflict["campo"] != "sustituciones" and conflict["tipo"] not in meals.get(conflict["dia"], []):
+            meals.setdefault(conflict["dia"], []).append(conflict["tipo"])
+    return meals
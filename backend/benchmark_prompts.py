@@ -0,0 +1,202 @@
+"""
+Token and latency benchmark of the weekly plan prompts.
+
+Usage (from backend/):
+    python benchmark_prompts.py [--live | --standin] [--max-growth 0.05] [--no-save]
+
+Builds the days and recommendations requests of a few fixed sample profiles
+with the current templates (plan_prompts.PROMPT_VERSION) and counts prompt
+tokens: the static prefix, the per-user suffix, the total and the uncached
+tokens (billed at full price once the provider caches the prefix, which it
+only does from CACHEABLE_PREFIX_TOKENS on). With --live every request is
+also sent to the LLM (EMERGENT_LLM_KEY) to measure output tokens and
+latency; --standin sends them to the local stand-in provider instead, whose
+latency is simulated but whose output is a real plan in the wire schema.
+The saving of the compact wire schema is measured offline too: output
+tokens of a locally composed week in the full and the wire form, and the
+time to expand it back. Results are appended to data/prompt_benchmarks.jsonl
+and compared with the latest run of every other template version; the exit
+code is 1 when the mean uncached prompt grows more than --max-growth over the
+previous version.
+
+Without network access tiktoken cannot download the o200k_base encoding and
+counts are estimated; point TIKTOKEN_CACHE_DIR at a copy of the encoding file
+to count exactly.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from llm_client import LlmClient
+from llm_standin import StandInProvider
+from plan_composer import PlanComposer
+from plan_prompts import (
+    CACHEABLE_PREFIX_TOKENS, PLAN_SYSTEM_MESSAGE, PROMPT_VERSION, build_days_prompt, build_extras_prompt,
+    build_profile_prompt, count_tokens, tokenizer_name,
+)
+from plan_wire import compact_day, expand_day
+
+HISTORY_FILE = Path(__file__).parent / "data" / "prompt_benchmarks.jsonl"
+DAYS_PER_REQUEST = 2
+
+SAMPLE_PROFILES = [
+    ({"edad": 34, "sexo": "Femenino", "peso": 68, "estatura": 162, "objetivo_principal": "Bajar de peso",
+      "trabajo_oficina": True, "ejercicio_adicional": "Caminar", "dias_ejercicio": 3, "alergias": ["Ninguna"]},
+     1650, {"proteinas": 124, "carbohidratos": 165, "grasas": 55}),
+    ({"edad": 27, "sexo": "Masculino", "peso": 82, "estatura": 180, "objetivo_principal": "Ganar masa muscular",
+      "objetivos_secundarios": ["Mejorar rendimiento"], "trabajo_fisico": True, "ejercicio_adicional": "Pesas",
+      "dias_ejercicio": 5, "alergias": ["Lácteos"], "alimentos_no_deseados": ["Brócoli"],
+      "platillo_favorito": "Tacos", "frecuencia_restaurantes": "2 veces por semana", "ticket_promedio": 250},
+     2900, {"proteinas": 180, "carbohidratos": 360, "grasas": 80}),
+    ({"edad": 51, "sexo": "Femenino", "peso": 74, "estatura": 158, "objetivo_principal": "Mejorar salud",
+      "padecimientos": ["Hipertensión", "Prediabetes"], "medicamentos_controlados": True,
+      "lesiones_restricciones": ["Rodilla"], "descripcion_lesion": "Menisco operado", "vegetariano": True,
+      "alergias": ["Gluten"], "turnos_rotativos": True, "consume_alcohol": True, "frecuencia_alcohol": "Ocasional"},
+     1500, {"proteinas": 95, "carbohidratos": 160, "grasas": 52}),
+]
+
+
+def requests_for(q_data: dict, calories_target: int, macros: dict):
+    profile = build_profile_prompt(q_data, calories_target, macros)
+    yield "dias", PLAN_SYSTEM_MESSAGE, build_days_prompt(profile, list(range(1, DAYS_PER_REQUEST + 1)))
+    yield "extras", PLAN_SYSTEM_MESSAGE, build_extras_prompt(profile, q_data)
+
+
+def wire_savings(repeat: int = 200) -> dict:
+    """Output tokens of one composed week in the full and the wire schema, and the expansion time"""
+    _, calories_target, macros = SAMPLE_PROFILES[1]
+    week = [{"comidas": day["comidas"]} for day in PlanComposer().compose_days(calories_target, macros)]
+    wire = [compact_day(day) for day in week]
+    # The old template showed an indented example; the wire one asks for no indentation
+    full_tokens = count_tokens(json.dumps({"dias": week}, ensure_ascii=False, indent=2))
+    unindented_tokens = count_tokens(json.dumps({"dias": week}, ensure_ascii=False))
+    wire_tokens = count_tokens(json.dumps({"dias": wire}, ensure_ascii=False))
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        expanded = [expand_day(day) for day in wire]
+    expand_ms = (time.perf_counter() - started) / repeat * 1000
+    assert expanded == [{"comidas": day["comidas"]} for day in week]
+    return {
+        "full_output_tokens": full_tokens,
+        "full_unindented_tokens": unindented_tokens,
+        "wire_output_tokens": wire_tokens,
+        "saving": round(1 - wire_tokens / full_tokens, 3),
+        "expand_ms": round(expand_ms, 3),
+    }
+
+
+async def measure(backend: Optional[str]) -> dict:
+    client = None
+    if backend == "live":
+        client = LlmClient("openai", "gpt-5.2", os.environ.get("EMERGENT_LLM_KEY"))
+    elif backend == "standin":
+        client = StandInProvider("benchmark")
+    if client is not None:
+        await client.start(warm_up=True)
+
+    samples = []
+    try:
+        for q_data, calories_target, macros in SAMPLE_PROFILES:
+            for section, system_message, prompt in requests_for(q_data, calories_target, macros):
+                suffix = count_tokens(prompt)
+                sample = {"section": section, "prefix_tokens": count_tokens(system_message), "suffix_tokens": suffix}
+                sample["prompt_tokens"] = sample["prefix_tokens"] + suffix
+                cached = sample["prefix_tokens"] if sample["prefix_tokens"] >= CACHEABLE_PREFIX_TOKENS else 0
+                sample["uncached_tokens"] = sample["prompt_tokens"] - cached
+                if client is not None:
+                    chat = client.chat(f"benchmark-{PROMPT_VERSION}-{len(samples)}", system_message)
+                    started = time.monotonic()
+                    response = await chat.send_message(client.message(prompt))
+                    sample["latency_s"] = round(time.monotonic() - started, 2)
+                    sample["output_tokens"] = count_tokens(response)
+                samples.append(sample)
+    finally:
+        if client is not None:
+            await client.close()
+
+    def mean(key):
+        values = [s[key] for s in samples if key in s]
+        return round(statistics.mean(values), 1) if values else None
+
+    return {
+        "version": PROMPT_VERSION,
+        "tokenizer": tokenizer_name(),
+        "measured_at": datetime.now(timezone.utc).isoformat(),
+        "live": backend == "live",
+        "backend": f"{client.provider}/{client.model}" if client is not None else None,
+        "prompt_tokens": mean("prompt_tokens"),
+        "prefix_tokens": mean("prefix_tokens"),
+        "suffix_tokens": mean("suffix_tokens"),
+        "uncached_tokens": mean("uncached_tokens"),
+        "output_tokens": mean("output_tokens"),
+        "latency_s": mean("latency_s"),
+        "wire": wire_savings(),
+        "samples": samples,
+    }
+
+
+def load_history() -> list:
+    if not HISTORY_FILE.exists():
+        return []
+    with open(HISTORY_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def uncached_tokens(run: dict) -> float:
+    # Runs before the cacheable prefix did not record it: none of their prefixes reached the threshold
+    return run.get("uncached_tokens") or run["prompt_tokens"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt tokens and latency of the weekly plan templates")
+    backends = parser.add_mutually_exclusive_group()
+    backends.add_argument("--live", dest="backend", action="store_const", const="live",
+                          help="Send every request to the LLM to measure output and latency")
+    backends.add_argument("--standin", dest="backend", action="store_const", const="standin",
+                          help="Send every request to the local stand-in provider (simulated latency)")
+    parser.add_argument("--max-growth", type=float, default=0.05,
+                        help="Allowed growth of the mean prompt tokens over the previous version")
+    parser.add_argument("--no-save", action="store_true", help="Do not append the run to the history file")
+    args = parser.parse_args()
+
+    result = asyncio.run(measure(args.backend))
+    history = load_history()
+    if not args.no_save:
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    # Latest run per version, in first-seen order
+    latest = {}
+    for run in history + [result]:
+        latest.pop(run["version"], None)
+        latest[run["version"]] = run
+    print(f"{'version':18} {'tokenizer':11} {'prompt':>7} {'suffix':>7} {'uncached':>8} {'output':>7} {'latency':>8}")
+    for run in latest.values():
+        print(f"{run['version']:18} {run['tokenizer']:11} {run['prompt_tokens']:>7} {run['suffix_tokens'] or '-':>7} "
+              f"{uncached_tokens(run):>8} {run['output_tokens'] or '-':>7} {run['latency_s'] or '-':>8}")
+
+    wire = result["wire"]
+    print(f"Wire schema: {wire['wire_output_tokens']} output tokens per week instead of "
+          f"{wire['full_output_tokens']} ({wire['saving']:.1%} fewer; {wire['full_unindented_tokens']} with full "
+          f"keys and no indentation), expanded in {wire['expand_ms']} ms")
+
+    # Counts from different tokenizers are not comparable
+    previous = [run for version, run in latest.items()
+                if version != PROMPT_VERSION and run["tokenizer"] == result["tokenizer"]]
+    if previous and uncached_tokens(previous[-1]):
+        growth = uncached_tokens(result) / uncached_tokens(previous[-1]) - 1
+        print(f"Uncached prompt tokens vs {previous[-1]['version']}: {growth:+.1%}")
+        if growth > args.max_growth:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Local exercise catalog and routine builder for `guia_ejercicios`.
+
+Exercises (with technique notes written once) are indexed by muscle group,
+equipment (casa/gimnasio) and the body zones they load, so the routines for
+a user are a few set operations: questionnaire injuries map to zones, zones
+to excluded exercises, and every slot of a split day picks the least used
+remaining exercise of its group. Split, sets, reps and rest follow
+`dias_ejercicio` and the main goal.
+"""
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from recipe_library import normalize_text
+
+# Questionnaire injuries (normalized) -> zones whose exercises are excluded
+INJURY_ZONES = {
+    "lesion de rodilla": ("rodilla",),
+    "lesion de espalda": ("espalda",),
+    "lesion de hombro": ("hombro",),
+    "lesion de tobillo": ("tobillo",),
+    # Avoid intra-abdominal pressure and loaded spinal flexion
+    "hernia": ("abdomen", "espalda"),
+    "problema de cadera": ("cadera",),
+    "tendinitis": ("codo_muneca",),
+}
+LOW_IMPACT_ZONES = {"rodilla", "tobillo", "cadera"}
+
+
+def exercise(nombre, musculo, group, equipment, descripcion, tecnica, zones=(), timed=False) -> dict:
+    return {
+        "nombre": nombre, "musculo": musculo, "group": group, "equipment": tuple(equipment),
+        "descripcion": descripcion, "tecnica": tecnica, "zones": frozenset(zones), "timed": timed,
+    }
+
+
+CASA, GYM, BOTH = ("casa",), ("gimnasio",), ("casa", "gimnasio")
+
+EXERCISES = [
+    # Pecho
+    exercise("Lagartijas", "Pecho", "pecho", CASA, "Fortalece pecho, hombros y tríceps",
+             "Manos a la altura de los hombros, cuerpo en línea recta; baja controlado hasta casi tocar el suelo "
+             "y sube empujando fuerte", ("hombro", "codo_muneca")),
+    exercise("Lagartijas inclinadas", "Pecho", "pecho", CASA, "Versión más ligera de la lagartija",
+             "Apoya las manos en una silla firme o la orilla de la cama; baja el pecho hacia el borde con los codos "
+             "a 45 grados", ("codo_muneca",)),
+    exercise("Aperturas en el piso con botellas", "Pecho", "pecho", CASA, "Aísla el pecho con poco peso",
+             "Acostado boca arriba, brazos abiertos con los codos ligeramente flexionados; junta las botellas sobre "
+             "el pecho y baja hasta que los codos rocen el piso"),
+    exercise("Press de banca", "Pecho", "pecho", GYM, "Ejercicio principal para desarrollo de pecho",
+             "Agarre un poco más ancho que los hombros, escápulas juntas; baja la barra hasta el pecho y empuja de "
+             "forma explosiva", ("hombro", "codo_muneca")),
+    exercise("Press inclinado con mancuernas", "Pecho", "pecho", GYM, "Enfatiza la parte superior del pecho",
+             "Banco a 30 grados; baja las mancuernas a los lados del pecho y súbelas juntándolas sin chocar",
+             ("hombro",)),
+    exercise("Press de pecho en máquina", "Pecho", "pecho", GYM, "Empuje guiado y estable",
+             "Ajusta el asiento para que las manijas queden a media altura del pecho; empuja sin bloquear los codos "
+             "y regresa lento"),
+    exercise("Cruce de poleas", "Pecho", "pecho", GYM, "Aísla y define el pecho",
+             "Un pie adelante, torso ligeramente inclinado; junta las manos frente al pecho en un arco amplio",
+             ("hombro",)),
+    # Espalda
+    exercise("Superman", "Espalda baja", "espalda", CASA, "Fortalece la cadena posterior",
+             "Boca abajo, eleva brazos y piernas a la vez sin forzar el cuello; sostén 2 segundos y baja lento",
+             ("espalda",)),
+    exercise("Remo con mochila", "Espalda", "espalda", CASA, "Trabaja dorsales y romboides",
+             "Inclina el torso con la espalda recta, jala la mochila hacia el ombligo juntando las escápulas",
+             ("espalda",)),
+    exercise("Remo invertido en mesa", "Espalda", "espalda", CASA, "Jalón con el peso corporal",
+             "Acostado bajo una mesa firme, toma el borde y jala el pecho hacia ella con el cuerpo recto",
+             ("hombro", "codo_muneca")),
+    exercise("Remo con banda elástica", "Espalda", "espalda", CASA, "Jalón horizontal de bajo impacto",
+             "Sentado con la banda en los pies, jala los codos hacia atrás pegados al cuerpo y aprieta las escápulas"),
+    exercise("Jalón al pecho", "Espalda", "espalda", GYM, "Desarrolla la amplitud de la espalda",
+             "Agarre ancho, pecho hacia arriba; baja la barra a la parte alta del pecho llevando los codos hacia abajo",
+             ("hombro",)),
+    exercise("Remo sentado en polea", "Espalda", "espalda", GYM, "Grosor de espalda con el torso apoyado",
+             "Espalda recta y pecho arriba; jala el maneral al abdomen y regresa estirando sin redondear"),
+    exercise("Remo con mancuerna a una mano", "Espalda", "espalda", GYM, "Trabajo unilateral de dorsales",
+             "Rodilla y mano apoyadas en el banco; sube la mancuerna hacia la cadera sin girar el torso"),
+    # Hombros
+    exercise("Flexiones en pica", "Hombros", "hombros", CASA, "Empuje vertical con el peso corporal",
+             "Cadera arriba formando una V invertida; baja la cabeza entre las manos y empuja de regreso",
+             ("hombro", "codo_muneca")),
+    exercise("Elevaciones laterales con botellas", "Hombros", "hombros", CASA, "Da forma al hombro",
+             "Codos ligeramente flexionados; sube los brazos a los lados hasta la altura de los hombros, sin impulso",
+             ("hombro",)),
+    exercise("Aperturas posteriores con banda", "Hombro posterior", "hombros", CASA, "Mejora la postura",
+             "Brazos al frente a la altura del pecho; abre la banda llevando las manos hacia los lados"),
+    exercise("Press militar con mancuernas", "Hombros", "hombros", GYM, "Fuerza de empuje sobre la cabeza",
+             "Sentado con la espalda apoyada; sube las mancuernas sobre la cabeza sin arquear la zona lumbar",
+             ("hombro", "espalda")),
+    exercise("Elevaciones laterales con mancuernas", "Hombros", "hombros", GYM, "Amplitud del hombro",
+             "Sube hasta la altura de los hombros con los meñiques ligeramente arriba; baja en 3 segundos",
+             ("hombro",)),
+    exercise("Face pull en polea", "Hombro posterior", "hombros", GYM, "Salud del hombro y postura",
+             "Polea a la altura de la cara; jala la cuerda hacia los ojos abriendo los codos hacia afuera"),
+    # Bíceps
+    exercise("Curl de bíceps con mochila", "Bíceps", "biceps", CASA, "Fortalece los bíceps",
+             "Codos pegados al cuerpo; sube la mochila sin balancear el torso y baja lento", ("codo_muneca",)),
+    exercise("Curl con banda elástica", "Bíceps", "biceps", CASA, "Tensión constante en el bíceps",
+             "Pisa la banda, palmas al frente; flexiona los codos sin separarlos del cuerpo", ("codo_muneca",)),
+    exercise("Curl de bíceps con mancuernas", "Bíceps", "biceps", GYM, "Volumen de brazo",
+             "Alterna los brazos girando la palma hacia arriba al subir; no muevas los codos", ("codo_muneca",)),
+    exercise("Curl martillo", "Bíceps y antebrazo", "biceps", GYM, "Braquial y antebrazo",
+             "Palmas enfrentadas durante todo el movimiento; sube hasta el hombro y baja controlado",
+             ("codo_muneca",)),
+    # Tríceps
+    exercise("Fondos en silla", "Tríceps", "triceps", CASA, "Tríceps con el peso corporal",
+             "Manos en el borde de una silla firme; baja doblando los codos hacia atrás hasta 90 grados",
+             ("hombro", "codo_muneca")),
+    exercise("Extensión de tríceps con botella", "Tríceps", "triceps", CASA, "Aísla el tríceps",
+             "Sostén la botella detrás de la cabeza con ambas manos; extiende los codos sin abrirlos",
+             ("hombro", "codo_muneca")),
+    exercise("Patada de tríceps con banda", "Tríceps", "triceps", CASA, "Tríceps con bajo impacto articular",
+             "Torso inclinado, codo pegado a la costilla; extiende el brazo hacia atrás y aprieta 1 segundo"),
+    exercise("Extensión de tríceps en polea", "Tríceps", "triceps", GYM, "Aísla el tríceps",
+             "Codos fijos a los costados; empuja la cuerda hacia abajo separando las puntas al final",
+             ("codo_muneca",)),
+    exercise("Press francés con mancuerna", "Tríceps", "triceps", GYM, "Cabeza larga del tríceps",
+             "Acostado en banco, baja la mancuerna detrás de la cabeza doblando solo los codos",
+             ("hombro", "codo_muneca")),
+    # Piernas
+    exercise("Sentadillas", "Piernas", "piernas", CASA, "Fortalece cuádriceps y glúteos",
+             "Pies al ancho de hombros; baja como si te sentaras, rodillas en dirección de las puntas, pecho arriba",
+             ("rodilla", "cadera")),
+    exercise("Zancadas", "Piernas", "piernas", CASA, "Fuerza y equilibrio de piernas",
+             "Da un paso largo y baja hasta que ambas rodillas queden a 90 grados; regresa empujando con el talón",
+             ("rodilla", "tobillo", "cadera")),
+    exercise("Sentadilla isométrica en pared", "Cuádriceps", "piernas", CASA, "Resistencia sin impacto",
+             "Espalda pegada a la pared, rodillas a 90 grados por encima de los tobillos; sostén respirando",
+             ("rodilla",), timed=True),
+    exercise("Sentadilla con barra", "Piernas", "piernas", GYM, "Ejercicio base de tren inferior",
+             "Barra sobre los trapecios, abdomen firme; baja hasta muslos paralelos y sube empujando el piso",
+             ("rodilla", "espalda", "cadera", "abdomen")),
+    exercise("Prensa de piernas", "Piernas", "piernas", GYM, "Fuerza de piernas con la espalda apoyada",
+             "Pies al ancho de cadera en la plataforma; baja hasta 90 grados sin despegar la zona lumbar",
+             ("rodilla", "cadera")),
+    exercise("Extensión de cuádriceps", "Cuádriceps", "piernas", GYM, "Aísla el cuádriceps",
+             "Ajusta el respaldo para que la rodilla quede en el eje; extiende y baja en 3 segundos", ("rodilla",)),
+    exercise("Elevación de talones", "Pantorrillas", "piernas", BOTH, "Fortalece pantorrillas y tobillo",
+             "De pie en la orilla de un escalón; sube en puntas, sostén 1 segundo y baja lento", ("tobillo",)),
+    # Glúteos y femoral
+    exercise("Puente de glúteo", "Glúteos", "gluteos", CASA, "Activa glúteos y protege la espalda baja",
+             "Boca arriba con rodillas flexionadas; sube la cadera apretando glúteos hasta alinear rodillas y hombros"),
+    exercise("Patada de glúteo en cuadrupedia", "Glúteos", "gluteos", CASA, "Aísla el glúteo mayor",
+             "En cuatro puntos, abdomen firme; empuja un talón hacia el techo sin arquear la espalda"),
+    exercise("Abducción de cadera acostado", "Glúteo medio", "gluteos", CASA, "Estabilidad de cadera y rodilla",
+             "Acostado de lado, pierna de arriba estirada; elévala sin girar la cadera y baja lento"),
+    exercise("Hip thrust con barra", "Glúteos", "gluteos", GYM, "Máxima activación de glúteos",
+             "Espalda alta en el banco, barra sobre la cadera; sube hasta alinear el torso y aprieta arriba",
+             ("cadera",)),
+    exercise("Peso muerto rumano", "Femoral y glúteos", "gluteos", GYM, "Cadena posterior",
+             "Rodillas semiflexionadas, lleva la cadera atrás bajando la barra pegada a las piernas con espalda recta",
+             ("espalda", "abdomen")),
+    exercise("Curl femoral en máquina", "Femoral", "gluteos", GYM, "Aísla los isquiotibiales",
+             "Rodillas alineadas con el eje; flexiona llevando los talones a los glúteos y regresa lento",
+             ("rodilla",)),
+    exercise("Abductores en máquina", "Glúteo medio", "gluteos", GYM, "Estabilidad de cadera",
+             "Espalda apoyada; abre las piernas contra la resistencia y cierra controlado"),
+    # Core
+    exercise("Plancha", "Core", "core", BOTH, "Estabiliza abdomen y espalda baja",
+             "Antebrazos bajo los hombros, cuerpo recto de cabeza a talones; aprieta abdomen y glúteos",
+             ("hombro", "abdomen"), timed=True),
+    exercise("Plancha lateral", "Oblicuos", "core", BOTH, "Estabilidad lateral del tronco",
+             "Codo bajo el hombro, cadera elevada en línea recta; cambia de lado a mitad del tiempo",
+             ("hombro",), timed=True),
+    exercise("Bird dog", "Core y espalda baja", "core", BOTH, "Estabilidad sin cargar la columna",
+             "En cuatro puntos, estira brazo y pierna contrarios manteniendo la espalda plana; alterna"),
+    exercise("Dead bug", "Core", "core", BOTH, "Abdomen profundo con la espalda protegida",
+             "Boca arriba, brazos y rodillas a 90 grados; baja brazo y pierna contrarios sin despegar la espalda baja"),
+    exercise("Crunch abdominal", "Abdomen", "core", BOTH, "Fortalece el recto abdominal",
+             "Rodillas flexionadas, manos junto a las sienes; eleva los hombros exhalando, sin jalar el cuello",
+             ("abdomen", "espalda")),
+    exercise("Elevación de piernas", "Abdomen bajo", "core", BOTH, "Abdomen inferior",
+             "Boca arriba con manos bajo la cadera; sube las piernas juntas y baja sin tocar el piso",
+             ("abdomen", "espalda", "cadera")),
+    # Cardio
+    exercise("Jumping jacks", "Cardio", "cardio", CASA, "Eleva la frecuencia cardiaca",
+             "Salta abriendo piernas y brazos a la vez; aterriza suave con las rodillas ligeramente flexionadas",
+             ("rodilla", "tobillo"), timed=True),
+    exercise("Mountain climbers", "Cardio y core", "cardio", CASA, "Cardio intenso con trabajo de core",
+             "En posición de lagartija, lleva las rodillas al pecho alternando rápido sin subir la cadera",
+             ("hombro", "codo_muneca", "cadera"), timed=True),
+    exercise("Marcha rápida en el lugar", "Cardio", "cardio", CASA, "Cardio de bajo impacto",
+             "Sube las rodillas a la altura de la cadera y mueve los brazos al ritmo; mantén el abdomen firme",
+             timed=True),
+    exercise("Bicicleta estática", "Cardio", "cardio", GYM, "Cardio de bajo impacto",
+             "Asiento a la altura de la cadera; pedalea a ritmo constante en el que puedas hablar con esfuerzo",
+             timed=True),
+    exercise("Elíptica", "Cardio", "cardio", GYM, "Cardio sin impacto articular",
+             "Espalda recta, empuja y jala con brazos y piernas a ritmo constante", timed=True),
+    exercise("Remo ergómetro", "Cardio y espalda", "cardio", GYM, "Cardio de cuerpo completo",
+             "Empuja primero con las piernas, luego inclina el torso y al final jala con los brazos",
+             ("espalda",), timed=True),
+]
+
+
+# Split day: (title, goal, benefits, muscle group per slot, tip)
+FULL_A = ("Cuerpo Completo A", "Trabajar todo el cuerpo con ejercicios básicos para ganar fuerza general",
+          ["Mejora la fuerza funcional", "Acelera el metabolismo", "Ideal para pocos días por semana"],
+          ["piernas", "pecho", "espalda", "gluteos", "core"], "Calienta 5 minutos antes de comenzar")
+FULL_B = ("Cuerpo Completo B", "Combinar empuje, jalón y cadera para un estímulo equilibrado",
+          ["Equilibra la musculatura", "Mejora la postura", "Quema más calorías"],
+          ["gluteos", "espalda", "hombros", "piernas", "core"], "Descansa al menos un día entre rutinas completas")
+FULL_C = ("Cuerpo Completo C", "Reforzar piernas, pecho y brazos manteniendo el core activo",
+          ["Fortalece brazos", "Mejora la resistencia", "Tonifica piernas"],
+          ["piernas", "pecho", "biceps", "triceps", "gluteos", "core"], "Prioriza la técnica sobre el peso")
+UPPER = ("Tren Superior", "Fortalecer pecho, espalda, hombros y brazos para mejorar postura y fuerza",
+         ["Mejora la postura", "Aumenta fuerza en brazos", "Tonifica pecho y hombros"],
+         ["pecho", "espalda", "hombros", "espalda", "biceps", "triceps"], "Mantén el core activado en cada ejercicio")
+LOWER = ("Tren Inferior", "Desarrollar piernas y glúteos, los músculos que más energía consumen",
+         ["Aumenta el gasto calórico", "Protege rodillas y cadera", "Mejora el equilibrio"],
+         ["piernas", "gluteos", "piernas", "gluteos", "core"], "Empuja con los talones y controla la bajada")
+PUSH = ("Pecho, Hombros y Tríceps", "Trabajar los músculos de empuje del tren superior",
+        ["Fuerza de empuje", "Define pecho y hombros", "Brazos más firmes"],
+        ["pecho", "pecho", "hombros", "hombros", "triceps"], "Calienta los hombros con peso ligero antes de cargar")
+PULL = ("Espalda y Bíceps", "Trabajar los músculos de jalón para una espalda fuerte",
+        ["Mejora la postura", "Espalda más amplia", "Previene dolor de espalda"],
+        ["espalda", "espalda", "hombros", "biceps", "core"], "Junta las escápulas al final de cada jalón")
+LEGS = ("Piernas y Glúteos", "Fortalecer el tren inferior completo",
+        ["Fuerza en piernas", "Glúteos más firmes", "Mayor gasto calórico"],
+        ["piernas", "gluteos", "piernas", "gluteos", "core"], "Estira cuádriceps y femorales al terminar")
+
+SPLITS = {
+    1: [FULL_A],
+    2: [FULL_A, FULL_B],
+    3: [FULL_A, FULL_B, FULL_C],
+    4: [UPPER, LOWER, UPPER, LOWER],
+    5: [PUSH, PULL, LEGS, UPPER, LOWER],
+    6: [PUSH, PULL, LEGS, PUSH, PULL, LEGS],
+}
+MIN_DAYS, MAX_DAYS, DEFAULT_DAYS = 2, 6, 3
+MIN_EXERCISES = 3
+FILLER_GROUPS = ("core", "gluteos", "cardio")
+WARMUP_SECONDS, SET_SECONDS = 300, 40
+
+GOAL_PARAMS = {
+    "aumentar masa muscular": {
+        "series": 4, "repeticiones": "8-12", "descanso": 90, "segundos": 30, "cardio_slot": False,
+        "cardio": "20 minutos de caminata o bicicleta 2 veces por semana, sin restar de tus entrenamientos de fuerza",
+    },
+    "bajar de peso": {
+        "series": 3, "repeticiones": "12-15", "descanso": 45, "segundos": 40, "cardio_slot": True,
+        "cardio": "30-40 minutos de cardio moderado (caminata rápida, bicicleta o elíptica) 3-4 veces por semana",
+    },
+    "control de peso": {
+        "series": 3, "repeticiones": "10-12", "descanso": 60, "segundos": 30, "cardio_slot": False,
+        "cardio": "30 minutos de caminata o trote ligero 3 veces por semana",
+    },
+}
+DEFAULT_GOAL = "control de peso"
+
+
+class ExerciseCatalog:
+    """EXERCISES indexed by (group, equipment) and by loaded zone"""
+
+    def __init__(self, exercises: List[dict] = EXERCISES):
+        self.exercises = exercises
+        self._by_slot: Dict[Tuple[str, str], List[int]] = {}
+        self._by_zone: Dict[str, Set[int]] = {}
+        for index, item in enumerate(exercises):
+            for equipment in item["equipment"]:
+                self._by_slot.setdefault((item["group"], equipment), []).append(index)
+            for zone in item["zones"]:
+                self._by_zone.setdefault(zone, set()).add(index)
+
+    def excluded(self, zones: Iterable[str]) -> FrozenSet[int]:
+        """Exercises that load any of the zones"""
+        excluded: Set[int] = set()
+        for zone in zones:
+            excluded |= self._by_zone.get(zone, set())
+        return frozenset(excluded)
+
+    def candidates(self, group: str, equipment: str, excluded: FrozenSet[int] = frozenset()) -> List[int]:
+        return [i for i in self._by_slot.get((group, equipment), []) if i not in excluded]
+
+
+CATALOG = ExerciseCatalog()
+
+
+def injury_zones(lesiones: Iterable[str]) -> Set[str]:
+    zones: Set[str] = set()
+    for lesion in lesiones or []:
+        zones.update(INJURY_ZONES.get(normalize_text(lesion), ()))
+    return zones
+
+
+def _routine(catalog: ExerciseCatalog, number: int, split: tuple, equipment: str,
+             excluded: FrozenSet[int], params: dict, uses: Dict[int, int]) -> dict:
+    title, objetivo_rutina, beneficios, groups, tips = split
+    groups = list(groups) + (["cardio"] if params["cardio_slot"] else [])
+
+    chosen: List[int] = []
+
+    def take(group: str) -> bool:
+        options = [i for i in catalog.candidates(group, equipment, excluded) if i not in chosen]
+        if not options:
+            return False
+        # Least used so far, then catalog order: rotates exercises across the week
+        pick = min(options, key=lambda i: (uses.get(i, 0), i))
+        chosen.append(pick)
+        uses[pick] = uses.get(pick, 0) + 1
+        return True
+
+    for group in groups:
+        take(group)
+    # Injuries can empty whole groups; top up with the safest ones
+    for group in FILLER_GROUPS:
+        while len(chosen) < MIN_EXERCISES and take(group):
+            pass
+
+    ejercicios = []
+    for index in chosen:
+        item = catalog.exercises[index]
+        ejercicios.append({
+            "nombre": item["nombre"],
+            "series": params["series"],
+            "repeticiones": f"{params['segundos']} seg" if item["timed"] else params["repeticiones"],
+            "descanso": f"{params['descanso']} seg",
+            "musculo": item["musculo"],
+            "descripcion": item["descripcion"],
+            "tecnica": item["tecnica"],
+        })
+    seconds = WARMUP_SECONDS + len(ejercicios) * params["series"] * (SET_SECONDS + params["descanso"])
+    return {
+        "dia": f"Día {number} - {title}",
+        "objetivo_rutina": objetivo_rutina,
+        "beneficios": beneficios,
+        "ejercicios": ejercicios,
+        "duracion": f"{max(15, 5 * round(seconds / 300))} min",
+        "tips": tips,
+    }
+
+
+def build_exercise_guide(q_data: dict, catalog: ExerciseCatalog = CATALOG,
+                         max_routines: Optional[int] = None) -> dict:
+    """`guia_ejercicios` for a questionnaire: home and gym routines for the user's days, goal and injuries"""
+    objetivo = q_data.get("objetivo_principal") or "Control de peso"
+    params = GOAL_PARAMS.get(normalize_text(objetivo), GOAL_PARAMS[DEFAULT_GOAL])
+    days = min(max(int(q_data.get("dias_ejercicio") or DEFAULT_DAYS), MIN_DAYS), MAX_DAYS)
+
+    lesiones = [l for l in q_data.get("lesiones_restricciones") or [] if normalize_text(l) != "ninguna"]
+    zones = injury_zones(lesiones)
+    excluded = catalog.excluded(zones)
+
+    split = SPLITS[days][:max_routines] if max_routines else SPLITS[days]
+    guide = {
+        "descripcion": f"Guía de ejercicios para {objetivo.lower()}",
+        "dias_recomendados": days,
+        "rutina_casa": [],
+        "rutina_gimnasio": [],
+        "cardio_recomendado": params["cardio"],
+    }
+    for equipment, key in (("casa", "rutina_casa"), ("gimnasio", "rutina_gimnasio")):
+        uses: Dict[int, int] = {}
+        guide[key] = [_routine(catalog, number, day, equipment, excluded, params, uses)
+                      for number, day in enumerate(split, start=1)]
+
+    if lesiones:
+        guide["nota_lesiones"] = f"Ejercicios adaptados considerando: {', '.join(lesiones)}"
+        if zones & LOW_IMPACT_ZONES:
+            guide["cardio_recomendado"] += ". Prefiere opciones de bajo impacto como bicicleta, elíptica o natación"
+    return guide
@@ -0,0 +1,206 @@
+"""
+Food composition database with fuzzy Spanish ingredient lookup.
+
+`data/foods.csv` lists foods (with aliases) and their kcal, protein, carbs
+and fat per 100 g, the weight of one piece, allergens and shopping category. It is compiled
+into column-oriented NumPy files that are opened with mmap_mode="r", so
+every uvicorn worker maps the same pages instead of parsing and holding its
+own copy, and startup is just an open(). Names are matched with a trigram
+index (Dice coefficient), which tolerates missing accents, plurals, typos and
+extra words such as quantities: "150g de pechuga de pollo a la plancha".
+
+Rebuild after editing the CSV (also done automatically when it is newer):
+    python food_db.py build
+"""
+import csv
+import json
+import os
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from recipe_library import ALLERGEN_KEYWORDS, normalize_text
+
+DATA_DIR = Path(__file__).parent / "data"
+SOURCE_FILE = "foods.csv"
+VALUES_FILE = "foods_values.npy"        # float32 (foods, len(COLUMNS))
+ALLERGENS_FILE = "foods_allergens.npy"  # uint8 bitmask (foods,), bit order of ALLERGENS
+CATEGORIES_FILE = "foods_categories.npy"  # uint8 (foods,), index into CATEGORIES
+NAMES_FILE = "foods_names.json"         # aliases per food, first one is the display name
+
+COLUMNS = ("kcal", "proteinas", "carbohidratos", "grasas", "gramos_pieza")
+ALLERGENS = tuple(ALLERGEN_KEYWORDS)
+# Ingredient names come from LLM output, so the memo of their matches is bounded
+MATCH_CACHE_SIZE = 4096
+# Shopping list sections, in display order
+CATEGORIES = ("proteinas", "lacteos", "cereales", "verduras", "frutas", "grasas_semillas", "basicos")
+
+QUANTITY_WORDS = {
+    "g", "gr", "grs", "gramo", "gramos", "kg", "ml", "l", "litro", "litros", "taza", "tazas", "cda", "cdas",
+    "cucharada", "cucharadas", "cdita", "cditas", "cucharadita", "cucharaditas", "pieza", "piezas", "pza",
+    "pzas", "rebanada", "rebanadas", "lata", "latas", "porcion", "porciones", "puno", "punado", "al", "gusto",
+}
+
+
+def normalize_food_name(text: str) -> str:
+    """Food name without quantities, units or notes in parentheses"""
+    text = normalize_text(re.sub(r"\(.*?\)", " ", str(text)))
+    words = re.findall(r"[a-z]+", text)
+    words = [w for w in words if w not in QUANTITY_WORDS]
+    # Leading "de" after a quantity: "150 g de pollo"
+    while words and words[0] in ("de", "del"):
+        words.pop(0)
+    return " ".join(words)
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def build(data_dir: Path = DATA_DIR) -> int:
+    """Compile foods.csv into the memory-mappable files; returns the number of foods"""
+    data_dir = Path(data_dir)
+    values, allergen_bits, categories, names = [], [], [], []
+    with open(data_dir / SOURCE_FILE, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            names.append([name.strip() for name in row["nombres"].split("|") if name.strip()])
+            values.append([float(row[column] or 0) for column in COLUMNS])
+            bits = 0
+            for allergen in filter(None, (a.strip() for a in row["alergenos"].split("|"))):
+                bits |= 1 << ALLERGENS.index(allergen)
+            allergen_bits.append(bits)
+            categories.append(CATEGORIES.index(row.get("categoria") or "basicos"))
+
+    # Write to temporary files and rename, so workers starting concurrently never map a partial file
+    outputs = (
+        (VALUES_FILE, np.array(values, dtype=np.float32)),
+        (ALLERGENS_FILE, np.array(allergen_bits, dtype=np.uint8)),
+        (CATEGORIES_FILE, np.array(categories, dtype=np.uint8)),
+    )
+    for name, array in outputs:
+        tmp = data_dir / f".{name}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, data_dir / name)
+    tmp = data_dir / f".{NAMES_FILE}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(names, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, data_dir / NAMES_FILE)
+    return len(names)
+
+
+def _is_stale(data_dir: Path) -> bool:
+    source = data_dir / SOURCE_FILE
+    compiled = [data_dir / name for name in (VALUES_FILE, ALLERGENS_FILE, CATEGORIES_FILE, NAMES_FILE)]
+    if not all(path.exists() for path in compiled):
+        return True
+    return source.exists() and source.stat().st_mtime > min(path.stat().st_mtime for path in compiled)
+
+
+class FoodDatabase:
+    """Memory-mapped nutrient columns plus an in-memory trigram index over food aliases"""
+
+    def __init__(self, data_dir: Path = DATA_DIR):
+        data_dir = Path(data_dir)
+        if _is_stale(data_dir):
+            build(data_dir)
+        self.values = np.load(data_dir / VALUES_FILE, mmap_mode="r")
+        self.allergen_bits = np.load(data_dir / ALLERGENS_FILE, mmap_mode="r")
+        self.categories = np.load(data_dir / CATEGORIES_FILE, mmap_mode="r")
+        self.aliases: List[List[str]] = json.loads((data_dir / NAMES_FILE).read_text(encoding="utf-8"))
+
+        alias_food, alias_names = [], []
+        for food_id, names in enumerate(self.aliases):
+            for name in names:
+                alias_food.append(food_id)
+                alias_names.append(normalize_food_name(name))
+        self._alias_food = np.array(alias_food, dtype=np.int32)
+        self._exact: Dict[str, int] = {}
+        for name, food_id in zip(alias_names, alias_food):
+            self._exact.setdefault(name, food_id)
+
+        postings: Dict[str, List[int]] = {}
+        sizes = []
+        for alias_id, name in enumerate(alias_names):
+            grams = set(trigrams(name))
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(alias_id)
+        self._alias_sizes = np.array(sizes, dtype=np.float32)
+        self._index = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._match = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._lookup_match)
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+    def food(self, food_id: int, score: float = 1.0) -> dict:
+        row = self.values[food_id]
+        bits = int(self.allergen_bits[food_id])
+        food = {"id": food_id, "nombre": self.aliases[food_id][0], "score": round(float(score), 3)}
+        food.update({column: float(row[i]) for i, column in enumerate(COLUMNS)})
+        food["alergenos"] = [allergen for i, allergen in enumerate(ALLERGENS) if bits & (1 << i)]
+        food["categoria"] = CATEGORIES[int(self.categories[food_id])]
+        return food
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.3) -> List[dict]:
+        """Best matching foods for a free-text ingredient, best first"""
+        name = normalize_food_name(query)
+        if not name:
+            return []
+
+        grams = set(trigrams(name))
+        shared = np.zeros(len(self._alias_food), dtype=np.float32)
+        for gram in grams:
+            ids = self._index.get(gram)
+            if ids is not None:
+                shared[ids] += 1
+        dice = 2 * shared / (len(grams) + self._alias_sizes)
+
+        scores = np.zeros(len(self.aliases), dtype=np.float32)
+        np.maximum.at(scores, self._alias_food, dice)
+        exact = self._exact.get(name)
+        if exact is not None:
+            scores[exact] = 1.0
+
+        best = np.argsort(-scores, kind="stable")[:limit]
+        return [self.food(int(i), scores[i]) for i in best if scores[i] >= min_score]
+
+    def lookup(self, query: str, min_score: float = 0.45) -> Optional[dict]:
+        matches = self.search(query, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
+    def match(self, name: str) -> Optional[Tuple[int, float]]:
+        """(food id, grams per piece) for an ingredient name, memoized per database (MATCH_CACHE_SIZE names)"""
+        return self._match(name.strip().lower())
+
+    def _lookup_match(self, key: str) -> Optional[Tuple[int, float]]:
+        food = self.lookup(key) if key else None
+        return (food["id"], food["gramos_pieza"]) if food else None
+
+    def allergen_aliases(self) -> Dict[str, List[str]]:
+        """Allergen -> names of every food tagged with it"""
+        aliases: Dict[str, List[str]] = {allergen: [] for allergen in ALLERGENS}
+        for food_id, names in enumerate(self.aliases):
+            bits = int(self.allergen_bits[food_id])
+            for i, allergen in enumerate(ALLERGENS):
+                if bits & (1 << i):
+                    aliases[allergen].extend(names)
+        return aliases
+
+    def nutrition(self, food_id: int, grams: float) -> Dict[str, float]:
+        """kcal and macros for `grams` of a food"""
+        row = self.values[food_id]
+        return {column: round(float(row[i]) * grams / 100, 1) for i, column in enumerate(COLUMNS[:4])}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["build"]:
+        print(f"Built food database with {build()} foods in {DATA_DIR}")
+    else:
+        db = FoodDatabase()
+        for match in db.search(" ".join(sys.argv[1:]) or "pechuga de pollo"):
+            print(match)
@@ -0,0 +1,118 @@
+"""
+Parsing of the free-text ingredient quantities found in generated recipes.
+
+Quantities come as "150g", "1/2 taza (40g)", "1 1/2 piezas", "3-4 gotas",
+"1 lata", "al gusto"... parse_quantity() returns the amount in a canonical
+unit; grams_for() converts it to grams, preferring an explicit weight in
+parentheses and otherwise using household measures and the weight of one
+piece of the food when it is known. Parsing is memoized: weekly plans repeat
+the same few hundred quantity strings.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+from recipe_library import normalize_text
+
+
+class Quantity(NamedTuple):
+    amount: Optional[float]  # None for "al gusto" and other non-numeric quantities
+    unit: Optional[str]      # canonical unit from UNITS, None for bare counts
+    grams: Optional[float]   # explicit weight in the text, e.g. "(40g)"
+
+
+# Canonical unit -> spellings (normalized, no accents)
+UNITS = {
+    "g": ("g", "gr", "grs", "gramo", "gramos"),
+    "kg": ("kg", "kilo", "kilos", "kilogramo", "kilogramos"),
+    "ml": ("ml", "mililitro", "mililitros"),
+    "l": ("l", "lt", "litro", "litros"),
+    "taza": ("taza", "tazas"),
+    "cda": ("cda", "cdas", "cucharada", "cucharadas"),
+    "cdita": ("cdita", "cditas", "cucharadita", "cucharaditas"),
+    "pieza": ("pieza", "piezas", "pza", "pzas", "unidad", "unidades"),
+    "rebanada": ("rebanada", "rebanadas"),
+    "lata": ("lata", "latas"),
+    "gota": ("gota", "gotas"),
+    "pizca": ("pizca", "pizcas"),
+    "diente": ("diente", "dientes"),
+    "puno": ("puno", "punos", "punado", "punados"),
+}
+UNIT_ALIASES = {spelling: unit for unit, spellings in UNITS.items() for spelling in spellings}
+
+# Approximate grams (or ml, taken as grams) of one household unit
+UNIT_GRAMS = {
+    "g": 1, "kg": 1000, "ml": 1, "l": 1000, "taza": 240, "cda": 15, "cdita": 5, "lata": 140,
+    "gota": 0.05, "pizca": 0.5, "diente": 4, "puno": 30,
+}
+DEFAULT_PIECE_GRAMS = {"pieza": 100, "rebanada": 30}
+
+UNICODE_FRACTIONS = {"½": " 1/2", "¼": " 1/4", "¾": " 3/4", "⅓": " 1/3", "⅔": " 2/3"}
+
+_NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:[.,]\d+)?"
+_AMOUNT = re.compile(rf"({_NUMBER})(?:\s*(?:-|a)\s*({_NUMBER}))?")
+_PAREN_GRAMS = re.compile(r"\(\s*(?:aprox\.?\s*)?(\d+(?:[.,]\d+)?)\s*(g|gr|grs|gramos|ml)\b[^)]*\)")
+_WORD = re.compile(r"[a-z]+")
+
+
+def _number(text: str) -> float:
+    total = 0.0
+    for part in text.split():
+        if "/" in part:
+            numerator, denominator = part.split("/")
+            total += float(numerator) / float(denominator) if float(denominator) else 0
+        else:
+            total += float(part.replace(",", "."))
+    return total
+
+
+def split_ingredient(ingredient) -> Tuple[str, str]:
+    """(name, quantity text) of an {"item", "cantidad"} dict or a plain string"""
+    if isinstance(ingredient, dict):
+        return str(ingredient.get("item") or ""), str(ingredient.get("cantidad") or "")
+    # Plain strings carry the quantity in the name: "150g de pollo"
+    return str(ingredient), str(ingredient)
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text: str) -> Quantity:
+    """Parse a quantity string such as "1/2 taza (40g)" or "3-4 gotas" """
+    raw = str(text or "")
+    for symbol, replacement in UNICODE_FRACTIONS.items():
+        raw = raw.replace(symbol, replacement)
+    normalized = normalize_text(raw)
+
+    grams = None
+    explicit = _PAREN_GRAMS.search(normalized)
+    if explicit:
+        grams = _number(explicit.group(1))
+        normalized = (normalized[:explicit.start()] + normalized[explicit.end():]).strip()
+
+    match = _AMOUNT.search(normalized)
+    if not match:
+        return Quantity(None, None, grams)
+    amount = _number(match.group(1))
+    if match.group(2):
+        # Ranges use the midpoint: "3-4 gotas" -> 3.5
+        amount = (amount + _number(match.group(2))) / 2
+
+    unit = None
+    rest = normalized[match.end():]
+    words = _WORD.findall(rest)
+    if words:
+        unit = UNIT_ALIASES.get(words[0])
+    return Quantity(amount, unit, grams)
+
+
+def grams_for(quantity: Quantity, piece_grams: float = 0) -> Optional[float]:
+    """Weight in grams, or None when it cannot be estimated (e.g. "al gusto")"""
+    if quantity.grams:
+        return quantity.grams
+    if quantity.amount is None:
+        return None
+    if quantity.unit in UNIT_GRAMS:
+        return quantity.amount * UNIT_GRAMS[quantity.unit]
+    if quantity.unit in DEFAULT_PIECE_GRAMS or quantity.unit is None:
+        # Bare counts ("2 huevos") and pieces use the weight of one piece of the food
+        return quantity.amount * (piece_grams or DEFAULT_PIECE_GRAMS.get(quantity.unit, 100))
+    return None
@@ -0,0 +1,156 @@
+"""
+Process-wide LLM client.
+
+The emergentintegrations SDK is imported once when the app starts, the API
+key is read once, and a single keep-alive httpx connection pool is installed
+as litellm's async session (the SDK calls the provider through litellm), so
+every request reuses warm TLS connections instead of opening new ones. A
+tiny warm-up call at startup pays the first handshake and the provider's
+cold path before the first user request.
+
+Per-call chats stay lightweight: `chat()` only builds an LlmChat around the
+shared state, with its own session id so conversations never mix.
+
+LlmProvider is what the generation path relies on; LlmClient implements it
+on the SDK and llm_standin.StandInProvider without any network.
+
+The SDK's LlmChat has no streaming call, so with LlmClient `stream_chat()`
+yields each response whole: plan days reach the job stream as each section
+(a group of days) completes rather than token by token. The stand-in
+streams, which is how the incremental path is exercised.
+"""
+import asyncio
+import copy
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PROMPT = "Responde solo: ok"
+WARMUP_TIMEOUT = 20.0
+
+
+class LlmProvider(ABC):
+    """LLM backend of the generation path.
+
+    `chat()` returns an object with `send_message(message)` (the whole
+    response) and optionally `stream_message(message)` (an async iterator of
+    text chunks); `message()` builds the message both take. A backend that
+    lacks either cannot be instantiated. `streams` tells whether its chats
+    stream.
+    """
+
+    streams = False
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.warmup_seconds: Optional[float] = None
+
+    async def start(self, warm_up: bool = True):
+        pass
+
+    @abstractmethod
+    def chat(self, session_id: str, system_message: str):
+        ...
+
+    @abstractmethod
+    def message(self, text: str):
+        ...
+
+    def with_model(self, provider: str, model: str) -> "LlmProvider":
+        """This client (key, HTTP pool) calling another provider and model; started and closed with it"""
+        view = copy.copy(self)
+        view.provider, view.model = provider, model
+        return view
+
+    async def close(self):
+        pass
+
+
+async def stream_chat(chat, message) -> AsyncIterator[str]:
+    """Yield the response text as it arrives; in one chunk when `chat` cannot stream"""
+    stream = getattr(chat, "stream_message", None)
+    if stream is None:
+        yield await chat.send_message(message)
+        return
+    async for chunk in stream(message):
+        if chunk:
+            yield chunk if isinstance(chunk, str) else str(chunk)
+
+
+class LlmClient(LlmProvider):
+    """Shared SDK classes, API key and HTTP pool; hands out one chat per LLM call"""
+
+    # LlmChat.send_message returns the whole response
+    streams = False
+
+    def __init__(self, provider: str, model: str, api_key: Optional[str],
+                 max_connections: int = 20, keepalive_expiry: float = 120.0):
+        super().__init__(provider, model)
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._chat_class = None
+        self._message_class = None
+        self._http = None
+        self._warmup: Optional[asyncio.Task] = None
+
+    def _load(self):
+        if self._chat_class is None:
+            from emergentintegrations.llm.chat import LlmChat, UserMessage
+            self._chat_class, self._message_class = LlmChat, UserMessage
+
+    def _install_http_pool(self):
+        try:
+            import httpx
+            import litellm
+        except ImportError:
+            logger.warning("httpx/litellm not available; LLM calls use the SDK's own connections")
+            return
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections,
+                                keepalive_expiry=self.keepalive_expiry),
+            # Deadlines are enforced per attempt by llm_resilience
+            timeout=httpx.Timeout(None, connect=10.0),
+        )
+        litellm.aclient_session = self._http
+
+    async def start(self, warm_up: bool = True):
+        """Import the SDK, install the shared pool and warm it up in the background"""
+        self._load()
+        self._install_http_pool()
+        if warm_up and self.api_key:
+            self._warmup = asyncio.create_task(self.warm_up())
+
+    async def warm_up(self):
+        started = time.monotonic()
+        try:
+            chat = self.chat("warmup", "Responde en una palabra.")
+            await asyncio.wait_for(chat.send_message(self.message(WARMUP_PROMPT)), WARMUP_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+            return
+        self.warmup_seconds = round(time.monotonic() - started, 3)
+        logger.info(f"LLM client warmed up in {self.warmup_seconds}s")
+
+    def chat(self, session_id: str, system_message: str):
+        """A fresh chat on the shared client (a chat keeps its messages, so one per call)"""
+        self._load()
+        return self._chat_class(
+            api_key=self.api_key, session_id=session_id, system_message=system_message
+        ).with_model(self.provider, self.model)
+
+    def message(self, text: str):
+        self._load()
+        return self._message_class(text=text)
+
+    async def close(self):
+        if self._warmup is not None and not self._warmup.done():
+            self._warmup.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
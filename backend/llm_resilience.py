@@ -0,0 +1,200 @@
+"""
+Deadlines, retries, hedging and a circuit breaker around LLM calls.
+
+Every attempt runs under its own timeout and the whole call under a total
+deadline; failed attempts are retried after an exponential backoff with
+full jitter, as long as the backoff still fits in the deadline. Short calls
+can be hedged: when an attempt is still running after the recent p95
+latency, a second identical attempt is started and whichever succeeds first
+wins (the other one is cancelled).
+
+The circuit breaker keeps the outcome of the last calls. Once the error
+rate is too high it opens and calls fail immediately with LlmUnavailable,
+so callers go straight to their local fallback; after a cooldown a single
+probe call is let through and its outcome closes or reopens the circuit.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+
+class LlmUnavailable(Exception):
+    """The circuit is open, or no attempt succeeded within the deadline"""
+
+
+class RetryPolicy(NamedTuple):
+    attempt_timeout: float          # seconds per attempt
+    total_timeout: float            # seconds for the whole call, backoffs included
+    retries: int = 2                # attempts after the first one
+    base_backoff: float = 0.5
+    max_backoff: float = 8.0
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter: uniform in [0, min(max_backoff, base_backoff * 2^retry)]"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** retry))
+
+
+class LatencyTracker:
+    """Latencies of the last successful calls, for the hedging delay"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile (0-1) of the recorded latencies; None until there are min_samples"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Rolling error rate over the last `window` calls; open for `cooldown` seconds when too high"""
+
+    def __init__(self, window: int = 20, min_calls: int = 10, error_rate: float = 0.5,
+                 cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.outcomes = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if self.clock() - self.opened_at < self.cooldown else "half_open"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (takes the probe slot when half open)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open" or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record(self, ok: bool):
+        if self.opened_at is not None:
+            if not self.probing:
+                # A call started before the circuit opened: says nothing about the provider now
+                return
+            # Outcome of the half-open probe
+            self.probing = False
+            if ok:
+                self.opened_at = None
+                self.outcomes.clear()
+            else:
+                self.opened_at = self.clock()
+            return
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+            self.opened_at = self.clock()
+            self.outcomes.clear()
+
+    def abandon(self):
+        """A call was cancelled by its caller: no outcome, but the probe slot is freed"""
+        self.probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "calls": len(self.outcomes),
+            "failures": self.outcomes.count(False),
+        }
+
+
+async def call_with_resilience(attempt: Callable[..., Awaitable], policy: RetryPolicy,
+                               breaker: Optional[CircuitBreaker], latency: Optional[LatencyTracker] = None,
+                               hedge: bool = False, route=None):
+    """Result of the first successful `attempt()` under `policy`.
+
+    `attempt` must start a fresh request every time it is called. With a
+    `route` (llm_router.RouteCall) every attempt is sent to `route.pick()`
+    as `attempt(candidate)` and the candidates' own breakers stand in for
+    `breaker`. Raises LlmUnavailable when the circuit is open (no candidate
+    available) or every attempt failed.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.total_timeout
+
+    def allowed() -> bool:
+        return route.available() if route is not None else breaker.allow()
+
+    def report(candidate, ok: Optional[bool], seconds: Optional[float] = None):
+        """Outcome of one attempt; None when it was cancelled by the caller"""
+        if route is None:
+            if ok is None:
+                breaker.abandon()
+            else:
+                breaker.record(ok)
+        elif ok is None:
+            route.abandon(candidate)
+        else:
+            route.record(candidate, ok, seconds)
+
+    async def timed(timeout: float):
+        candidate = route.pick() if route is not None else None
+        started = loop.time()
+        try:
+            result = await asyncio.wait_for(attempt() if route is None else attempt(candidate), timeout)
+        except asyncio.CancelledError:
+            report(candidate, None)
+            raise
+        except Exception:
+            report(candidate, False)
+            raise
+        elapsed = loop.time() - started
+        report(candidate, True, elapsed)
+        if latency is not None:
+            latency.record(elapsed)
+        return result
+
+    async def hedged(timeout: float, delay: float):
+        first = asyncio.ensure_future(timed(timeout))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not allowed():
+            return await first
+        pending = {first, asyncio.ensure_future(timed(min(policy.attempt_timeout, deadline - loop.time())))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    last_error: Optional[BaseException] = None
+    for retry in range(policy.retries + 1):
+        timeout = min(policy.attempt_timeout, deadline - loop.time())
+        if timeout <= 0:
+            break
+        if not allowed():
+            raise LlmUnavailable("circuit open") from last_error
+        delay = latency.percentile(0.95) if hedge and latency is not None else None
+        try:
+            if delay is not None and delay < timeout:
+                return await hedged(timeout, delay)
+            return await timed(timeout)
+        except Exception as e:
+            last_error = e
+        backoff = policy.backoff(retry)
+        if retry == policy.retries or loop.time() + backoff >= deadline:
+            break
+        await asyncio.sleep(backoff)
+    raise LlmUnavailable(f"no attempt succeeded: {last_error!r}") from last_error
@@ -0,0 +1,137 @@
+"""
+Latency-aware routing of LLM calls between providers and models.
+
+Every model the app may call is a ModelCandidate with a quality score, its
+own circuit breaker and exponentially weighted moving averages (EWMA) of
+its latency and error rate. A route lists, per plan type, the candidates it
+may use in order of preference and the quality floor they must meet (e.g.
+a faster model is good enough for trials, not for the weekly plan).
+
+Each attempt of a call goes to the candidate with the lowest expected
+latency, latency / (1 - error rate), among those of the route that meet the
+floor and whose breaker lets calls through. Candidates without samples yet
+rank after the measured ones, in route order, and a small share of traffic
+(`explore_rate`) goes to a random eligible candidate so the averages of the
+others stay current. Within one call, candidates already tried are used
+last, so a retry or a hedge fails over to another provider; once a
+candidate's breaker opens, all traffic moves until its half-open probe
+succeeds.
+"""
+import random
+from typing import Dict, List, NamedTuple, Optional
+
+from llm_resilience import CircuitBreaker, LlmUnavailable
+
+
+class Route(NamedTuple):
+    candidates: List[str]   # "provider/model", in order of preference
+    min_quality: float = 0.0
+
+
+class ModelCandidate:
+    def __init__(self, name: str, client, quality: float, breaker: CircuitBreaker, alpha: float = 0.2):
+        self.name = name
+        self.client = client
+        self.quality = quality
+        self.breaker = breaker
+        self.alpha = alpha
+        self.latency: Optional[float] = None    # EWMA of successful call seconds
+        self.error_rate = 0.0                   # EWMA of failures
+        self.calls = 0
+
+    @property
+    def available(self) -> bool:
+        state = self.breaker.state
+        return state == "closed" or (state == "half_open" and not self.breaker.probing)
+
+    def expected_latency(self) -> Optional[float]:
+        if self.latency is None:
+            return None
+        return self.latency / max(0.05, 1 - self.error_rate)
+
+    def observe(self, ok: bool, seconds: Optional[float] = None):
+        self.calls += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok and seconds is not None:
+            self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        self.breaker.record(ok)
+
+    def stats(self) -> dict:
+        expected = self.expected_latency()
+        return {
+            "quality": self.quality,
+            "calls": self.calls,
+            "latency_s": round(self.latency, 3) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "expected_latency_s": round(expected, 3) if expected is not None else None,
+            "breaker": self.breaker.stats(),
+        }
+
+
+class RouteCall:
+    """Candidate choice for the attempts of one call; pass it to call_with_resilience as `route`"""
+
+    def __init__(self, router: "LlmRouter", route: Route):
+        self.router = router
+        self.min_quality = route.min_quality
+        self.candidates = [router.candidates[name] for name in route.candidates
+                           if router.candidates[name].quality >= route.min_quality]
+        self.tried: List[str] = []
+        self.answered: Optional[ModelCandidate] = None
+
+    def eligible(self) -> List[ModelCandidate]:
+        return [c for c in self.candidates if c.available]
+
+    def available(self) -> bool:
+        return bool(self.eligible())
+
+    def pick(self) -> ModelCandidate:
+        eligible = self.eligible()
+        if not eligible:
+            raise LlmUnavailable("no LLM candidate available")
+        fresh = [c for c in eligible if c.name not in self.tried] or eligible
+        if self.router.rng.random() < self.router.explore_rate:
+            chosen = self.router.rng.choice(fresh)
+        else:
+            order = {c.name: i for i, c in enumerate(fresh)}
+
+            def rank(c: ModelCandidate):
+                expected = c.expected_latency()
+                return (expected is None, expected or 0.0, order[c.name])
+
+            chosen = min(fresh, key=rank)
+        chosen.breaker.allow()   # takes the probe slot when half open
+        self.tried.append(chosen.name)
+        return chosen
+
+    def record(self, candidate: ModelCandidate, ok: bool, seconds: Optional[float] = None):
+        candidate.observe(ok, seconds)
+        if ok and self.answered is None:
+            self.answered = candidate
+
+    def abandon(self, candidate: ModelCandidate):
+        candidate.breaker.abandon()
+
+
+class LlmRouter:
+    """Candidates shared by every route; route(plan_type) starts the choice for one call"""
+
+    def __init__(self, candidates: Dict[str, ModelCandidate], routes: Dict[str, Route], default_route: str,
+                 explore_rate: float = 0.05, rng: Optional[random.Random] = None):
+        unknown = {name for route in routes.values() for name in route.candidates} - set(candidates)
+        if unknown:
+            raise ValueError(f"Routes name unknown LLM candidates: {sorted(unknown)}")
+        self.candidates = candidates
+        self.routes = routes
+        self.default_route = default_route
+        self.explore_rate = explore_rate
+        self.rng = rng or random.Random()
+
+    def route(self, plan_type: str) -> RouteCall:
+        return RouteCall(self, self.routes.get(plan_type, self.routes[self.default_route]))
+
+    def stats(self) -> dict:
+        return {
+            "routes": {name: route._asdict() for name, route in self.routes.items()},
+            "candidates": {name: candidate.stats() for name, candidate in self.candidates.items()},
+        }
@@ -0,0 +1,162 @@
+"""
+Weighted-fair scheduler for LLM calls.
+
+Every call to the provider takes a slot. The process has `capacity` slots
+in total, and each class of work (paid plans, trials, background work) has
+its own concurrency cap. When a slot frees up, the next caller comes from
+the backlogged class with the lowest virtual time, so each class's share of
+grants follows its weight (stride scheduling). A class that was idle joins
+at the current virtual time and cannot claim a burst for the time it was
+idle.
+
+Callers are rejected with SchedulerRejected instead of queuing:
+- when the user already holds `per_user` calls, running or queued;
+- when their class queue is at `max_queue`;
+- after `max_wait` seconds in the queue.
+Trials use this to degrade to the local plan during signup spikes.
+"""
+import asyncio
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, NamedTuple, Optional, Tuple
+
+
+class ClassLimits(NamedTuple):
+    weight: float
+    max_concurrency: int
+    max_queue: Optional[int] = None     # callers beyond this queue length are rejected at once
+    max_wait: Optional[float] = None    # seconds in the queue before giving up
+
+
+class SchedulerRejected(Exception):
+    """The call was not scheduled; `reason` is user_quota, queue_full or queue_timeout"""
+
+    def __init__(self, klass: str, reason: str):
+        super().__init__(f"{klass} LLM call rejected: {reason}")
+        self.klass = klass
+        self.reason = reason
+
+
+class _ClassState:
+    def __init__(self, limits: ClassLimits):
+        self.limits = limits
+        self.queue: Deque[Tuple[asyncio.Future, float]] = deque()
+        self.running = 0
+        self.virtual_time = 0.0
+        self.granted = 0
+        self.rejected: Counter = Counter()
+        self.waits: Deque[float] = deque(maxlen=500)
+
+
+class LlmScheduler:
+    """Global slots for LLM calls, shared by weight between classes of work"""
+
+    def __init__(self, capacity: int, classes: Dict[str, ClassLimits], per_user: int):
+        self.capacity = capacity
+        self.per_user = per_user
+        self.running = 0
+        self._classes = {name: _ClassState(limits) for name, limits in classes.items()}
+        self._users: Counter = Counter()
+        self._virtual_time = 0.0
+
+    @asynccontextmanager
+    async def slot(self, klass: str, user_id: Optional[str] = None):
+        await self.acquire(klass, user_id)
+        try:
+            yield
+        finally:
+            self.release(klass, user_id)
+
+    async def acquire(self, klass: str, user_id: Optional[str] = None):
+        state = self._classes[klass]
+        if user_id is not None and self._users[user_id] >= self.per_user:
+            self._reject(state, klass, "user_quota")
+        if state.limits.max_queue is not None and len(state.queue) >= state.limits.max_queue:
+            self._reject(state, klass, "queue_full")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not state.queue:
+            state.virtual_time = max(state.virtual_time, self._virtual_time)
+        state.queue.append((future, loop.time()))
+        if user_id is not None:
+            self._users[user_id] += 1
+        self._dispatch()
+        if future.done():
+            return
+
+        try:
+            if state.limits.max_wait is None:
+                await asyncio.shield(future)
+            else:
+                await asyncio.wait_for(asyncio.shield(future), state.limits.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # Granted while giving up: keep the slot on timeout, hand it back on cancellation
+                if isinstance(e, asyncio.TimeoutError):
+                    return
+                self.release(klass, user_id)
+                raise
+            future.cancel()
+            state.queue = deque(entry for entry in state.queue if entry[0] is not future)
+            self._forget_user(user_id)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject(state, klass, "queue_timeout")
+            raise
+
+    def release(self, klass: str, user_id: Optional[str] = None):
+        state = self._classes[klass]
+        state.running -= 1
+        self.running -= 1
+        self._forget_user(user_id)
+        self._dispatch()
+
+    def _forget_user(self, user_id: Optional[str]):
+        if user_id is not None:
+            self._users[user_id] -= 1
+            if self._users[user_id] <= 0:
+                del self._users[user_id]
+
+    def _reject(self, state: _ClassState, klass: str, reason: str):
+        state.rejected[reason] += 1
+        raise SchedulerRejected(klass, reason)
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self.running < self.capacity:
+            eligible = [s for s in self._classes.values() if s.queue and s.running < s.limits.max_concurrency]
+            if not eligible:
+                return
+            state = min(eligible, key=lambda s: s.virtual_time)
+            future, enqueued_at = state.queue.popleft()
+            if future.done():
+                continue
+            self._virtual_time = state.virtual_time
+            state.virtual_time += 1 / state.limits.weight
+            state.running += 1
+            state.granted += 1
+            state.waits.append(loop.time() - enqueued_at)
+            self.running += 1
+            future.set_result(None)
+
+    def queued(self, klass: str) -> int:
+        return len(self._classes[klass].queue)
+
+    def stats(self) -> dict:
+        classes = {}
+        for name, state in self._classes.items():
+            waits = sorted(state.waits)
+
+            def wait_ms(q: float) -> float:
+                return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else 0.0
+
+            classes[name] = {
+                "weight": state.limits.weight,
+                "max_concurrency": state.limits.max_concurrency,
+                "running": state.running,
+                "queued": len(state.queue),
+                "granted": state.granted,
+                "rejected": dict(state.rejected),
+                "queue_wait_ms": {"p50": wait_ms(0.5), "p95": wait_ms(0.95), "max": wait_ms(1.0)},
+            }
+        return {"capacity": self.capacity, "running": self.running, "per_user": self.per_user, "classes": classes}
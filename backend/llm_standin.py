@@ -0,0 +1,219 @@
+"""
+Deterministic local stand-in for the LLM provider.
+
+Load tests of plan generation should not hit (or pay) the real provider.
+With LLM_BACKEND=standin the server talks to StandInProvider instead: it
+answers every request the generation path makes (days in the compact wire
+schema, the recommendations, the trial day) with schema-valid JSON composed
+locally by PlanComposer from the targets and restrictions in the prompt, and
+streams it the way the provider does. Everything after the provider
+(streaming parser, scheduler, retries, validation, storage, PDF) runs
+unchanged, with no network. Enrichment of draft plans gets generic
+substitutions and tips for every option it lists.
+
+Timing and failures follow StandInConfig: time to first token is lognormal
+around `ttft_median` seconds, the text then arrives at `tokens_per_second`
+in chunks of `chunk_tokens`, and a call fails (`failure_rate`) or stops
+halfway (`truncate_rate`) at random. The random sequence comes from `seed`
+and the content only from the prompt, so two runs with the same traffic see
+the same responses.
+"""
+import asyncio
+import json
+import random
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+from llm_client import LlmProvider
+from plan_composer import PlanComposer
+from plan_wire import compact_day
+from recipe_library import MEAL_TYPES
+
+CHARS_PER_TOKEN = 4
+
+TRIAL_RECOMMENDATIONS = [
+    "Bebe al menos 2 litros de agua al día",
+    "Come despacio y mastica bien los alimentos",
+    "Este es solo un plan de prueba, suscríbete para obtener tu plan completo",
+]
+
+
+class StandInConfig(NamedTuple):
+    ttft_median: float = 0.8        # seconds
+    ttft_sigma: float = 0.5         # spread of the lognormal time to first token
+    tokens_per_second: float = 80.0
+    chunk_tokens: int = 16
+    failure_rate: float = 0.0       # calls that fail with StandInError
+    truncate_rate: float = 0.0      # calls whose stream stops halfway
+    seed: int = 0
+
+
+class StandInError(Exception):
+    """Simulated provider failure"""
+
+
+class StandInMessage(NamedTuple):
+    text: str
+
+
+class _Targets(NamedTuple):
+    calories: int
+    macros: Tuple[Tuple[str, int], ...]
+    alergias: Tuple[str, ...]
+    no_deseados: Tuple[str, ...]
+    vegetariano: bool
+
+
+def _number(pattern: str, text: str, default: int) -> int:
+    match = re.search(pattern, text, re.IGNORECASE)
+    return int(match.group(1)) if match else default
+
+
+def _items(pattern: str, text: str) -> Tuple[str, ...]:
+    match = re.search(pattern, text, re.IGNORECASE)
+    if not match:
+        return ()
+    return tuple(i.strip() for i in match.group(1).split(",") if i.strip() and i.strip().lower() != "ninguna")
+
+
+def parse_targets(prompt: str) -> _Targets:
+    """Targets and restrictions stated in a weekly profile or in the trial prompt"""
+    return _Targets(
+        calories=_number(r"(\d+) kcal/día", prompt, 2000),
+        macros=tuple((name, _number(rf"{pattern}:? (\d+)g", prompt, default)) for name, pattern, default in (
+            ("proteinas", "prote[ií]nas", 120), ("carbohidratos", "carbohidratos", 220), ("grasas", "grasas", 65)
+        )),
+        alergias=_items(r"alergias: ([^;\n]+)", prompt),
+        no_deseados=_items(r"evitar: ([^;\n]+)", prompt),
+        vegetariano=bool(re.search(r"; vegetariano|: vegetariano|Vegetariano: Sí", prompt)),
+    )
+
+
+@lru_cache(maxsize=1)
+def _composer() -> PlanComposer:
+    return PlanComposer()
+
+
+@lru_cache(maxsize=256)
+def _week(targets: _Targets) -> List[dict]:
+    macros = dict(targets.macros)
+    week = _composer().compose_days(targets.calories, macros, targets.alergias, targets.no_deseados,
+                                    targets.vegetariano)
+    # Nothing fits the restrictions: answer anyway, as a model would
+    return week or _composer().compose_days(targets.calories, macros)
+
+
+def _requested_days(prompt: str) -> List[int]:
+    match = re.search(r"GENERA: Días? (\d+)(?: a (\d+))?", prompt)
+    first = int(match.group(1))
+    return list(range(first, int(match.group(2) or first) + 1))
+
+
+def _requested_meals(prompt: str, number: int) -> List[str]:
+    match = re.search(rf"^- Día {number}: (.+)$", prompt, re.MULTILINE)
+    if not match:
+        return list(MEAL_TYPES)
+    return [tipo for tipo in MEAL_TYPES if tipo in match.group(1)]
+
+
+def _enriched_days(prompt: str) -> List[dict]:
+    days = []
+    for line in prompt.splitlines():
+        day = re.match(r"Día (\d+)$", line)
+        meal = re.match(r"- ([^:]+): (.+)$", line)
+        if day:
+            days.append({"d": int(day.group(1)), "c": []})
+        elif meal and days:
+            days[-1]["c"].append({"t": meal.group(1), "o": [
+                {"s": [f"{name.split(' (')[0]}: la misma cantidad de otra proteína de tu preferencia"],
+                 "x": "Prepara las porciones con anticipación para no saltarte esta comida"}
+                for name in meal.group(2).split(" | ")
+            ]})
+    return days
+
+
+def respond(prompt: str) -> str:
+    """The JSON text a well-behaved model would return for this request"""
+    if prompt.startswith("ENRIQUECE:"):
+        return json.dumps({"enriquecidos": _enriched_days(prompt)}, ensure_ascii=False)
+
+    if prompt.startswith("GENERA:"):
+        week = _week(parse_targets(prompt))
+        days = []
+        for number in _requested_days(prompt):
+            day = week[(number - 1) % len(week)]
+            tipos = _requested_meals(prompt, number)
+            days.append(compact_day({"comidas": [c for c in day["comidas"] if c["tipo"] in tipos]}))
+        return json.dumps({"dias": days}, ensure_ascii=False)
+
+    if "AGUA MÍNIMA" in prompt:
+        agua = re.search(r"AGUA MÍNIMA: ([\d.]+L)", prompt).group(1)
+        return json.dumps({"recomendaciones_adicionales": {
+            "sueno": "Busca 7-8 horas; si duermes poco, prioriza una cena ligera con proteína",
+            "antojos": "Si aparecen a media tarde, revisa que tu comida tenga proteína y carbohidrato medido",
+            "planeacion": "Elige 2 días a la semana para adelantar arroz, pollo y verduras",
+            "restaurantes": "Una proteína a la plancha, una verdura y un carbohidrato medido; salsas aparte",
+            "progreso": "Energía más estable en 10-14 días; cambios visibles en 8-12 semanas",
+            "hidratacion": f"Mínimo {agua} de agua al día, más si haces ejercicio",
+        }}, ensure_ascii=False)
+
+    if "UN SOLO DÍA" in prompt:
+        day = _week(parse_targets(prompt))[0]
+        comidas = []
+        for meal in day["comidas"]:
+            option = meal["opciones"][0]
+            comidas.append({"tipo": meal["tipo"], "nombre": option["nombre"],
+                            "ingredientes": [i["item"] for i in option["ingredientes"]],
+                            "calorias": option["calorias"]})
+        return json.dumps({"dia": "Plan de Prueba", "comidas": comidas, "recomendaciones": TRIAL_RECOMMENDATIONS},
+                          ensure_ascii=False)
+
+    return "ok"
+
+
+class StandInChat:
+    def __init__(self, provider: "StandInProvider", system_message: str):
+        self.provider = provider
+        self.system_message = system_message
+
+    async def send_message(self, message: StandInMessage) -> str:
+        return "".join([chunk async for chunk in self.stream_message(message)])
+
+    async def stream_message(self, message: StandInMessage):
+        config, rng = self.provider.config, self.provider.rng
+        text = respond(message.text)
+        fails, truncates = rng.random() < config.failure_rate, rng.random() < config.truncate_rate
+        await asyncio.sleep(config.ttft_median * rng.lognormvariate(0, config.ttft_sigma))
+        if fails and rng.random() < 0.5:
+            raise StandInError("stand-in provider failed before the first token")
+
+        end = len(text) // 2 if fails or truncates else len(text)
+        step = config.chunk_tokens * CHARS_PER_TOKEN
+        for start in range(0, end, step):
+            if start:
+                await asyncio.sleep(config.chunk_tokens / config.tokens_per_second)
+            yield text[start:min(start + step, end)]
+        if fails:
+            raise StandInError("stand-in provider failed mid-stream")
+
+
+class StandInProvider(LlmProvider):
+    """LlmProvider answering locally, with simulated latency and failures"""
+
+    streams = True
+
+    def __init__(self, model: str, config: Optional[StandInConfig] = None):
+        super().__init__("standin", model)
+        self.config = config or StandInConfig()
+        self.rng = random.Random(self.config.seed)
+
+    def chat(self, session_id: str, system_message: str) -> StandInChat:
+        return StandInChat(self, system_message)
+
+    def message(self, text: str) -> StandInMessage:
+        return StandInMessage(text)
+
+    def with_model(self, provider: str, model: str) -> "StandInProvider":
+        # Still the stand-in, sharing the seeded random sequence
+        return super().with_model(self.provider, f"{provider}/{model}")
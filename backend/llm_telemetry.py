@@ -0,0 +1,201 @@
+"""
+Per-call telemetry of LLM invocations.
+
+Every call to the provider produces one event: model, section and plan type,
+prompt and completion tokens, how long it waited for a scheduler slot, time
+to first token, total latency, attempts, whether the response parsed and
+whether the caller had to fall back to a local plan. Queue wait and parse
+time are ours; time to first token and generation time are the model's, so
+a latency regression can be attributed to one side or the other.
+
+Events never block the request: record() appends to an in-memory buffer and
+a background task writes it with insert_many every `flush_interval` seconds,
+or sooner once `batch_size` events are pending. When the database is slower
+than the traffic the oldest events are dropped (and counted) instead of
+growing without bound.
+
+Responses replayed from the response cache are recorded too, as events with
+`cache_hit` and the cost the call would have had as `saved_usd`; they count
+towards the hit rate and savings, not towards LLM calls and latencies.
+
+For the admin endpoint the database does the counting: summary_pipeline()
+groups the events of a window per day, model and plan type, and
+sample_pipeline() draws a capped random sample of their latencies, from
+which summarize() estimates p50/p95/p99. Neither grows with the traffic.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+LATENCY_FIELDS = ("latency_ms", "ttft_ms", "queue_ms", "parse_ms")
+
+
+class TokenPrices(NamedTuple):
+    """USD per million tokens"""
+    prompt: float
+    completion: float
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.prompt + completion_tokens * self.completion) / 1_000_000
+
+
+class TelemetryWriter:
+    """Buffered, batched inserts of telemetry events into a Mongo collection"""
+
+    def __init__(self, collection, batch_size: int = 100, flush_interval: float = 2.0, max_pending: int = 10000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Deque[dict] = deque(maxlen=max_pending)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def record(self, event: dict):
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(event)
+        self.recorded += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background task and write what is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            if not await self.flush():
+                break
+
+    async def flush(self) -> bool:
+        """Write one batch; False when it could not be written"""
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        if not batch:
+            return True
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            self.failed_batches += 1
+            self.dropped += len(batch)
+            logger.warning(f"Dropped {len(batch)} LLM telemetry events: {e}")
+            return False
+        self.written += len(batch)
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                await self.flush()
+                if len(self._pending) < self.batch_size:
+                    break
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+def summary_pipeline(since) -> List[dict]:
+    """Aggregation of the events since `since`: counts and sums per day, model and plan type"""
+    def count(condition) -> dict:
+        return {"$sum": {"$cond": [condition, 1, 0]}}
+
+    llm_call = {"$ne": ["$cache_hit", True]}
+    return [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                    "model": "$model", "plan_type": "$plan_type"},
+            "calls": count(llm_call),
+            "cache_hits": count({"$eq": ["$cache_hit", True]}),
+            "prompt_tokens": {"$sum": {"$cond": [llm_call, {"$ifNull": ["$prompt_tokens", 0]}, 0]}},
+            "completion_tokens": {"$sum": {"$cond": [llm_call, {"$ifNull": ["$completion_tokens", 0]}, 0]}},
+            "cost_usd": {"$sum": {"$ifNull": ["$cost_usd", 0]}},
+            "saved_usd": {"$sum": {"$ifNull": ["$saved_usd", 0]}},
+            "parse_errors": count({"$and": [llm_call, {"$ne": ["$parse_ok", True]}]}),
+            "fallbacks": count({"$eq": ["$fallback", True]}),
+        }},
+    ]
+
+
+def sample_pipeline(since, size: int) -> List[dict]:
+    """Aggregation drawing at most `size` LLM calls since `since`, with their latencies"""
+    return [
+        {"$match": {"created_at": {"$gte": since}, "cache_hit": {"$ne": True}}},
+        {"$sample": {"size": size}},
+        {"$project": {"_id": 0, "created_at": 1, "model": 1, "plan_type": 1,
+                      **{field: 1 for field in LATENCY_FIELDS}}},
+    ]
+
+
+def _day(created_at) -> str:
+    return created_at[:10] if isinstance(created_at, str) else created_at.date().isoformat()
+
+
+def summarize(groups: Iterable[dict], sample: Iterable[dict]) -> List[dict]:
+    """Rows of the admin summary from the output of summary_pipeline() and sample_pipeline()
+
+    Per day, model and plan type: calls, cache hits, tokens, cost and outcome
+    rates, and latency percentiles of the calls in the sample.
+    """
+    latencies: Dict[tuple, Dict[str, List[float]]] = {}
+    for event in sample:
+        key = (_day(event["created_at"]), event.get("model"), event.get("plan_type"))
+        fields = latencies.setdefault(key, {field: [] for field in LATENCY_FIELDS})
+        for field in LATENCY_FIELDS:
+            if event.get(field) is not None:
+                fields[field].append(event[field])
+
+    summary = []
+    for group in groups:
+        key = (group["_id"]["day"], group["_id"].get("model"), group["_id"].get("plan_type"))
+        calls = group["calls"]
+        lookups = calls + group["cache_hits"]
+        row = {
+            "day": key[0],
+            "model": key[1],
+            "plan_type": key[2],
+            "calls": calls,
+            "cache_hits": group["cache_hits"],
+            "cache_hit_rate": round(group["cache_hits"] / lookups, 3) if lookups else 0.0,
+            "prompt_tokens": group["prompt_tokens"],
+            "completion_tokens": group["completion_tokens"],
+            "cost_usd": round(group["cost_usd"], 4),
+            "saved_usd": round(group["saved_usd"], 4),
+            "parse_error_rate": round(group["parse_errors"] / calls, 3) if calls else 0.0,
+            "fallback_rate": round(group["fallbacks"] / calls, 3) if calls else 0.0,
+        }
+        sampled = latencies.get(key, {})
+        for field in LATENCY_FIELDS:
+            values = sorted(sampled.get(field, []))
+            row[field] = {f"p{q}": percentile(values, q / 100) for q in (50, 95, 99)}
+        summary.append(row)
+    summary.sort(key=lambda row: tuple(str(row[k]) for k in ("day", "model", "plan_type")))
+    return summary
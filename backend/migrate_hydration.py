@@ -0,0 +1,122 @@
+"""
+Migrate daily hydration records into month buckets.
+
+Usage (from backend/):
+    python migrate_hydration.py [--dry-run] [--drop-daily]
+
+Same-day duplicate records are removed first (the latest one is kept). Then
+reads `hydration_records` in (user_id, date) order, folds every user-month
+into a single `hydration_months` document, with the glasses and the goal of
+each day in its slot, and prints collection and index sizes before and
+after. Only the migrated slots are overwritten, so re-running the migration
+converges to the same buckets. Switch the API over with
+HYDRATION_STORAGE=monthly once it has finished.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from server import db, client, MonthlyHydrationStore, dedupe_hydration_records
+
+BATCH_SIZE = 500
+
+
+async def collection_size(name: str) -> dict:
+    try:
+        stats = await db.command("collStats", name)
+    except Exception:
+        return {"count": 0, "size": 0, "storage": 0, "indexes": 0}
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage": stats.get("storageSize", 0),
+        "indexes": stats.get("totalIndexSize", 0)
+    }
+
+
+def bucket_ops(user_id: str, month: str, slots: dict, goals: dict) -> list:
+    pipeline = [MonthlyHydrationStore.defaults_stage(), {"$set": {
+        "glasses": MonthlyHydrationStore.with_slots("glasses", slots),
+        "goals": MonthlyHydrationStore.with_slots("goals", goals)
+    }}]
+    return [UpdateOne({"user_id": user_id, "month": month}, pipeline, upsert=True)]
+
+
+async def migrate(dry_run: bool, drop_daily: bool):
+    before = {name: await collection_size(name) for name in ("hydration_records", "hydration_months")}
+    duplicates = await dedupe_hydration_records(dry_run=dry_run)
+
+    ops = []
+    records = skipped = buckets = 0
+    current = None
+    slots, goals = {}, {}
+
+    async def flush():
+        nonlocal ops
+        if ops and not dry_run:
+            await db.hydration_months.bulk_write(ops, ordered=True)
+        ops = []
+
+    cursor = db.hydration_records.find(
+        {}, {"_id": 0, "user_id": 1, "date": 1, "glasses": 1, "goal_glasses": 1}
+    ).sort([("user_id", 1), ("date", 1)])
+
+    async for record in cursor:
+        try:
+            datetime.strptime(record.get("date"), "%Y-%m-%d")
+        except (TypeError, ValueError):
+            # Missing, null or malformed date
+            skipped += 1
+            continue
+
+        key = (record["user_id"], record["date"][:7])
+        if key != current:
+            if current and slots:
+                ops.extend(bucket_ops(*current, slots, goals))
+                buckets += 1
+            current, slots, goals = key, {}, {}
+            if len(ops) >= BATCH_SIZE:
+                await flush()
+
+        slot = int(record["date"][8:10]) - 1
+        if record.get("glasses"):
+            slots[slot] = record["glasses"]
+            if record.get("goal_glasses"):
+                goals[slot] = record["goal_glasses"]
+        records += 1
+
+    if current and slots:
+        ops.extend(bucket_ops(*current, slots, goals))
+        buckets += 1
+    await flush()
+
+    after = {name: await collection_size(name) for name in ("hydration_records", "hydration_months")}
+
+    print(f"{'DRY RUN: ' if dry_run else ''}{records} daily records -> {buckets} month buckets "
+          f"({skipped} skipped, {duplicates} same-day duplicates removed)")
+    for label, sizes in (("before", before), ("after", after)):
+        for name, size in sizes.items():
+            print(f"  {label:6} {name:18} docs={size['count']:>8} data={size['size']:>10}B "
+                  f"storage={size['storage']:>10}B indexes={size['indexes']:>10}B")
+
+    if drop_daily and not dry_run:
+        await db.hydration_records.drop()
+        print("Dropped hydration_records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate hydration records to month buckets")
+    parser.add_argument("--dry-run", action="store_true", help="Read and report without writing")
+    parser.add_argument("--drop-daily", action="store_true", help="Drop hydration_records after migrating")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(migrate(args.dry_run, args.drop_daily))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Deterministic local plan composer.
+
+Builds plan days from a small table of dishes with known nutrition per
+portion, without calling the LLM. Every combination of one dish per meal
+(Desayuno, Comida, Snack, Cena) that respects the user's allergies,
+aversions and vegetarian setting is scored at once with NumPy: the whole
+day is scaled to the calorie target (portions in 0.1 steps) and ranked by
+relative error against calories and macros. Days are then picked best-first
+while spreading dishes over the week, so a week is composed in a few milliseconds.
+"""
+import itertools
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from recipe_library import MEAL_TYPES, keywords, user_allergens, aversion_keywords
+
+NUTRIENTS = ("calorias", "proteinas", "carbohidratos", "grasas")
+NUTRIENT_WEIGHTS = np.array([2.0, 1.0, 1.0, 1.0], dtype=np.float32)
+CALORIE_TOLERANCE = 0.10
+MACRO_TOLERANCE = 0.20
+MIN_SCALE, MAX_SCALE, SCALE_STEP = 0.6, 2.2, 0.1
+RANK_POOL = 2000  # best combinations considered when spreading dishes over the week
+
+UNIT_PLURALS = {"pieza": "piezas", "rebanada": "rebanadas", "taza": "tazas", "cda": "cdas", "cdita": "cditas"}
+
+
+def dish(tipo, nombre, nutrition, ingredientes, preparacion, tiempo_prep,
+         allergens=(), vegetarian=False, rapido=False, economico=False) -> dict:
+    calorias, proteinas, carbohidratos, grasas = nutrition
+    return {
+        "tipo": tipo, "nombre": nombre,
+        "calorias": calorias, "proteinas": proteinas, "carbohidratos": carbohidratos, "grasas": grasas,
+        "ingredientes": ingredientes, "preparacion": preparacion, "tiempo_prep": tiempo_prep,
+        "allergens": list(allergens), "vegetarian": vegetarian, "rapido": rapido, "economico": economico,
+    }
+
+
+# Nutrition is per base portion: (kcal, protein g, carbs g, fat g). Ingredients are (item, quantity, unit);
+# a quantity of None means "al gusto" and is not scaled.
+DISHES = [
+    # Desayuno
+    dish("Desayuno", "Avena cocida con plátano y canela", (330, 14, 58, 5),
+         [("Avena", 40, "g"), ("Leche descremada", 200, "ml"), ("Plátano", 60, "g"), ("Canela", None, "")],
+         ["Calienta la leche a fuego medio", "Agrega la avena y cocina 5 minutos moviendo",
+          "Sirve con el plátano en rodajas y canela"],
+         "10 min", ["gluten", "lactosa"], vegetarian=True, rapido=True, economico=True),
+    dish("Desayuno", "Huevos a la mexicana con tortillas", (360, 18, 32, 18),
+         [("Huevo", 2, "pieza"), ("Jitomate", 80, "g"), ("Cebolla", 30, "g"), ("Chile serrano", None, ""),
+          ("Tortilla de maíz", 2, "pieza"), ("Aceite de oliva", 5, "ml")],
+         ["Pica jitomate, cebolla y chile", "Sofríe la verdura en el aceite 3 minutos",
+          "Agrega los huevos batidos y cocina moviendo", "Sirve con las tortillas calientes"],
+         "12 min", ["huevo"], vegetarian=True, economico=True),
+    dish("Desayuno", "Omelette de claras con espinaca y panela", (280, 30, 18, 9),
+         [("Claras de huevo", 150, "g"), ("Espinaca", 60, "g"), ("Queso panela", 40, "g"),
+          ("Pan integral", 1, "rebanada")],
+         ["Saltea la espinaca 1 minuto", "Vierte las claras y cocina a fuego bajo",
+          "Agrega el panela en cubos y dobla el omelette", "Acompaña con el pan tostado"],
+         "10 min", ["huevo", "lactosa", "gluten"], vegetarian=True, rapido=True),
+    dish("Desayuno", "Yogur griego con frutos rojos y granola", (310, 20, 40, 8),
+         [("Yogur griego natural", 170, "g"), ("Frutos rojos", 80, "g"), ("Granola", 30, "g")],
+         ["Sirve el yogur en un bowl", "Agrega los frutos rojos y la granola al momento"],
+         "3 min", ["lactosa", "gluten", "frutos secos"], vegetarian=True, rapido=True),
+    dish("Desayuno", "Chilaquiles horneados con pollo", (420, 30, 45, 13),
+         [("Tortilla de maíz", 3, "pieza"), ("Salsa verde", 100, "ml"), ("Pechuga de pollo deshebrada", 80, "g"),
+          ("Queso fresco", 20, "g"), ("Cebolla", 20, "g")],
+         ["Corta las tortillas en triángulos y hornéalas hasta que estén crujientes",
+          "Calienta la salsa y agrega los totopos", "Sirve con el pollo, queso y cebolla"],
+         "20 min", ["lactosa"], economico=True),
+    dish("Desayuno", "Pan integral con aguacate y huevo", (340, 15, 30, 18),
+         [("Pan integral", 2, "rebanada"), ("Aguacate", 50, "g"), ("Huevo", 1, "pieza"), ("Limón", None, "")],
+         ["Tuesta el pan", "Machaca el aguacate con limón y sal", "Cocina el huevo estrellado",
+          "Arma las tostadas con aguacate y huevo"],
+         "8 min", ["gluten", "huevo"], vegetarian=True, rapido=True),
+    dish("Desayuno", "Licuado de plátano, avena y crema de cacahuate", (390, 17, 55, 12),
+         [("Leche descremada", 250, "ml"), ("Plátano", 100, "g"), ("Avena", 20, "g"),
+          ("Crema de cacahuate", 15, "g")],
+         ["Coloca todo en la licuadora", "Licúa 1 minuto hasta que quede terso"],
+         "3 min", ["lactosa", "gluten", "mani"], vegetarian=True, rapido=True, economico=True),
+    dish("Desayuno", "Tofu revuelto con pimientos", (330, 20, 28, 15),
+         [("Tofu firme", 150, "g"), ("Pimiento", 60, "g"), ("Cebolla", 30, "g"),
+          ("Tortilla de maíz", 2, "pieza"), ("Aceite de oliva", 5, "ml")],
+         ["Desmorona el tofu con un tenedor", "Sofríe cebolla y pimiento 3 minutos",
+          "Agrega el tofu con cúrcuma y sal y cocina 5 minutos", "Sirve con las tortillas"],
+         "12 min", ["soya"], vegetarian=True),
+    dish("Desayuno", "Molletes integrales con frijol y pico de gallo", (380, 18, 55, 9),
+         [("Bolillo integral", 1, "pieza"), ("Frijoles refritos", 80, "g"), ("Queso panela", 30, "g"),
+          ("Pico de gallo", 60, "g")],
+         ["Abre el bolillo y úntale los frijoles", "Agrega el panela rallado y gratina 5 minutos",
+          "Sirve con el pico de gallo encima"],
+         "10 min", ["gluten", "lactosa"], vegetarian=True, economico=True),
+    dish("Desayuno", "Hot cakes de avena y plátano", (300, 12, 48, 7),
+         [("Avena", 40, "g"), ("Huevo", 1, "pieza"), ("Plátano", 60, "g"), ("Miel", 5, "g")],
+         ["Licúa avena, huevo y plátano", "Cocina porciones pequeñas en sartén antiadherente",
+          "Voltea cuando aparezcan burbujas", "Sirve con la miel"],
+         "15 min", ["gluten", "huevo"], vegetarian=True),
+    dish("Desayuno", "Papaya con queso cottage y chía", (230, 14, 28, 7),
+         [("Papaya", 200, "g"), ("Queso cottage", 100, "g"), ("Chía", 10, "g")],
+         ["Corta la papaya en cubos", "Sirve con el cottage y espolvorea la chía"],
+         "5 min", ["lactosa"], vegetarian=True, rapido=True, economico=True),
+    # Comida
+    dish("Comida", "Pollo a la plancha con arroz integral y brócoli", (480, 45, 45, 11),
+         [("Pechuga de pollo", 150, "g"), ("Arroz integral cocido", 150, "g"), ("Brócoli", 100, "g"),
+          ("Aceite de oliva", 5, "ml")],
+         ["Sazona el pollo con sal, pimienta y ajo", "Cocínalo a la plancha 6 minutos por lado",
+          "Cuece el brócoli al vapor 5 minutos", "Sirve con el arroz"],
+         "25 min", economico=True),
+    dish("Comida", "Tacos de pescado a la plancha", (470, 36, 45, 15),
+         [("Filete de tilapia", 150, "g"), ("Tortilla de maíz", 3, "pieza"), ("Col morada", 60, "g"),
+          ("Aguacate", 30, "g"), ("Limón", None, "")],
+         ["Sazona el pescado con limón y paprika", "Cocínalo a la plancha 3 minutos por lado",
+          "Calienta las tortillas", "Arma los tacos con col y aguacate"],
+         "15 min", rapido=True),
+    dish("Comida", "Bowl de quinoa con garbanzos y verduras", (520, 20, 70, 16),
+         [("Quinoa cocida", 150, "g"), ("Garbanzos cocidos", 100, "g"), ("Pepino", 80, "g"),
+          ("Jitomate", 80, "g"), ("Aceite de oliva", 10, "ml")],
+         ["Enjuaga y cuece la quinoa 15 minutos", "Pica pepino y jitomate",
+          "Mezcla todo con los garbanzos", "Adereza con aceite, limón y sal"],
+         "20 min", vegetarian=True),
+    dish("Comida", "Bistec de res con papa al horno y ensalada", (500, 40, 35, 20),
+         [("Bistec de res magro", 150, "g"), ("Papa", 150, "g"), ("Lechuga", 60, "g"),
+          ("Aceite de oliva", 5, "ml")],
+         ["Corta la papa en gajos y hornéala 25 minutos", "Cocina el bistec a la plancha",
+          "Sirve con la lechuga aderezada con limón"],
+         "30 min"),
+    dish("Comida", "Pasta integral con atún y jitomate", (510, 35, 65, 10),
+         [("Pasta integral cocida", 180, "g"), ("Atún en agua", 100, "g"), ("Salsa de jitomate natural", 100, "ml"),
+          ("Aceite de oliva", 5, "ml")],
+         ["Cuece la pasta al dente", "Calienta la salsa con el aceite y ajo",
+          "Agrega el atún escurrido", "Mezcla con la pasta"],
+         "15 min", ["gluten"], rapido=True, economico=True),
+    dish("Comida", "Enfrijoladas de pollo", (520, 35, 60, 14),
+         [("Tortilla de maíz", 3, "pieza"), ("Frijoles cocidos", 150, "g"), ("Pechuga de pollo deshebrada", 80, "g"),
+          ("Queso fresco", 20, "g")],
+         ["Licúa los frijoles con un poco de su caldo", "Calienta la salsa de frijol",
+          "Pasa las tortillas por la salsa y rellena con pollo", "Sirve con queso fresco"],
+         "20 min", ["lactosa"], economico=True),
+    dish("Comida", "Salmón al horno con camote y espárragos", (530, 33, 40, 24),
+         [("Filete de salmón", 130, "g"), ("Camote", 150, "g"), ("Espárragos", 100, "g")],
+         ["Hornea el camote en cubos 20 minutos", "Agrega el salmón y los espárragos a la charola",
+          "Hornea 12 minutos más a 200 °C"],
+         "35 min"),
+    dish("Comida", "Lentejas guisadas con arroz", (460, 22, 78, 6),
+         [("Lentejas cocidas", 200, "g"), ("Arroz cocido", 100, "g"), ("Zanahoria", 50, "g"),
+          ("Jitomate", 60, "g"), ("Aceite de oliva", 5, "ml")],
+         ["Sofríe jitomate, cebolla y zanahoria", "Agrega las lentejas con su caldo y cocina 10 minutos",
+          "Sirve con el arroz"],
+         "25 min", vegetarian=True, economico=True),
+    dish("Comida", "Fajitas de res con pimientos", (490, 36, 35, 21),
+         [("Arrachera", 130, "g"), ("Pimientos", 120, "g"), ("Cebolla", 50, "g"), ("Tortilla de maíz", 2, "pieza")],
+         ["Corta la carne y las verduras en tiras", "Sella la carne a fuego alto",
+          "Agrega pimientos y cebolla y saltea 4 minutos", "Sirve con las tortillas"],
+         "20 min", rapido=True),
+    dish("Comida", "Tofu salteado con verduras y arroz", (480, 26, 55, 16),
+         [("Tofu firme", 180, "g"), ("Brócoli", 80, "g"), ("Zanahoria", 50, "g"), ("Arroz cocido", 120, "g"),
+          ("Salsa de soya baja en sodio", 10, "ml")],
+         ["Dora el tofu en cubos", "Agrega las verduras y saltea 5 minutos",
+          "Incorpora la salsa de soya", "Sirve sobre el arroz"],
+         "20 min", ["soya"], vegetarian=True),
+    dish("Comida", "Camarones al ajillo con arroz y calabacita", (450, 35, 45, 13),
+         [("Camarón", 150, "g"), ("Arroz cocido", 120, "g"), ("Calabacita", 100, "g"), ("Ajo", None, ""),
+          ("Aceite de oliva", 10, "ml")],
+         ["Dora el ajo en el aceite", "Agrega los camarones y cocina 3 minutos",
+          "Saltea la calabacita", "Sirve con el arroz"],
+         "15 min", ["mariscos"], rapido=True),
+    # Snack
+    dish("Snack", "Manzana con crema de cacahuate", (170, 4, 23, 8),
+         [("Manzana", 150, "g"), ("Crema de cacahuate", 15, "g")],
+         ["Corta la manzana en gajos", "Acompaña con la crema de cacahuate"],
+         "2 min", ["mani"], vegetarian=True, rapido=True, economico=True),
+    dish("Snack", "Yogur griego natural con canela", (130, 15, 7, 4),
+         [("Yogur griego natural", 150, "g"), ("Canela", None, "")],
+         ["Sirve el yogur y espolvorea la canela"],
+         "1 min", ["lactosa"], vegetarian=True, rapido=True),
+    dish("Snack", "Jícama, pepino y zanahoria con limón", (80, 2, 18, 0),
+         [("Jícama", 80, "g"), ("Pepino", 80, "g"), ("Zanahoria", 50, "g"), ("Limón", None, "")],
+         ["Corta las verduras en bastones", "Agrega limón y chile en polvo"],
+         "5 min", vegetarian=True, rapido=True, economico=True),
+    dish("Snack", "Almendras con mandarina", (160, 5, 12, 10),
+         [("Almendras", 20, "g"), ("Mandarina", 1, "pieza")],
+         ["Porciona las almendras", "Acompaña con la mandarina"],
+         "1 min", ["frutos secos"], vegetarian=True, rapido=True),
+    dish("Snack", "Hummus con bastones de verdura", (170, 6, 17, 9),
+         [("Hummus", 60, "g"), ("Zanahoria", 80, "g"), ("Apio", 50, "g")],
+         ["Corta las verduras en bastones", "Sirve con el hummus"],
+         "5 min", vegetarian=True),
+    dish("Snack", "Queso panela con pepino", (150, 12, 4, 9),
+         [("Queso panela", 60, "g"), ("Pepino", 100, "g")],
+         ["Corta el panela y el pepino en cubos", "Sazona con limón y pimienta"],
+         "3 min", ["lactosa"], vegetarian=True, rapido=True),
+    dish("Snack", "Huevo cocido con jitomate", (160, 13, 3, 10),
+         [("Huevo", 2, "pieza"), ("Jitomate", 60, "g")],
+         ["Cuece los huevos 10 minutos", "Sirve con el jitomate en rodajas"],
+         "12 min", ["huevo"], vegetarian=True, economico=True),
+    dish("Snack", "Edamames con sal de mar", (120, 11, 9, 5),
+         [("Edamames", 100, "g")],
+         ["Cuece los edamames 4 minutos", "Escurre y agrega sal de mar"],
+         "6 min", ["soya"], vegetarian=True),
+    dish("Snack", "Palomitas naturales", (100, 3, 19, 1),
+         [("Maíz palomero", 25, "g")],
+         ["Revienta el maíz en una olla tapada sin aceite", "Sazona con sal y chile en polvo"],
+         "5 min", vegetarian=True, rapido=True, economico=True),
+    dish("Snack", "Rollitos de pechuga de pavo con panela", (140, 18, 3, 6),
+         [("Pechuga de pavo", 60, "g"), ("Queso panela", 30, "g")],
+         ["Enrolla el panela en las rebanadas de pavo"],
+         "2 min", ["lactosa"], rapido=True),
+    # Cena
+    dish("Cena", "Ensalada de atún con aguacate", (300, 27, 10, 17),
+         [("Atún en agua", 100, "g"), ("Lechuga", 100, "g"), ("Jitomate", 80, "g"), ("Aguacate", 30, "g"),
+          ("Aceite de oliva", 5, "ml")],
+         ["Lava y corta la verdura", "Escurre el atún", "Mezcla y adereza con aceite y limón"],
+         "8 min", rapido=True, economico=True),
+    dish("Cena", "Quesadillas de champiñones", (330, 17, 30, 15),
+         [("Tortilla de maíz", 2, "pieza"), ("Queso Oaxaca", 40, "g"), ("Champiñones", 100, "g")],
+         ["Saltea los champiñones con ajo", "Rellena las tortillas con queso y champiñones",
+          "Cocina en comal hasta que se funda el queso"],
+         "10 min", ["lactosa"], vegetarian=True, rapido=True),
+    dish("Cena", "Caldo de pollo con verduras", (260, 28, 18, 7),
+         [("Pechuga de pollo", 100, "g"), ("Calabacita", 80, "g"), ("Zanahoria", 60, "g"), ("Chayote", 80, "g")],
+         ["Cuece el pollo en agua con ajo y cebolla 20 minutos", "Agrega las verduras en cubos",
+          "Cocina 10 minutos más"],
+         "35 min", economico=True),
+    dish("Cena", "Tostadas horneadas de tinga de pollo", (340, 27, 30, 11),
+         [("Tostadas horneadas", 2, "pieza"), ("Pechuga de pollo deshebrada", 90, "g"), ("Jitomate", 80, "g"),
+          ("Cebolla", 30, "g"), ("Crema", 15, "ml")],
+         ["Sofríe cebolla en rodajas", "Agrega jitomate licuado con chipotle y el pollo",
+          "Cocina 5 minutos", "Sirve sobre las tostadas con crema"],
+         "20 min", ["lactosa"], economico=True),
+    dish("Cena", "Omelette de verduras", (280, 22, 14, 14),
+         [("Huevo", 2, "pieza"), ("Claras de huevo", 60, "g"), ("Espinaca", 50, "g"), ("Champiñones", 50, "g"),
+          ("Tortilla de maíz", 1, "pieza")],
+         ["Saltea las verduras", "Agrega huevo y claras batidos", "Dobla al cuajar y sirve con la tortilla"],
+         "10 min", ["huevo"], vegetarian=True, rapido=True, economico=True),
+    dish("Cena", "Wrap integral de pavo", (320, 22, 28, 12),
+         [("Tortilla de harina integral", 1, "pieza"), ("Pechuga de pavo", 80, "g"), ("Lechuga", 40, "g"),
+          ("Aguacate", 30, "g")],
+         ["Calienta la tortilla", "Rellena con pavo, lechuga y aguacate", "Enrolla y corta a la mitad"],
+         "5 min", ["gluten"], rapido=True),
+    dish("Cena", "Crema de calabaza con garbanzos tostados", (290, 12, 42, 7),
+         [("Calabaza", 250, "g"), ("Leche descremada", 100, "ml"), ("Garbanzos cocidos", 60, "g")],
+         ["Cuece la calabaza 15 minutos", "Licúa con la leche y sazona",
+          "Tuesta los garbanzos en sartén y sirve encima"],
+         "25 min", ["lactosa"], vegetarian=True, economico=True),
+    dish("Cena", "Pescado empapelado con verduras", (260, 32, 10, 9),
+         [("Filete de tilapia", 150, "g"), ("Calabacita", 80, "g"), ("Pimiento", 70, "g"),
+          ("Aceite de oliva", 5, "ml")],
+         ["Coloca el pescado y la verdura sobre papel aluminio", "Sazona y cierra el paquete",
+          "Hornea 18 minutos a 200 °C"],
+         "25 min"),
+    dish("Cena", "Tacos de frijol con nopales", (360, 16, 55, 8),
+         [("Tortilla de maíz", 3, "pieza"), ("Frijoles cocidos", 100, "g"), ("Nopales", 100, "g"),
+          ("Queso fresco", 20, "g")],
+         ["Asa los nopales en comal", "Calienta frijoles y tortillas", "Arma los tacos con queso fresco"],
+         "15 min", ["lactosa"], vegetarian=True, economico=True),
+    dish("Cena", "Ensalada tibia de lentejas con feta", (330, 18, 38, 12),
+         [("Lentejas cocidas", 150, "g"), ("Jitomate", 80, "g"), ("Pepino", 80, "g"), ("Queso feta", 30, "g"),
+          ("Aceite de oliva", 5, "ml")],
+         ["Calienta las lentejas", "Mezcla con la verdura picada", "Agrega el feta y adereza con aceite y limón"],
+         "10 min", ["lactosa"], vegetarian=True),
+]
+
+
+def _format_quantity(quantity: Optional[float], unit: str, scale: float) -> str:
+    if quantity is None:
+        return "al gusto"
+    amount = quantity * scale
+    if unit in ("g", "ml"):
+        return f"{max(5, int(round(amount / 5.0)) * 5)}{unit}"
+    halves = max(1, int(round(amount * 2)))
+    whole, half = divmod(halves, 2)
+    text = f"{whole} 1/2" if whole and half else ("1/2" if half else str(whole))
+    return f"{text} {UNIT_PLURALS.get(unit, unit) if halves > 2 else unit}".strip()
+
+
+class PlanComposer:
+    """Composes plan days from DISHES so daily totals match the calorie and macro targets"""
+
+    def __init__(self, dishes: Iterable[dict] = DISHES):
+        self.dishes = list(dishes)
+        self.nutrition = np.array([[d[n] for n in NUTRIENTS] for d in self.dishes], dtype=np.float32)
+        self._keywords = [keywords(d["nombre"]) | set().union(*(keywords(i[0]) for i in d["ingredientes"]))
+                          for d in self.dishes]
+
+    def allowed(self, tipo: str, allergens: List[str], aversions: List[str], vegetarian: bool) -> List[int]:
+        blocked_allergens, blocked_words = set(allergens), set(aversions)
+        return [
+            i for i, d in enumerate(self.dishes)
+            if d["tipo"] == tipo
+            and not blocked_allergens.intersection(d["allergens"])
+            and not blocked_words.intersection(self._keywords[i])
+            and (d["vegetarian"] or not vegetarian)
+        ]
+
+    def rank_days(self, candidates: List[List[int]], targets: np.ndarray):
+        """Score every dish combination at once; returns (combos, scales, totals, errors) best-first"""
+        combos = np.array(list(itertools.product(*candidates)), dtype=np.int32)  # (n, meals)
+        unscaled = self.nutrition[combos].sum(axis=1)                          # (n, nutrients)
+        scales = np.clip(targets[0] / unscaled[:, 0], MIN_SCALE, MAX_SCALE)
+        scales = np.round(scales / SCALE_STEP) * SCALE_STEP
+        totals = unscaled * scales[:, None]
+        relative = np.abs(totals - targets) / targets
+        errors = relative @ NUTRIENT_WEIGHTS
+        order = np.argsort(errors, kind="stable")
+        return combos[order], scales[order], totals[order], relative[order]
+
+    def compose_days(self, calories_target: float, macros: Dict[str, float], alergias=(),
+                     alimentos_no_deseados=(), vegetariano: bool = False, days: int = 7) -> List[dict]:
+        targets = np.array([calories_target] + [macros[n] for n in NUTRIENTS[1:]], dtype=np.float32)
+        allergens = user_allergens(alergias)
+        aversions = aversion_keywords(alimentos_no_deseados)
+        candidates = [self.allowed(tipo, allergens, aversions, vegetariano) for tipo in MEAL_TYPES]
+        if not all(candidates):
+            return []
+
+        combos, scales, totals, relative = self.rank_days(candidates, targets)
+
+        # Best-first among the combinations
+        # within tolerance, preferring combinations whose dishes were used the fewest times this week
+        within = (relative[:, 0] <= CALORIE_TOLERANCE) & (relative[:, 1:] <= MACRO_TOLERANCE).all(axis=1)
+        ranks = np.flatnonzero(within)[:RANK_POOL]
+        if len(ranks) == 0:
+            ranks = np.arange(min(RANK_POOL, len(combos)))
+        pool = combos[ranks]
+        usage = np.zeros(len(self.dishes), dtype=np.int64)
+        order = np.arange(len(pool))
+        picked: List[int] = []
+        for _ in range(days):
+            repeats = usage[pool].sum(axis=1)
+            repeats[picked] += len(MEAL_TYPES) * days
+            choice = int(np.argmin(repeats * len(pool) + order))
+            picked.append(choice)
+            usage[pool[choice]] += 1
+
+        return [
+            self._build_day(number, combos[rank], float(scales[rank]), totals[rank], relative[rank], candidates)
+            for number, rank in enumerate(ranks[picked].tolist(), start=1)
+        ]
+
+    def _option(self, index: int, etiqueta: str, scale: float) -> dict:
+        d = self.dishes[index]
+        return {
+            "nombre": d["nombre"],
+            "etiqueta": etiqueta,
+            "ingredientes": [{"item": item, "cantidad": _format_quantity(quantity, unit, scale)}
+                             for item, quantity, unit in d["ingredientes"]],
+            "preparacion": d["preparacion"],
+            "tiempo_prep": d["tiempo_prep"],
+            "calorias": int(round(d["calorias"] * scale)),
+        }
+
+    def _alternative(self, chosen: int, tag: str, candidates: List[int]) -> Optional[int]:
+        """Tagged dish of the same meal whose calories are closest to the chosen one"""
+        options = [i for i in candidates if i != chosen and self.dishes[i][tag]]
+        if not options:
+            return None
+        kcal = self.nutrition[options, 0]
+        return options[int(np.argmin(np.abs(kcal - self.nutrition[chosen, 0])))]
+
+    def _build_day(self, number: int, combo, scale: float, totals, relative, candidates) -> dict:
+        comidas = []
+        for tipo, chosen, allowed in zip(MEAL_TYPES, combo.tolist(), candidates):
+            opciones = [self._option(chosen, "Recomendado", scale)]
+            for tag, etiqueta in (("rapido", "Rápido"), ("economico", "Económico")):
+                alternative = self._alternative(chosen, tag, allowed)
+                if alternative is not None:
+                    option_scale = scale * self.nutrition[chosen, 0] / self.nutrition[alternative, 0]
+                    opciones.append(self._option(alternative, etiqueta, round(option_scale, 1)))
+            comidas.append({"tipo": tipo, "opciones": opciones})
+        return {
+            "dia": f"Día {number}",
+            "comidas": comidas,
+            "totales": {n: int(round(float(v))) for n, v in zip(NUTRIENTS, totals)},
+            "dentro_de_tolerancia": bool(relative[0] <= CALORIE_TOLERANCE and (relative[1:] <= MACRO_TOLERANCE).all()),
+        }
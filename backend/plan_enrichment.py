@@ -0,0 +1,151 @@
+"""
+Background enrichment of draft plans.
+
+With tiered generation a weekly plan is first stored as a draft: the week
+composed locally, with recipes, ingredients and calories but no
+substitutions, tips or personalized recommendations. An enrich job then
+asks the LLM for those, a few days per call, and stores every enriched day
+as it arrives as a new `version` of the plan, recording it in
+`enrichment.days` so a retried job only requests what is still missing.
+
+Only those additions are enriched. The draft's recipes already carry their
+steps and ingredient quantities, scaled by the composer to the user's
+targets and checked by the nutrition validation, so the model is not asked
+to rewrite them: changed quantities would move the calories off target.
+
+Substitutions come from the model, so each enriched day is scanned for the
+user's allergens and unwanted foods again and offending substitutions are
+dropped before it is stored. Once every day and the recommendations are in,
+the plan is validated again and becomes stage "full"; an enrichment that
+runs out of attempts is flagged as failed on the plan and the draft stays.
+"""
+import asyncio
+import copy
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from allergen_scanner import remove_conflicts
+from plan_prompts import PLAN_SYSTEM_MESSAGE, build_enrich_prompt, build_extras_prompt, build_profile_prompt
+from plan_wire import apply_enrichment
+
+logger = logging.getLogger(__name__)
+
+# (session prefix, system message, prompt) -> parsed response of one LLM call
+Generate = Callable[[str, str, str], Awaitable[dict]]
+
+
+def _day_number(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def enriched_days(chunk: List[int], section: Any) -> Dict[int, dict]:
+    """Day number -> enriched day of the response to a request for `chunk`.
+
+    The numbers the model states ("3" counts as 3) are used when they are
+    distinct days of the chunk; otherwise days are matched by position.
+    """
+    days = section.get("enriquecidos") if isinstance(section, dict) else None
+    days = [d for d in days or [] if isinstance(d, dict)]
+    numbers = [_day_number(d.get("d")) for d in days]
+    if len(set(numbers)) != len(numbers) or not set(numbers) <= set(chunk):
+        numbers = chunk
+    return dict(zip(numbers, days))
+
+
+class PlanEnricher:
+    """Completes draft plans of a `meal_plans` collection in place"""
+
+    def __init__(self, collection, scan: Callable[[dict, dict], List[dict]],
+                 validate: Callable[[dict, int, dict], Optional[dict]], days_per_chunk: int = 2,
+                 concurrency: int = 5):
+        self.collection = collection
+        self.scan = scan
+        self.validate = validate
+        self.days_per_chunk = days_per_chunk
+        self.concurrency = concurrency
+
+    async def store_revision(self, plan_id: str, changes: dict, enriched_day: Optional[int] = None):
+        """Update a plan in place as a new version"""
+        update = {"$set": {**changes, "updated_at": datetime.now(timezone.utc).isoformat()}, "$inc": {"version": 1}}
+        if enriched_day is not None:
+            update["$addToSet"] = {"enrichment.days": enriched_day}
+        await self.collection.update_one({"id": plan_id}, update)
+
+    async def fail(self, plan_id: str, error: str):
+        """Leave the plan as a draft, flagged for the admin views"""
+        await self.collection.update_one({"id": plan_id}, {"$set": {
+            "enrichment.status": "failed",
+            "enrichment.error": error,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }})
+
+    def strip_conflicts(self, day: dict, q_data: dict) -> int:
+        """Drop the substitutions of `day` with the user's allergens or unwanted foods; returns how many"""
+        single = {"dias": [day]}
+        conflicts = [c for c in self.scan(single, q_data) if c["campo"] == "sustituciones"]
+        remove_conflicts(single, conflicts)
+        return len(conflicts)
+
+    async def enrich(self, plan: dict, q_data: dict, generate: Generate) -> bool:
+        """Request what `plan` still lacks, storing each part as it arrives; True once nothing is left"""
+        profile = build_profile_prompt(q_data, plan["calories_target"], plan["macros"])
+        enrichment = plan.get("enrichment") or {}
+        plan_data = plan["plan_data"]
+        dias = plan_data["dias"]
+        pending = [n for n in range(1, len(dias) + 1) if n not in enrichment.get("days", [])]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def enrich_days(chunk: List[int]) -> List[int]:
+            async with semaphore:
+                prompt = build_enrich_prompt(profile, {n: dias[n - 1] for n in chunk})
+                section = await generate("meal-plan-enrich", PLAN_SYSTEM_MESSAGE, prompt)
+            by_number = enriched_days(chunk, section)
+            stored = []
+            for number in chunk:
+                day = copy.deepcopy(dias[number - 1])
+                if not apply_enrichment(day, by_number.get(number)):
+                    continue
+                stripped = self.strip_conflicts(day, q_data)
+                if stripped:
+                    logger.info(f"Dropped {stripped} conflicting substitutions from day {number} of plan {plan['id']}")
+                await self.store_revision(plan["id"], {f"plan_data.dias.{number - 1}": day}, enriched_day=number)
+                dias[number - 1] = day
+                stored.append(number)
+            return stored
+
+        async def enrich_extras() -> bool:
+            async with semaphore:
+                extras = await generate("meal-plan-extras", PLAN_SYSTEM_MESSAGE, build_extras_prompt(profile, q_data))
+            extras = {key: value for key, value in extras.items() if key != "dias"}
+            changes = {f"plan_data.{key}": value for key, value in extras.items()}
+            await self.store_revision(plan["id"], {**changes, "enrichment.extras": True})
+            plan_data.update(extras)
+            return True
+
+        chunks = [pending[i:i + self.days_per_chunk] for i in range(0, len(pending), self.days_per_chunk)]
+        tasks = [enrich_days(chunk) for chunk in chunks]
+        if not enrichment.get("extras"):
+            tasks.append(enrich_extras())
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for error in (r for r in results if isinstance(r, Exception)):
+            logger.error(f"Error enriching plan {plan['id']}: {error}")
+
+        enriched = set(enrichment.get("days", []))
+        enriched.update(n for r in results[:len(chunks)] if isinstance(r, list) for n in r)
+        extras_done = enrichment.get("extras") or (len(results) > len(chunks) and results[-1] is True)
+        if len(enriched) < len(dias) or not extras_done:
+            return False
+
+        # The model's substitutions are part of the plan now: validate what the user sees
+        validation = self.validate(plan_data, plan["calories_target"], plan["macros"])
+        if validation is not None:
+            validation["conflictos"] = self.scan(plan_data, q_data)
+        await self.store_revision(plan["id"], {"stage": "full", "validation": validation,
+                                               "enrichment.status": "complete"})
+        plan.update(stage="full", validation=validation)
+        logger.info(f"Plan {plan['id']} enriched")
+        return True
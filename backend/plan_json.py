@@ -0,0 +1,202 @@
+"""
+Incremental parsing of plan JSON as it streams from the LLM.
+
+The model answers with one JSON object whose `dias` array holds a complete
+day per element. DayStreamParser scans the text as it arrives (string and
+escape aware, each character visited once) and hands back every element of
+`dias` as soon as its closing brace is seen, so callers can publish Day 1
+while the remaining days are still being generated.
+
+parse_json_response() is the tolerant counterpart for complete responses:
+it takes the outermost object out of any surrounding prose or code fences,
+repairs common defects (trailing commas, raw newlines inside strings) and,
+for a truncated response, keeps only the days that were complete.
+"""
+import json
+from typing import List, Optional, Tuple
+
+
+class DayStreamParser:
+    """Feed LLM text chunks; collect each completed element of the top-level `dias` array"""
+
+    def __init__(self, array_key: str = "dias"):
+        self.array_key = array_key
+        self.buffer = ""
+        self.days: List[dict] = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._element_start: Optional[int] = None
+        self._array_closed = False
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Consume a chunk and return the days completed by it (in order)"""
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = buffer[self._string_start + 1:pos]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                if (char == "[" and self._depth == 1 and self._last_key == self.array_key
+                        and self._array_depth is None and not self._array_closed):
+                    self._array_depth = self._depth + 1
+                elif char == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._element_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if char == "}" and self._depth == self._array_depth and self._element_start is not None:
+                        day = self._decode(buffer[self._element_start:pos + 1])
+                        if day is not None:
+                            self.days.append(day)
+                            completed.append(day)
+                        self._element_start = None
+                    elif char == "]" and self._depth == self._array_depth - 1:
+                        # End of `dias`; anything later belongs to other sections
+                        self._array_depth = None
+                        self._array_closed = True
+
+        self._pos = len(buffer)
+        return completed
+
+    @property
+    def text(self) -> str:
+        return self.buffer
+
+    @staticmethod
+    def _decode(fragment: str) -> Optional[dict]:
+        for candidate in (fragment, repair_json(fragment)):
+            try:
+                value = json.loads(candidate)
+            except ValueError:
+                continue
+            return value if isinstance(value, dict) else None
+        return None
+
+
+def extract_object(text: str) -> Tuple[str, bool]:
+    """Outermost JSON object in `text` and whether it is complete (closed)"""
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in response")
+    depth, in_string, escape = 0, False, False
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:pos + 1], True
+    return text[start:], False
+
+
+def repair_json(fragment: str) -> str:
+    """Drop trailing commas and escape raw control characters inside strings"""
+    out = []
+    in_string, escape = False, False
+    length = len(fragment)
+    for pos, char in enumerate(fragment):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            elif char in "\n\r\t":
+                char = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}[char]
+            out.append(char)
+            continue
+        if char == '"':
+            in_string = True
+        elif char == ",":
+            following = pos + 1
+            while following < length and fragment[following].isspace():
+                following += 1
+            if following == length or fragment[following] in "}]":
+                continue
+        out.append(char)
+    return "".join(out)
+
+
+def close_truncated(fragment: str) -> str:
+    """Cut a truncated object back to its last closed container and close the open brackets"""
+    stack: List[str] = []
+    safe_end, safe_stack = 0, ()
+    in_string, escape = False, False
+    for pos, char in enumerate(fragment):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            if len(stack) == 1:
+                safe_end, safe_stack = pos + 1, tuple(stack)
+        elif char in "}]" and stack:
+            stack.pop()
+            safe_end, safe_stack = pos + 1, tuple(stack)
+    return fragment[:safe_end] + "".join(reversed(safe_stack))
+
+
+def parse_json_response(text: str, allow_truncated: bool = True, array_key: str = "dias") -> dict:
+    """Parse an LLM response into a dict, repairing it when needed.
+
+    A truncated response keeps only the complete elements of `array_key`;
+    with allow_truncated=False it raises ValueError instead.
+    """
+    fragment, complete = extract_object(text)
+    value = None
+    for candidate in (fragment, repair_json(fragment)):
+        try:
+            value = json.loads(candidate)
+            break
+        except ValueError:
+            continue
+    if value is None:
+        if complete or not allow_truncated:
+            raise ValueError("Response is not valid JSON")
+        value = json.loads(repair_json(close_truncated(fragment)))
+        if isinstance(value, dict) and array_key in value:
+            parser = DayStreamParser(array_key)
+            parser.feed(fragment)
+            value[array_key] = parser.days
+    if not isinstance(value, dict):
+        raise ValueError("Response is not a JSON object")
+    return value
@@ -0,0 +1,307 @@
+"""
+Prompts of the weekly plan sub-requests.
+
+Everything that does not depend on the user (role, recipe rules and the JSON
+examples) lives in PLAN_SYSTEM_MESSAGE, shared by every section: days
+(GENERA), recommendations (RECOMENDACIONES) and the substitutions and tips
+for the options of a draft plan (ENRIQUECE). Providers only cache prefixes
+of at least CACHEABLE_PREFIX_TOKENS and no section's instructions reach that
+alone, so they are one message, identical for every call, which all calls
+of a plan (and of every other user) reuse from the cache. The user message
+is a compact suffix that starts with its task: the days to generate, the
+profile (fields with nothing to report are left out) and the meals still
+missing. Days are requested in the compact wire schema of plan_wire.py.
+
+PROMPT_VERSION identifies the templates; bump it whenever they change so
+benchmark_prompts.py can compare token counts and latency across versions.
+"""
+import math
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to an estimate
+    tiktoken = None
+
+from recipe_library import MEAL_TYPES
+
+PROMPT_VERSION = "v4-shared-prefix"
+TOKENIZER_ENCODING = "o200k_base"
+# Providers only cache prompt prefixes from this length on
+CACHEABLE_PREFIX_TOKENS = 1024
+
+PLAN_SYSTEM_MESSAGE = """Eres un nutriólogo experto que crea planes alimenticios personalizados en español. Siempre respondes en JSON válido.
+
+Cada solicitud empieza con su TAREA: GENERA (días del plan), RECOMENDACIONES (recomendaciones del plan semanal) o ENRIQUECE (sustituciones y tips de opciones ya elegidas). Sigue solo las instrucciones de esa tarea y responde solo con su JSON.
+
+=== TAREA GENERA ===
+La solicitud indica los días a generar y el PERFIL del usuario en formato compacto (solo se listan los datos relevantes). Genera SOLO esos días con 3 OPCIONES por cada comida y recetas DETALLADAS. Los demás días del plan se generan por separado, así que varía la proteína principal y el estilo de los platillos de un día a otro. Respeta las calorías y macros de la META, las alergias, la dieta vegetariana y los alimentos a evitar.
+
+ESTRUCTURA:
+1. Para cada día: 4 tiempos de comida: Desayuno, Comida, Snack, Cena (si la solicitud lista tiempos de comida concretos, genera ÚNICAMENTE esos)
+2. Para CADA comida genera 3 OPCIONES:
+   - Opción 1: Recomendado (la más nutritiva y balanceada)
+   - Opción 2: Rápido (para días con poco tiempo, max 10 min)
+   - Opción 3: Económico (ingredientes accesibles y económicos)
+
+FORMATO DE CADA RECETA (MUY IMPORTANTE):
+- Nombre creativo y apetitoso
+- Lista de ingredientes con cantidades EXACTAS para 1 porción
+- Preparación paso a paso detallada (4-6 pasos claros)
+- Tiempo de preparación
+- Calorías aproximadas de la porción
+- SUSTITUCIONES: 2-3 alternativas para ingredientes principales
+- TIP NUTRIPLAN: Consejo práctico relacionado con el objetivo del usuario
+
+Responde en formato JSON COMPACTO, con un elemento en "dias" por cada día solicitado y en el mismo orden. Claves: c = comidas, t = tipo de comida, o = las 3 opciones en orden (Recomendado, Rápido, Económico), n = nombre, i = ingredientes como [ingrediente, cantidad], p = pasos de preparación, m = tiempo de preparación, k = calorías, s = sustituciones, x = tip. Escribe el JSON sin sangrías ni saltos de línea (el ejemplo tiene sangrías solo para que se lea):
+{
+  "dias": [
+    {
+      "c": [
+        {
+          "t": "Desayuno",
+          "o": [
+            {
+              "n": "Overnight Oats Vainilla + Plátano + Chía",
+              "i": [
+                ["Avena", "1/2 taza (40g)"],
+                ["Leche descremada o vegetal sin azúcar", "3/4 taza"],
+                ["Yogurt griego natural", "1/3 taza"],
+                ["Plátano", "1/2 pieza (en rodajas)"],
+                ["Chía", "1 cda"],
+                ["Canela", "1/2 cdita"],
+                ["Vainilla", "3-4 gotas"]
+              ],
+              "p": [
+                "En un frasco, mezcla avena, leche, yogurt, chía, canela y vainilla",
+                "Agrega el plátano en rodajas por encima",
+                "Tapa y refrigera mínimo 4 horas (ideal: toda la noche)",
+                "Antes de comer, mezcla y ajusta la textura con un chorrito extra de leche si lo necesitas"
+              ],
+              "m": "10 min + 4h refrigeración",
+              "k": 380,
+              "s": [
+                "Plátano: papaya (1 taza) o pera (1/2 pieza en cubos)",
+                "Yogurt griego: kéfir natural (3/4 taza)",
+                "Chía: linaza molida (1 cda)"
+              ],
+              "x": "Desayuno perfecto para turnos: prepara 2 frascos en 10 minutos y sales con el plan en la bolsa"
+            }
+          ]
+        }
+      ]
+    }
+  ]
+}
+
+=== TAREA RECOMENDACIONES ===
+La solicitud trae el PERFIL del usuario en formato compacto (solo se listan los datos relevantes). Genera las recomendaciones de su plan alimenticio semanal.
+
+RECOMENDACIONES ADICIONALES (personaliza según el perfil):
+Incluye 8-10 recomendaciones específicas sobre:
+- Sueño y descanso
+- Manejo de antojos
+- Planeación de comidas
+- Opciones para comer fuera
+- Guía para restaurantes según el presupuesto
+- Consideraciones por padecimientos (si los hay)
+- Expectativas de progreso realistas
+- Hidratación (usa el agua mínima de la solicitud)
+- Suplementación básica (si aplica)
+
+Responde en formato JSON:
+{
+  "recomendaciones_adicionales": {
+    "sueno": "Busca 7-8 horas cuando sea posible. Si duermes poco, prioriza cena ligera con proteína",
+    "antojos": "Si aparecen a media tarde, revisa que tu comida tenga proteína + carbo medido",
+    "planeacion": "Elige 2 días a la semana para adelantar: arroz/quinoa + pollo + verduras (2 porciones)",
+    "desayunos_fuera": "Arma 2 opciones base por semana: (1) overnight oats o pudín de chía; (2) sándwich o wrap de pavo",
+    "restaurantes": "Regla simple: 1 proteína a la plancha + 1 verdura + 1 carbo medido. Salsas aparte",
+    "padecimientos": "Consideración específica según condiciones del usuario",
+    "progreso": "Energía más estable en 10-14 días; cambios visibles en 8-12 semanas con constancia",
+    "hidratacion": "Mínimo 2.5L de agua al día, más si haces ejercicio",
+    "guia_restaurantes": "En taquería: 3 tacos de maíz con carne asada/pollo, sin fritura; agrega nopales/cebolla/cilantro; evita refresco"
+  }
+}
+
+=== TAREA ENRIQUECE ===
+La solicitud indica los días a completar, el PERFIL del usuario en formato compacto y, por día, las opciones ya elegidas de cada comida con sus calorías, en orden (Recomendado, Rápido, Económico). NO cambies los platillos: para CADA opción agrega
+- SUSTITUCIONES: 2-3 alternativas para sus ingredientes principales, con cantidad, que respeten las alergias, la dieta vegetariana y los alimentos a evitar
+- TIP NUTRIPLAN: un consejo práctico y breve relacionado con el objetivo del usuario
+
+Responde en formato JSON COMPACTO, con un elemento en "enriquecidos" por cada día solicitado. Claves: d = número de día, c = comidas, t = tipo de comida, o = las opciones en el mismo orden de la solicitud, s = sustituciones, x = tip. Escribe el JSON sin sangrías ni saltos de línea (el ejemplo tiene sangrías solo para que se lea):
+{
+  "enriquecidos": [
+    {
+      "d": 1,
+      "c": [
+        {
+          "t": "Desayuno",
+          "o": [
+            {
+              "s": ["Plátano: papaya (1 taza)", "Yogurt griego: kéfir natural (3/4 taza)"],
+              "x": "Prepara 2 frascos la noche anterior y sales con el desayuno resuelto"
+            }
+          ]
+        }
+      ]
+    }
+  ]
+}"""
+
+
+def _listed(values) -> str:
+    return ", ".join(str(v) for v in values or [] if v and str(v).lower() not in ("ninguno", "ninguna"))
+
+
+def build_profile_prompt(q_data: dict, calories_target: int, macros: dict) -> str:
+    """Compact profile shared by every weekly sub-request (no name: plans are cached across users)"""
+    lines = [f"PERFIL: {q_data['edad']} años, {q_data['sexo']}, {q_data['peso']} kg, {q_data['estatura']} cm"]
+
+    objetivo = f"OBJETIVO: {q_data['objetivo_principal']}"
+    if _listed(q_data.get("objetivos_secundarios")):
+        objetivo += f" (secundarios: {_listed(q_data.get('objetivos_secundarios'))})"
+    lines.append(objetivo)
+
+    actividad = [label for key, label in (("trabajo_oficina", "oficina"), ("trabajo_fisico", "trabajo físico"),
+                                          ("turnos_rotativos", "turnos rotativos")) if q_data.get(key)]
+    if q_data.get("ejercicio_adicional") or q_data.get("dias_ejercicio"):
+        actividad.append(f"ejercicio {q_data.get('ejercicio_adicional') or 'sin especificar'} "
+                         f"{q_data.get('dias_ejercicio', 0)} días/semana")
+    if actividad:
+        lines.append(f"ACTIVIDAD: {'; '.join(actividad)}")
+
+    salud = []
+    if _listed(q_data.get("padecimientos")):
+        salud.append(f"padecimientos: {_listed(q_data.get('padecimientos'))}")
+    if q_data.get("medicamentos_controlados"):
+        salud.append("medicamentos controlados")
+    if _listed(q_data.get("lesiones_restricciones")):
+        lesion = f"lesiones: {_listed(q_data.get('lesiones_restricciones'))}"
+        if q_data.get("descripcion_lesion"):
+            lesion += f" ({q_data['descripcion_lesion']})"
+        salud.append(lesion)
+    if _listed(q_data.get("sintomas")):
+        salud.append(f"síntomas: {_listed(q_data.get('sintomas'))}")
+    if salud:
+        lines.append(f"SALUD: {'; '.join(salud)}")
+
+    habitos = []
+    if q_data.get("fuma"):
+        habitos.append("fuma")
+    if q_data.get("consume_alcohol"):
+        habitos.append(f"alcohol {q_data.get('frecuencia_alcohol') or ''}".strip())
+    if habitos:
+        lines.append(f"HÁBITOS: {'; '.join(habitos)}")
+
+    alimentacion = []
+    if _listed(q_data.get("alergias")):
+        alimentacion.append(f"alergias: {_listed(q_data.get('alergias'))}")
+    if q_data.get("vegetariano"):
+        alimentacion.append("vegetariano")
+    if _listed(q_data.get("alimentos_no_deseados")):
+        alimentacion.append(f"evitar: {_listed(q_data.get('alimentos_no_deseados'))}")
+    if q_data.get("platillo_favorito"):
+        alimentacion.append(f"favorito: {q_data['platillo_favorito']}")
+    if q_data.get("frecuencia_restaurantes"):
+        alimentacion.append(f"restaurantes: {q_data['frecuencia_restaurantes']}, "
+                            f"${q_data.get('ticket_promedio', 0)} promedio")
+    if alimentacion:
+        lines.append(f"ALIMENTACIÓN: {'; '.join(alimentacion)}")
+
+    lines.append(f"META: {calories_target} kcal/día | proteínas {macros['proteinas']}g | "
+                 f"carbohidratos {macros['carbohidratos']}g | grasas {macros['grasas']}g")
+    return "\n".join(lines)
+
+
+def build_days_prompt(profile: str, day_numbers: List[int], meals: Optional[Dict[int, List[str]]] = None,
+                      meal_calories: Optional[Dict[str, int]] = None,
+                      problems: Optional[Dict[int, Dict[str, str]]] = None) -> str:
+    """Request for a group of days; `meals` limits a day to the meal types still missing
+    and `meal_calories` states the calories expected from each of them.
+
+    `problems` (day number -> meal type -> what was wrong) makes it a request
+    to replace those meals: every one of them is listed with its problem,
+    whole days included, so it never repeats the request being replaced.
+    """
+    first, last = day_numbers[0], day_numbers[-1]
+    dias = f"Día {first}" if first == last else f"Días {first} a {last}"
+    lines = [f"GENERA: {dias}", profile]
+
+    def describe(number: int, tipo: str) -> str:
+        details = [f"~{meal_calories[tipo]} kcal"] if meal_calories and tipo in meal_calories else []
+        if problems and problems.get(number, {}).get(tipo):
+            details.append(f"antes: {problems[number][tipo]}")
+        return f"{tipo} ({'; '.join(details)})" if details else tipo
+
+    listed = {n: tipos for n, tipos in (meals or {}).items()
+              if n in day_numbers and tipos and (problems or len(tipos) < len(MEAL_TYPES))}
+    if listed:
+        lines.append("REEMPLAZA ESTOS TIEMPOS DE COMIDA, corrigiendo lo indicado (el resto ya está cubierto):"
+                     if problems else "SOLO ESTOS TIEMPOS DE COMIDA (el resto ya está cubierto):")
+        lines += [f"- Día {n}: {', '.join(describe(n, t) for t in tipos)}" for n, tipos in sorted(listed.items())]
+    return "\n".join(lines)
+
+
+def build_enrich_prompt(profile: str, days: Dict[int, dict]) -> str:
+    """Request for substitutions and tips of the options already in `days` (day number -> plan day)"""
+    numbers = sorted(days)
+    first, last = numbers[0], numbers[-1]
+    lines = [f"ENRIQUECE: {f'Día {first}' if first == last else f'Días {first} a {last}'}", profile]
+    for number in numbers:
+        lines.append(f"Día {number}")
+        for comida in days[number].get("comidas", []):
+            opciones = comida.get("opciones") or [comida]
+            described = " | ".join(f"{o.get('nombre')} ({o.get('calorias')} kcal)" for o in opciones)
+            lines.append(f"- {comida.get('tipo')}: {described}")
+    return "\n".join(lines)
+
+
+def build_extras_prompt(profile: str, q_data: dict) -> str:
+    agua = q_data["peso"] * 35 / 1000
+    return f"RECOMENDACIONES\n{profile}\nAGUA MÍNIMA: {agua:.1f}L al día"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception:
+        # The encoding file is downloaded on first use; offline hosts estimate instead
+        return None
+
+
+def tokenizer_name() -> str:
+    return TOKENIZER_ENCODING if _encoding() is not None else "estimado"
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of `text` with the model's encoding, or ~4 UTF-8 bytes per token without tiktoken"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+@lru_cache(maxsize=16)
+def _prefix_tokens(system_message: str) -> int:
+    return count_tokens(system_message)
+
+
+def prompt_budget(system_message: str, prompt: str, budget: int) -> dict:
+    """Token report of one request: static prefix, per-user suffix and whether it fits `budget`"""
+    prefix = _prefix_tokens(system_message)
+    suffix = count_tokens(prompt)
+    return {
+        "version": PROMPT_VERSION,
+        "tokenizer": tokenizer_name(),
+        "prefix_tokens": prefix,
+        "suffix_tokens": suffix,
+        "total_tokens": prefix + suffix,
+        "prefix_cacheable": prefix >= CACHEABLE_PREFIX_TOKENS,
+        "budget": budget,
+        "within_budget": prefix + suffix <= budget,
+    }
@@ -0,0 +1,77 @@
+"""
+JSON schema of the plan days returned by the LLM.
+
+The validator is built once at import (Draft 7) and reused for every day.
+Days that do not match are replaced by None instead of being stored, so
+the caller requests them again (or fills them locally) and the position of
+the remaining days is kept.
+"""
+from typing import List, Optional
+
+from jsonschema import Draft7Validator
+
+from recipe_library import MEAL_TYPES
+
+INGREDIENT_SCHEMA = {
+    "anyOf": [
+        {"type": "string", "minLength": 1},
+        {
+            "type": "object",
+            "required": ["item"],
+            "properties": {"item": {"type": "string", "minLength": 1}, "cantidad": {"type": ["string", "number"]}},
+        },
+    ]
+}
+
+OPTION_SCHEMA = {
+    "type": "object",
+    "required": ["nombre", "ingredientes"],
+    "properties": {
+        "nombre": {"type": "string", "minLength": 1},
+        "etiqueta": {"type": "string"},
+        "ingredientes": {"type": "array", "minItems": 1, "items": INGREDIENT_SCHEMA},
+        "preparacion": {"type": "array", "items": {"type": "string"}},
+        "tiempo_prep": {"type": ["string", "number"]},
+        "calorias": {"type": ["number", "string"]},
+        "sustituciones": {"type": "array", "items": {"type": "string"}},
+        "tip": {"type": "string"},
+    },
+}
+
+MEAL_SCHEMA = {
+    "type": "object",
+    "required": ["tipo"],
+    "properties": {
+        "tipo": {"enum": list(MEAL_TYPES)},
+        "opciones": {"type": "array", "minItems": 1, "items": OPTION_SCHEMA},
+    },
+    # Weekly plans carry 3 options per meal; the trial day has the recipe on the meal itself
+    "anyOf": [{"required": ["opciones"]}, OPTION_SCHEMA],
+}
+
+DAY_SCHEMA = {
+    "type": "object",
+    "required": ["comidas"],
+    "properties": {
+        "dia": {"type": "string"},
+        "comidas": {"type": "array", "minItems": 1, "items": MEAL_SCHEMA},
+    },
+}
+
+Draft7Validator.check_schema(DAY_SCHEMA)
+DAY_VALIDATOR = Draft7Validator(DAY_SCHEMA)
+
+
+def day_errors(day) -> List[str]:
+    """Schema violations of one day, as "path: message" strings"""
+    return [
+        f"{'/'.join(str(p) for p in error.absolute_path) or 'dia'}: {error.message}"
+        for error in DAY_VALIDATOR.iter_errors(day)
+    ]
+
+
+def validated_days(days) -> List[Optional[dict]]:
+    """Same positions as `days`, with None for every day that does not match the schema"""
+    if not isinstance(days, list):
+        return []
+    return [day if DAY_VALIDATOR.is_valid(day) else None for day in days]
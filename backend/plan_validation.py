@@ -0,0 +1,141 @@
+"""
+Validation of plan nutrition against the calorie and macro targets.
+
+Every ingredient of every option is resolved once (fuzzy food lookup plus
+quantity parsing) into a flat table of (day, meal, option, food, grams).
+Nutrients for the whole plan are then one gather from the memory-mapped
+food table and per-option, per-meal and per-day totals are segmented sums
+(np.add.at), so a full week is validated in a single vectorized pass.
+
+Day totals use the first option of each meal (Recomendado); every option is
+also checked against its meal's share of the daily calories, since users
+may pick any of them.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from food_db import FoodDatabase
+from ingredients import parse_quantity, grams_for, split_ingredient
+from recipe_library import MEAL_CALORIE_SHARE
+
+NUTRIENTS = ("calorias", "proteinas", "carbohidratos", "grasas")
+DAY_CALORIE_TOLERANCE = 0.10
+DAY_MACRO_TOLERANCE = 0.20
+MEAL_CALORIE_TOLERANCE = 0.25
+# Meals whose ingredients resolve to less than this share are not judged
+MIN_COVERAGE = 0.6
+
+
+class PlanValidator:
+    """Computes nutrition totals of plan_data and flags days and meals outside tolerance"""
+
+    def __init__(self, food_db: FoodDatabase):
+        self.food_db = food_db
+
+    def _flatten(self, plan_data: dict):
+        """Rows of (option, food, grams) plus the (day, meal, option number) of every option"""
+        option_keys: List[Tuple[int, int, int]] = []
+        rows: List[Tuple[int, int, float]] = []
+        unresolved: List[int] = []
+        for day_index, day in enumerate(plan_data.get("dias") or []):
+            for meal_index, comida in enumerate(day.get("comidas") or []):
+                opciones = comida.get("opciones") or [comida]
+                for option_number, option in enumerate(opciones):
+                    option_id = len(option_keys)
+                    option_keys.append((day_index, meal_index, option_number))
+                    unresolved.append(0)
+                    for ingredient in option.get("ingredientes") or []:
+                        name, cantidad = split_ingredient(ingredient)
+                        food = self.food_db.match(name)
+                        grams = grams_for(parse_quantity(cantidad), food[1]) if food else None
+                        if food is None or grams is None:
+                            unresolved[option_id] += 1
+                            continue
+                        rows.append((option_id, food[0], grams))
+        return option_keys, rows, unresolved
+
+    def validate(self, plan_data: dict, calories_target: float, macros: Dict[str, float]) -> dict:
+        option_keys, rows, unresolved = self._flatten(plan_data)
+        targets = np.array([calories_target] + [macros[n] for n in NUTRIENTS[1:]], dtype=np.float64)
+
+        option_totals = np.zeros((len(option_keys), len(NUTRIENTS)))
+        resolved = np.zeros(len(option_keys))
+        if rows:
+            option_ids, food_ids, grams = (np.array(column) for column in zip(*rows))
+            nutrients = np.asarray(self.food_db.values[food_ids.astype(np.int64), :4], dtype=np.float64)
+            np.add.at(option_totals, option_ids.astype(np.int64), nutrients * (grams[:, None] / 100))
+            np.add.at(resolved, option_ids.astype(np.int64), 1)
+        coverage = resolved / np.maximum(resolved + np.array(unresolved), 1)
+
+        keys = np.array(option_keys, dtype=np.int64).reshape(-1, 3)
+        dias = plan_data.get("dias") or []
+        report_days = []
+        for day_index, day in enumerate(dias):
+            in_day = keys[:, 0] == day_index
+            first = in_day & (keys[:, 2] == 0)
+            day_totals = option_totals[first].sum(axis=0)
+            day_deviation = (day_totals - targets) / targets
+            day_coverage = float(coverage[first].mean()) if first.any() else 0.0
+
+            meals = []
+            for meal_index, comida in enumerate(day.get("comidas") or []):
+                options = np.flatnonzero(in_day & (keys[:, 1] == meal_index))
+                meal_target = calories_target * MEAL_CALORIE_SHARE.get(comida.get("tipo"), 0.25)
+                deviations = (option_totals[options, 0] - meal_target) / meal_target
+                judged = coverage[options] >= MIN_COVERAGE
+                meals.append({
+                    "tipo": comida.get("tipo"),
+                    "calorias": [int(round(v)) for v in option_totals[options, 0]],
+                    "desviacion_calorias": [round(float(v), 3) for v in deviations],
+                    "cobertura": round(float(coverage[options].mean()), 2) if len(options) else 0.0,
+                    "dentro_de_tolerancia": bool(np.all(~judged | (np.abs(deviations) <= MEAL_CALORIE_TOLERANCE))),
+                })
+
+            judged_day = day_coverage >= MIN_COVERAGE
+            within = (abs(day_deviation[0]) <= DAY_CALORIE_TOLERANCE
+                      and bool(np.all(np.abs(day_deviation[1:]) <= DAY_MACRO_TOLERANCE)))
+            report_days.append({
+                "dia": day.get("dia"),
+                "totales": {n: int(round(v)) for n, v in zip(NUTRIENTS, day_totals)},
+                "desviacion": {n: round(float(v), 3) for n, v in zip(NUTRIENTS, day_deviation)},
+                "cobertura": round(day_coverage, 2),
+                "dentro_de_tolerancia": bool(not judged_day or within),
+                "comidas": meals,
+            })
+
+        judged_days = [d for d in report_days if d["cobertura"] >= MIN_COVERAGE]
+        return {
+            "dias": report_days,
+            "dentro_de_tolerancia": all(d["dentro_de_tolerancia"] and all(m["dentro_de_tolerancia"] for m in d["comidas"])
+                                        for d in report_days),
+            "max_desviacion_calorias": max((abs(d["desviacion"]["calorias"]) for d in judged_days), default=0.0),
+        }
+
+
+def meals_to_regenerate(report: dict, limit: int) -> Dict[int, List[str]]:
+    """Day number -> meal types worth regenerating, worst first and at most `limit` meals.
+
+    In days outside tolerance that is every meal outside its own tolerance
+    (or the meal with the largest deviation when all of them pass). Days
+    within tolerance only contribute options that miss their meal target by
+    more than twice the tolerance.
+    """
+    flagged: List[Tuple[float, int, str]] = []
+    for number, day in enumerate(report["dias"], start=1):
+        worst = {meal["tipo"]: max((abs(d) for d in meal["desviacion_calorias"]), default=0.0)
+                 for meal in day["comidas"] if meal["cobertura"] >= MIN_COVERAGE}
+        if day["dentro_de_tolerancia"]:
+            day_flags = [(w, number, tipo) for tipo, w in worst.items() if w > 2 * MEAL_CALORIE_TOLERANCE]
+        else:
+            day_flags = [(worst[meal["tipo"]], number, meal["tipo"])
+                         for meal in day["comidas"] if not meal["dentro_de_tolerancia"] and meal["tipo"] in worst]
+            if not day_flags and worst:
+                tipo = max(worst, key=worst.get)
+                day_flags = [(abs(day["desviacion"]["calorias"]), number, tipo)]
+        flagged.extend(day_flags)
+
+    selected: Dict[int, List[str]] = {}
+    for _, number, tipo in sorted(flagged, key=lambda f: -f[0])[:limit]:
+        selected.setdefault(number, []).append(tipo)
+    return selected
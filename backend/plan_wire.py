@@ -0,0 +1,118 @@
+"""
+Compact wire schema of the plan days the LLM emits.
+
+Output tokens dominate generation time, and the full schema spells out the
+same option keys for every one of the 84 options of a week. On the wire a
+day is {"c": [meals]}, a meal {"t": tipo, "o": [options]} and an option uses
+the one-letter keys of OPTION_KEYS, with ingredients as [item, cantidad]
+pairs. The label is positional (OPTION_LABELS order), so it is not sent.
+The top-level `dias` key is kept, so streaming and truncation handling work
+on both forms.
+
+expand_day() turns a wire day into the `plan_data` day stored and served
+today; days already in the full form pass through unchanged, so a model
+that ignores the compact instructions still produces a valid plan.
+apply_enrichment() merges the substitutions and tips of an `enriquecidos`
+day (same keys, plus d = day number) into the options of a draft day.
+"""
+from typing import Any, Dict
+
+from recipe_library import OPTION_LABELS
+
+DAY_KEYS = {"c": "comidas", "n": "dia"}
+MEAL_KEYS = {"t": "tipo", "o": "opciones"}
+OPTION_KEYS = {
+    "n": "nombre",
+    "i": "ingredientes",
+    "p": "preparacion",
+    "m": "tiempo_prep",
+    "k": "calorias",
+    "s": "sustituciones",
+    "x": "tip",
+}
+FULL_OPTION_KEYS = {full: short for short, full in OPTION_KEYS.items()}
+
+
+def _expand_ingredient(ingredient: Any) -> Any:
+    if isinstance(ingredient, list) and ingredient:
+        expanded = {"item": ingredient[0]}
+        if len(ingredient) > 1:
+            expanded["cantidad"] = ingredient[1]
+        return expanded
+    return ingredient
+
+
+def _expand_option(option: Any, index: int) -> Any:
+    if not isinstance(option, dict) or "nombre" in option:
+        return option
+    expanded = {}
+    for key, value in option.items():
+        if key == "i" and isinstance(value, list):
+            value = [_expand_ingredient(ingredient) for ingredient in value]
+        expanded[OPTION_KEYS.get(key, key)] = value
+        if key == "n" and index < len(OPTION_LABELS):
+            expanded["etiqueta"] = OPTION_LABELS[index]
+    return expanded
+
+
+def _expand_meal(meal: Any) -> Any:
+    if not isinstance(meal, dict):
+        return meal
+    expanded = {MEAL_KEYS.get(key, key): value for key, value in meal.items()}
+    if isinstance(expanded.get("opciones"), list):
+        expanded["opciones"] = [_expand_option(option, i) for i, option in enumerate(expanded["opciones"])]
+    return expanded
+
+
+def expand_day(day: Any) -> Any:
+    """Full `plan_data` day for a wire day; anything else is returned as is"""
+    if not isinstance(day, dict) or "comidas" in day:
+        return day
+    expanded = {DAY_KEYS.get(key, key): value for key, value in day.items()}
+    if isinstance(expanded.get("comidas"), list):
+        expanded["comidas"] = [_expand_meal(meal) for meal in expanded["comidas"]]
+    return expanded
+
+
+def compact_day(day: Dict[str, Any]) -> Dict[str, Any]:
+    """Wire form of a full day (inverse of expand_day); used to measure the savings"""
+    meals = []
+    for meal in day.get("comidas", []):
+        options = []
+        for option in meal.get("opciones", []):
+            compact = {}
+            for key, value in option.items():
+                if key == "etiqueta":
+                    continue
+                if key == "ingredientes":
+                    value = [[i.get("item"), i.get("cantidad")] if isinstance(i, dict) and "cantidad" in i
+                             else [i.get("item")] if isinstance(i, dict) else i for i in value]
+                compact[FULL_OPTION_KEYS.get(key, key)] = value
+            options.append(compact)
+        meals.append({"t": meal.get("tipo"), "o": options})
+    return {"c": meals}
+
+
+def apply_enrichment(day: Dict[str, Any], enriched: Any) -> int:
+    """Copy the substitutions and tip of each enriched option into the option at the same
+    position of the same meal of `day`, in place; returns the number of options updated"""
+    if not isinstance(enriched, dict):
+        return 0
+    meals = {meal.get("tipo"): meal for meal in day.get("comidas", []) if isinstance(meal, dict)}
+    updated = 0
+    for meal in expand_day({k: v for k, v in enriched.items() if k != "d"}).get("comidas") or []:
+        if not isinstance(meal, dict) or meal.get("tipo") not in meals:
+            continue
+        options = meals[meal["tipo"]].get("opciones") or []
+        for option, extra in zip(options, meal.get("opciones") or []):
+            if not isinstance(extra, dict):
+                continue
+            sustituciones = extra.get("sustituciones")
+            valid = {}
+            if isinstance(sustituciones, list) and sustituciones and all(isinstance(i, str) for i in sustituciones):
+                valid["sustituciones"] = sustituciones
+            if isinstance(extra.get("tip"), str) and extra["tip"].strip():
+                valid["tip"] = extra["tip"]
+            option.update(valid)
+            updated += bool(valid)
+    return updated
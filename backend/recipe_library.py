@@ -0,0 +1,143 @@
+"""
+Normalization of generated recipes into reusable library entries.
+
+Every weekly plan carries 3 options per meal (`plan_data.dias[].comidas[].opciones[]`).
+Options are reduced to a recipe document with a stable fingerprint (name +
+ingredient names, accent and case insensitive) plus the attributes the plan
+assembler filters on: meal type, label, calories, allergens, vegetarian flag
+and ingredient keywords for aversions.
+"""
+import hashlib
+import re
+import unicodedata
+from typing import Iterable, List, Optional, Set
+
+MEAL_TYPES = ("Desayuno", "Comida", "Snack", "Cena")
+OPTION_LABELS = ("Recomendado", "Rápido", "Económico")
+
+# Share of the daily calories expected in each meal
+MEAL_CALORIE_SHARE = {"Desayuno": 0.25, "Comida": 0.35, "Snack": 0.10, "Cena": 0.30}
+
+# Questionnaire allergy choices -> ingredient keywords (normalized, no accents)
+ALLERGEN_KEYWORDS = {
+    "gluten": ["trigo", "harina", "pan", "pan integral", "pasta", "galleta", "tortilla de harina",
+               "cebada", "centeno", "cuscus", "bulgur", "seitan", "crouton", "wrap", "bagel"],
+    "lactosa": ["leche", "queso", "yogur", "yogurt", "crema", "mantequilla", "requeson",
+                "kefir", "jocoque", "suero de leche", "helado"],
+    "mariscos": ["camaron", "langosta", "langostino", "cangrejo", "jaiba", "pulpo", "calamar",
+                 "almeja", "mejillon", "ostion", "ostra", "callo de hacha", "marisco"],
+    "frutos secos": ["almendra", "nuez", "nueces", "pistache", "avellana", "anacardo", "maranon",
+                     "macadamia", "pinon"],
+    "huevo": ["huevo", "clara", "yema", "mayonesa"],
+    "soya": ["soya", "soja", "tofu", "tempeh", "edamame", "miso", "salsa de soya"],
+    "mani": ["mani", "cacahuate", "cacahuete", "crema de cacahuate"],
+}
+
+MEAT_KEYWORDS = [
+    "pollo", "pechuga", "res", "carne", "cerdo", "puerco", "lomo", "jamon", "tocino", "chorizo",
+    "salchicha", "pavo", "atun", "salmon", "pescado", "tilapia", "sardina", "bacalao", "camaron",
+    "marisco", "pulpo", "calamar", "arrachera", "bistec", "molida", "costilla", "barbacoa",
+]
+
+STOPWORDS = {"de", "del", "la", "el", "los", "las", "con", "sin", "y", "o", "al", "en", "a", "para"}
+
+
+def normalize_text(value: str) -> str:
+    """Lowercase, strip accents and collapse whitespace"""
+    value = unicodedata.normalize("NFKD", str(value))
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", value.lower()).strip()
+
+
+def keywords(value: str) -> Set[str]:
+    words = re.findall(r"[a-z]+", normalize_text(value))
+    return {w for w in words if len(w) > 2 and w not in STOPWORDS}
+
+
+def ingredient_names(option: dict) -> List[str]:
+    """Ingredient names of an option; items are {"item", "cantidad"} dicts or plain strings"""
+    names = []
+    for ingredient in option.get("ingredientes") or []:
+        name = ingredient.get("item", "") if isinstance(ingredient, dict) else str(ingredient)
+        if name.strip():
+            names.append(name.strip())
+    return names
+
+
+def _terms_pattern(terms: Iterable[str]):
+    # Whole words, allowing Spanish plurals ("huevo" matches "huevos" but "pan" not "panela")
+    alternatives = "|".join(re.escape(term.strip()) for term in terms)
+    return re.compile(rf"\b(?:{alternatives})(?:s|es)?\b")
+
+
+def _contains_any(text: str, terms: Iterable[str]) -> bool:
+    return _terms_pattern(terms).search(text) is not None
+
+
+def detect_allergens(names: Iterable[str]) -> List[str]:
+    text = " ".join(normalize_text(n) for n in names)
+    return sorted(allergen for allergen, terms in ALLERGEN_KEYWORDS.items() if _contains_any(text, terms))
+
+
+def is_vegetarian(names: Iterable[str]) -> bool:
+    text = " ".join(normalize_text(n) for n in names)
+    return not _contains_any(text, MEAT_KEYWORDS)
+
+
+def user_allergens(alergias: Iterable[str]) -> List[str]:
+    """Map questionnaire allergy choices ("Lactosa", "Maní", ...) to ALLERGEN_KEYWORDS keys"""
+    selected = {normalize_text(a) for a in alergias or []}
+    return sorted(a for a in ALLERGEN_KEYWORDS if a in selected)
+
+
+def aversion_keywords(alimentos_no_deseados: Iterable[str]) -> List[str]:
+    words = set()
+    for food in alimentos_no_deseados or []:
+        words |= keywords(food)
+    return sorted(words)
+
+
+def parse_calories(value) -> Optional[int]:
+    if isinstance(value, (int, float)) and value > 0:
+        return int(value)
+    match = re.search(r"\d+", str(value or ""))
+    return int(match.group()) if match and int(match.group()) > 0 else None
+
+
+def recipe_fingerprint(option: dict) -> str:
+    parts = [normalize_text(option.get("nombre", ""))]
+    parts += sorted(normalize_text(n) for n in ingredient_names(option))
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_option(option: dict, meal_type: str) -> Optional[dict]:
+    """Library document for one meal option, or None when it is not a usable recipe"""
+    names = ingredient_names(option)
+    if not option.get("nombre") or not names or meal_type not in MEAL_TYPES:
+        return None
+    recipe_keywords = set()
+    for name in names:
+        recipe_keywords |= keywords(name)
+    return {
+        "fingerprint": recipe_fingerprint(option),
+        "tipo": meal_type,
+        "etiqueta": option.get("etiqueta") if option.get("etiqueta") in OPTION_LABELS else None,
+        "calorias": parse_calories(option.get("calorias")),
+        "allergens": detect_allergens(names),
+        "vegetarian": is_vegetarian(names),
+        "keywords": sorted(recipe_keywords),
+        "option": option,
+    }
+
+
+def extract_recipes(plan_data: dict) -> List[dict]:
+    """Normalized, deduplicated recipes of every option in a weekly plan"""
+    recipes = {}
+    for day in plan_data.get("dias") or []:
+        for comida in day.get("comidas") or []:
+            for option in comida.get("opciones") or []:
+                if isinstance(option, dict):
+                    recipe = normalize_option(option, comida.get("tipo"))
+                    if recipe:
+                        recipes.setdefault(recipe["fingerprint"], recipe)
+    return list(recipes.values())
@@ -1,10 +1,19 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import json
+import copy
+import random
+import hashlib
+import asyncio
 import logging
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
@@ -13,6 +22,29 @@ from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
 
+from plan_json import DayStreamParser, parse_json_response
+from plan_schema import day_errors, validated_days
+from plan_wire import expand_day
+from plan_enrichment import PlanEnricher
+from plan_composer import PlanComposer
+from food_db import FoodDatabase
+from plan_validation import PlanValidator, meals_to_regenerate
+from shopping_list import build_shopping_list
+from exercise_catalog import build_exercise_guide
+from allergen_scanner import ConflictScanner, meals_with_conflicts, remove_conflicts
+from llm_resilience import CircuitBreaker, LatencyTracker, RetryPolicy, call_with_resilience
+from llm_router import LlmRouter, ModelCandidate, Route
+from llm_client import LlmClient, LlmProvider, stream_chat
+from llm_standin import StandInConfig, StandInProvider
+from llm_scheduler import ClassLimits, LlmScheduler, SchedulerRejected
+from llm_telemetry import TelemetryWriter, TokenPrices, sample_pipeline, summarize, summary_pipeline
+from plan_prompts import (
+    PLAN_SYSTEM_MESSAGE, build_profile_prompt, build_days_prompt, build_extras_prompt, count_tokens, prompt_budget
+)
+from recipe_library import (
+    MEAL_TYPES, OPTION_LABELS, MEAL_CALORIE_SHARE, extract_recipes, user_allergens, aversion_keywords
+)
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -105,6 +137,8 @@ class MealPlanResponse(BaseModel):
     recommendations: List[str]
     calories_target: int
     macros: Dict[str, float]
+    version: int = 1
+    stage: str = "full"  # 'draft' while substitutions, tips and recommendations are still being added
 
 class CheckoutRequest(BaseModel):
     plan_type: str  # 'weekly' or 'monthly'
@@ -404,36 +438,51 @@ async def get_weight_goal(current_user: dict = Depends(get_current_user)):
 
 # ============== HYDRATION TRACKING ==============
 
+HYDRATION_GLASS_ML = 250
+HYDRATION_MAX_HISTORY_DAYS = 366
+
 class HydrationRecord(BaseModel):
     glasses: int
     date: str
 
+class HydrationIncrement(BaseModel):
+    delta: int = 1
+    date: Optional[str] = None
+
 class HydrationGoal(BaseModel):
     daily_glasses: int
     daily_ml: int
     weight_kg: float
     goal: str
 
-@api_router.get("/hydration/goal")
-async def get_hydration_goal(current_user: dict = Depends(get_current_user)):
-    """Calculate daily water goal based on weight and nutritional objective"""
-    questionnaire = await db.questionnaire_responses.find_one(
-        {"user_id": current_user["id"]},
-        {"_id": 0},
-        sort=[("created_at", -1)]
-    )
-    
-    if not questionnaire:
+class HydrationDay(BaseModel):
+    date: str
+    glasses: int
+    goal_glasses: int
+    met_goal: bool
+
+class HydrationSummary(BaseModel):
+    goal: HydrationGoal
+    today_glasses: int
+    current_streak: int
+    best_streak: int
+    adherence_30: float
+    adherence_90: float
+    total_glasses: int
+    days_logged: int
+
+def compute_hydration_goal(q_data: Optional[dict]) -> HydrationGoal:
+    """Daily water goal from the nutrition profile (weight and objective)"""
+    if not q_data:
         # Default goal
         return HydrationGoal(daily_glasses=8, daily_ml=2000, weight_kg=70, goal="general")
-    
-    q_data = questionnaire.get("data", {})
+
     peso = q_data.get("peso", 70)
     objetivo = q_data.get("objetivo_principal", "").lower()
-    
+
     # Base: 30-35ml per kg of body weight
     base_ml = peso * 33
-    
+
     # Adjust based on goal
     if "bajar" in objetivo:
         # More water for weight loss (helps metabolism and satiety)
@@ -441,10 +490,10 @@ async def get_hydration_goal(current_user: dict = Depends(get_current_user)):
     elif "aumentar" in objetivo or "masa" in objetivo:
         # More water for muscle building (hydration for protein synthesis)
         base_ml = peso * 38
-    
+
     # Convert to glasses (250ml per glass)
-    daily_glasses = round(base_ml / 250)
-    
+    daily_glasses = round(base_ml / HYDRATION_GLASS_ML)
+
     return HydrationGoal(
         daily_glasses=daily_glasses,
         daily_ml=round(base_ml),
@@ -452,78 +501,816 @@ async def get_hydration_goal(current_user: dict = Depends(get_current_user)):
         goal=objetivo or "general"
     )
 
+async def load_hydration_goal(user_id: str) -> HydrationGoal:
+    questionnaire = await db.questionnaire_responses.find_one(
+        {"user_id": user_id},
+        {"_id": 0, "data": 1},
+        sort=[("created_at", -1)]
+    )
+    return compute_hydration_goal(questionnaire.get("data") if questionnaire else None)
+
+def parse_hydration_date(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, usa el formato AAAA-MM-DD")
+
+def hydration_day_met(record: dict, goal_glasses: int) -> bool:
+    """Records logged before goals were stored fall back to the current goal"""
+    return record.get("glasses", 0) >= (record.get("goal_glasses") or goal_glasses)
+
+class DailyHydrationStore:
+    """One `hydration_records` document per user per day"""
+
+    async def set_day(self, user_id: str, day: str, glasses: int, goal_glasses: int) -> Optional[dict]:
+        """Store the glasses for a day and return the previous value (or None)"""
+        return await db.hydration_records.find_one_and_update(
+            {"user_id": user_id, "date": day},
+            {"$set": {
+                "user_id": user_id,
+                "glasses": glasses,
+                "date": day,
+                "goal_glasses": goal_glasses,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }},
+            projection={"_id": 0, "glasses": 1, "goal_glasses": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def add_glasses(self, user_id: str, day: str, delta: int, goal_glasses: int) -> Optional[dict]:
+        """Increment the glasses for a day, never below zero; returns the previous value"""
+        # A pipeline update clamps in the same atomic write as the increment
+        return await db.hydration_records.find_one_and_update(
+            {"user_id": user_id, "date": day},
+            [{"$set": {
+                "glasses": {"$max": [0, {"$add": [{"$ifNull": ["$glasses", 0]}, delta]}]},
+                "goal_glasses": goal_glasses,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }}],
+            projection={"_id": 0, "glasses": 1, "goal_glasses": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def get_day(self, user_id: str, day: str) -> Optional[dict]:
+        return await db.hydration_records.find_one(
+            {"user_id": user_id, "date": day},
+            {"_id": 0, "date": 1, "glasses": 1, "goal_glasses": 1}
+        )
+
+    async def get_range(self, user_id: str, start: str, end: str) -> Dict[str, dict]:
+        records = await db.hydration_records.find(
+            {"user_id": user_id, "date": {"$gte": start, "$lte": end}},
+            {"_id": 0, "date": 1, "glasses": 1, "goal_glasses": 1}
+        ).to_list(HYDRATION_MAX_HISTORY_DAYS)
+        return {r["date"]: r for r in records}
+
+    async def iter_days(self, user_id: str, anchor: str, direction: int):
+        """Yield stored days strictly before (-1) or after (+1) `anchor`, nearest first"""
+        op = "$lt" if direction < 0 else "$gt"
+        cursor = db.hydration_records.find(
+            {"user_id": user_id, "date": {op: anchor}},
+            {"_id": 0, "date": 1, "glasses": 1, "goal_glasses": 1}
+        ).sort("date", direction)
+        async for record in cursor:
+            yield record
+
+async def dedupe_hydration_records(dry_run: bool = False) -> int:
+    """Keep the latest record of each user and day; returns how many duplicates there were.
+
+    Records written before the unique (user_id, date) index existed may repeat a day.
+    """
+    duplicates = db.hydration_records.aggregate([
+        {"$sort": {"updated_at": -1}},
+        {"$group": {"_id": {"user_id": "$user_id", "date": "$date"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+        {"$project": {"_id": 0, "stale": {"$slice": ["$ids", 1, {"$size": "$ids"}]}}}
+    ], allowDiskUse=True)
+    removed = 0
+    async for group in duplicates:
+        removed += len(group["stale"])
+        if not dry_run:
+            await db.hydration_records.delete_many({"_id": {"$in": group["stale"]}})
+    return removed
+
+class MonthlyHydrationStore:
+    """One `hydration_months` document per user per month.
+
+    `glasses` and `goals` are fixed 31-slot int arrays indexed by day of
+    month, so a whole month costs one small document and one index entry
+    instead of ~30 of each, and every day keeps the goal it was logged with.
+    Buckets written before per-day goals have a single `goal` for the month.
+    """
+
+    SLOTS = 31
+
+    @staticmethod
+    def _locate(day: str):
+        return day[:7], int(day[8:10]) - 1
+
+    @staticmethod
+    def _days_in_month(month: str) -> int:
+        year, mon = int(month[:4]), int(month[5:7])
+        first_next = datetime(year + mon // 12, mon % 12 + 1, 1)
+        return (first_next - timedelta(days=1)).day
+
+    @classmethod
+    def defaults_stage(cls) -> dict:
+        """Update pipeline stage giving a new bucket its empty arrays and an old one its per-day goals"""
+        return {"$set": {
+            "glasses": {"$ifNull": ["$glasses", [0] * cls.SLOTS]},
+            "goals": {"$ifNull": ["$goals", {"$map": {
+                "input": {"$range": [0, cls.SLOTS]}, "in": {"$ifNull": ["$goal", 0]}
+            }}]}
+        }}
+
+    @classmethod
+    def with_slots(cls, field: str, values: Dict[int, Any]) -> dict:
+        """Aggregation expression: the array `field` with the slots in `values` replaced"""
+        overlay = [values.get(slot) for slot in range(cls.SLOTS)]
+        return {"$map": {"input": {"$range": [0, cls.SLOTS]}, "as": "slot", "in": {"$ifNull": [
+            {"$arrayElemAt": [overlay, "$$slot"]}, {"$arrayElemAt": [f"${field}", "$$slot"]}
+        ]}}}
+
+    @staticmethod
+    def _goal(bucket: dict, index: int = 0) -> Optional[int]:
+        goals = bucket.get("goals") or []
+        return (goals[index] if index < len(goals) else 0) or bucket.get("goal")
+
+    async def _update_slot(self, user_id: str, day: str, value, goal_glasses: int) -> Optional[dict]:
+        """Write the glasses of `day` (a value or an expression over the bucket) in one atomic pipeline update"""
+        month, slot = self._locate(day)
+        pipeline = [self.defaults_stage(), {"$set": {
+            "glasses": self.with_slots("glasses", {slot: value}),
+            "goals": self.with_slots("goals", {slot: goal_glasses})
+        }}]
+        for attempt in range(2):
+            try:
+                previous = await db.hydration_months.find_one_and_update(
+                    {"user_id": user_id, "month": month}, pipeline,
+                    projection={"_id": 0, "goal": 1, "goals": {"$slice": [slot, 1]}, "glasses": {"$slice": [slot, 1]}},
+                    upsert=True, return_document=ReturnDocument.BEFORE
+                )
+                break
+            except DuplicateKeyError:
+                # Lost the race to a concurrent first write of the month: the bucket exists now
+                if attempt:
+                    raise
+        glasses = previous["glasses"][0] if previous and previous.get("glasses") else 0
+        if not glasses:
+            return None
+        return {"glasses": glasses, "goal_glasses": self._goal(previous) or goal_glasses}
+
+    async def set_day(self, user_id: str, day: str, glasses: int, goal_glasses: int) -> Optional[dict]:
+        return await self._update_slot(user_id, day, glasses, goal_glasses)
+
+    async def add_glasses(self, user_id: str, day: str, delta: int, goal_glasses: int) -> Optional[dict]:
+        _, slot = self._locate(day)
+        incremented = {"$max": [0, {"$add": [{"$arrayElemAt": ["$glasses", slot]}, delta]}]}
+        return await self._update_slot(user_id, day, incremented, goal_glasses)
+
+    def _expand(self, bucket: dict):
+        """Yield the non-empty days of a bucket as daily records"""
+        month = bucket["month"]
+        for slot in range(self._days_in_month(month)):
+            glasses = bucket["glasses"][slot]
+            if glasses:
+                yield {"date": f"{month}-{slot + 1:02d}", "glasses": glasses, "goal_glasses": self._goal(bucket, slot)}
+
+    async def get_day(self, user_id: str, day: str) -> Optional[dict]:
+        month, slot = self._locate(day)
+        bucket = await db.hydration_months.find_one(
+            {"user_id": user_id, "month": month},
+            {"_id": 0, "goal": 1, "goals": {"$slice": [slot, 1]}, "glasses": {"$slice": [slot, 1]}}
+        )
+        if not bucket or not bucket["glasses"][0]:
+            return None
+        return {"date": day, "glasses": bucket["glasses"][0], "goal_glasses": self._goal(bucket)}
+
+    async def get_range(self, user_id: str, start: str, end: str) -> Dict[str, dict]:
+        buckets = await db.hydration_months.find(
+            {"user_id": user_id, "month": {"$gte": start[:7], "$lte": end[:7]}},
+            {"_id": 0, "month": 1, "goal": 1, "goals": 1, "glasses": 1}
+        ).to_list(HYDRATION_MAX_HISTORY_DAYS // 28 + 2)
+        return {
+            record["date"]: record
+            for bucket in buckets
+            for record in self._expand(bucket)
+            if start <= record["date"] <= end
+        }
+
+    async def iter_days(self, user_id: str, anchor: str, direction: int):
+        op = "$lte" if direction < 0 else "$gte"
+        cursor = db.hydration_months.find(
+            {"user_id": user_id, "month": {op: anchor[:7]}},
+            {"_id": 0, "month": 1, "goal": 1, "goals": 1, "glasses": 1}
+        ).sort("month", direction)
+        async for bucket in cursor:
+            records = list(self._expand(bucket))
+            if direction < 0:
+                records.reverse()
+            for record in records:
+                if (record["date"] < anchor) if direction < 0 else (record["date"] > anchor):
+                    yield record
+
+HYDRATION_STORES = {
+    "daily": DailyHydrationStore,
+    "monthly": MonthlyHydrationStore
+}
+hydration_store = HYDRATION_STORES[os.environ.get('HYDRATION_STORAGE', 'daily')]()
+
+async def hydration_run_length(user_id: str, anchor: str, goal_glasses: int, direction: int) -> int:
+    """Count consecutive goal-met days starting next to `anchor` (exclusive).
+
+    Walks the store one day at a time and stops at the first gap or missed
+    day, so the cost is proportional to the streak, not the history.
+    """
+    expected = datetime.strptime(anchor, "%Y-%m-%d") + timedelta(days=direction)
+    length = 0
+    async for record in hydration_store.iter_days(user_id, anchor, direction):
+        if record["date"] != expected.strftime("%Y-%m-%d") or not hydration_day_met(record, goal_glasses):
+            break
+        length += 1
+        expected += timedelta(days=direction)
+    return length
+
+async def hydration_best_streak(user_id: str, goal_glasses: int) -> int:
+    """Longest run of consecutive goal-met days in the whole history (one full scan)"""
+    best = run = 0
+    expected = None
+    async for record in hydration_store.iter_days(user_id, "0000-00-00", 1):
+        day = datetime.strptime(record["date"], "%Y-%m-%d")
+        if not hydration_day_met(record, goal_glasses):
+            run, expected = 0, None
+            continue
+        run = run + 1 if day == expected else 1
+        expected = day + timedelta(days=1)
+        best = max(best, run)
+    return best
+
+async def update_hydration_totals(user_id: str, record_date: str, previous: Optional[dict],
+                                  glasses: int, goal_glasses: int):
+    """Apply the delta of one daily write to the user's running totals"""
+    prev_glasses = previous.get("glasses", 0) if previous else 0
+    prev_met = hydration_day_met(previous, goal_glasses) if previous else False
+    met = glasses >= goal_glasses
+
+    update = {
+        "$inc": {
+            "total_glasses": glasses - prev_glasses,
+            "days_logged": int(glasses > 0) - int(prev_glasses > 0),
+            "days_met": int(met) - int(prev_met)
+        },
+        "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+    }
+
+    if met:
+        # Only the run containing this day can have grown
+        run = 1
+        run += await hydration_run_length(user_id, record_date, goal_glasses, -1)
+        run += await hydration_run_length(user_id, record_date, goal_glasses, 1)
+        update["$max"] = {"best_streak": run}
+    elif prev_met:
+        # A correction broke the run containing this day; rescan only if that run was the best one
+        broken = 1
+        broken += await hydration_run_length(user_id, record_date, goal_glasses, -1)
+        broken += await hydration_run_length(user_id, record_date, goal_glasses, 1)
+        stats = await db.hydration_stats.find_one({"user_id": user_id}, {"_id": 0, "best_streak": 1}) or {}
+        if broken >= stats.get("best_streak", 0):
+            update["$set"]["best_streak"] = await hydration_best_streak(user_id, goal_glasses)
+
+    await db.hydration_stats.update_one({"user_id": user_id}, update, upsert=True)
+
+@api_router.get("/hydration/goal")
+async def get_hydration_goal(current_user: dict = Depends(get_current_user)):
+    """Calculate daily water goal based on weight and nutritional objective"""
+    return await load_hydration_goal(current_user["id"])
+
 @api_router.post("/hydration/log")
 async def log_hydration(data: HydrationRecord, current_user: dict = Depends(get_current_user)):
     """Log water intake for a specific date"""
-    record_date = data.date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    
-    # Upsert - update if exists, insert if not
-    await db.hydration_records.update_one(
-        {"user_id": current_user["id"], "date": record_date},
-        {"$set": {
-            "user_id": current_user["id"],
-            "glasses": data.glasses,
-            "date": record_date,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }},
-        upsert=True
-    )
-    
-    return {"message": "Hydration logged", "glasses": data.glasses, "date": record_date}
+    record_date = parse_hydration_date(data.date, datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+    goal = await load_hydration_goal(current_user["id"])
+
+    previous = await hydration_store.set_day(current_user["id"], record_date, data.glasses, goal.daily_glasses)
+    await update_hydration_totals(current_user["id"], record_date, previous, data.glasses, goal.daily_glasses)
+
+    return {
+        "message": "Hydration logged",
+        "glasses": data.glasses,
+        "date": record_date,
+        "met_goal": data.glasses >= goal.daily_glasses
+    }
+
+@api_router.post("/hydration/increment")
+async def increment_hydration(data: HydrationIncrement, current_user: dict = Depends(get_current_user)):
+    """Add (or remove) glasses for a date without a read-modify-write on the client"""
+    record_date = parse_hydration_date(data.date, datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+    goal = await load_hydration_goal(current_user["id"])
+
+    previous = await hydration_store.add_glasses(current_user["id"], record_date, data.delta, goal.daily_glasses)
+    glasses = max(0, (previous or {}).get("glasses", 0) + data.delta)
+    await update_hydration_totals(current_user["id"], record_date, previous, glasses, goal.daily_glasses)
+
+    return {
+        "message": "Hydration logged",
+        "glasses": glasses,
+        "date": record_date,
+        "met_goal": glasses >= goal.daily_glasses
+    }
 
 @api_router.get("/hydration/today")
 async def get_today_hydration(current_user: dict = Depends(get_current_user)):
     """Get today's hydration record"""
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    
-    record = await db.hydration_records.find_one(
-        {"user_id": current_user["id"], "date": today},
-        {"_id": 0}
-    )
-    
+
+    record = await hydration_store.get_day(current_user["id"], today)
+
     if not record:
         return {"glasses": 0, "date": today}
-    
+
     return {"glasses": record.get("glasses", 0), "date": today}
 
+async def hydration_range(user_id: str, start: datetime, end: datetime, goal: HydrationGoal) -> List[HydrationDay]:
+    """Dense, zero-filled daily series for [start, end] from one indexed range query"""
+    total_days = (end - start).days + 1
+    by_date = await hydration_store.get_range(user_id, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+
+    days = []
+    for offset in range(total_days):
+        day = (start + timedelta(days=offset)).strftime("%Y-%m-%d")
+        record = by_date.get(day, {})
+        goal_glasses = record.get("goal_glasses") or goal.daily_glasses
+        glasses = record.get("glasses", 0)
+        days.append(HydrationDay(date=day, glasses=glasses, goal_glasses=goal_glasses, met_goal=glasses >= goal_glasses))
+    return days
+
 @api_router.get("/hydration/history")
-async def get_hydration_history(days: int = 7, current_user: dict = Depends(get_current_user)):
-    """Get hydration history for the last N days"""
-    records = await db.hydration_records.find(
-        {"user_id": current_user["id"]},
-        {"_id": 0}
-    ).sort("date", -1).limit(days).to_list(days)
-    
-    return records
+async def get_hydration_history(
+    days: int = 7,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a gap-filled daily hydration history, oldest first.
+
+    Defaults to the last `days` days ending today; `start`/`end` (AAAA-MM-DD)
+    select an explicit range. Days without a record are returned with 0 glasses.
+    """
+    end_date = parse_hydration_date(end, datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0))
+    days = max(1, min(days, HYDRATION_MAX_HISTORY_DAYS))
+    start_date = parse_hydration_date(start, end_date - timedelta(days=days - 1))
+
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="La fecha inicial debe ser anterior a la final")
+    if (end_date - start_date).days >= HYDRATION_MAX_HISTORY_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango máximo es de {HYDRATION_MAX_HISTORY_DAYS} días")
+
+    goal = await load_hydration_goal(current_user["id"])
+    return await hydration_range(current_user["id"], start_date, end_date, goal)
+
+@api_router.get("/hydration/summary")
+async def get_hydration_summary(current_user: dict = Depends(get_current_user)):
+    """Goal, streaks, 30/90-day adherence and running totals in one call"""
+    user_id = current_user["id"]
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    goal = await load_hydration_goal(user_id)
+
+    window = await hydration_range(user_id, today - timedelta(days=89), today, goal)
+    today_entry = window[-1]
+
+    # Today still counts towards the streak until the day is over
+    anchor = (today + timedelta(days=1)).strftime("%Y-%m-%d") if today_entry.met_goal else today_entry.date
+    current_streak = await hydration_run_length(user_id, anchor, goal.daily_glasses, -1)
+
+    stats = await db.hydration_stats.find_one({"user_id": user_id}, {"_id": 0}) or {}
+
+    def adherence(n: int) -> float:
+        met = sum(1 for day in window[-n:] if day.met_goal)
+        return round(met / n * 100, 1)
+
+    return HydrationSummary(
+        goal=goal,
+        today_glasses=today_entry.glasses,
+        current_streak=current_streak,
+        best_streak=max(stats.get("best_streak", 0), current_streak),
+        adherence_30=adherence(30),
+        adherence_90=adherence(90),
+        total_glasses=stats.get("total_glasses", 0),
+        days_logged=stats.get("days_logged", 0)
+    )
+
+# ============== FOODS ==============
+
+# Memory-mapped composition table shared by every worker (see food_db.py)
+food_db = FoodDatabase()
+
+class FoodMatch(BaseModel):
+    id: int
+    nombre: str
+    score: float
+    kcal: float
+    proteinas: float
+    carbohidratos: float
+    grasas: float
+    gramos_pieza: float
+    alergenos: List[str]
+    categoria: str
+
+plan_validator = PlanValidator(food_db)
+# Foods tagged with an allergen in the food table extend its keywords ("granola" -> gluten)
+conflict_scanner = ConflictScanner(food_db.allergen_aliases())
+
+@api_router.get("/foods/search", response_model=List[FoodMatch])
+async def search_foods(q: str, limit: int = 5, current_user: dict = Depends(get_current_user)):
+    """Fuzzy ingredient search; nutrients are per 100 g"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Escribe un alimento para buscar")
+    return [FoodMatch(**food) for food in food_db.search(q, limit=max(1, min(limit, 20)))]
 
 # ============== MEAL PLAN GENERATION ==============
 
-@api_router.post("/meal-plans/trial")
-async def generate_trial_plan(current_user: dict = Depends(get_current_user)):
-    """Generate a free 1-day trial plan with 4 meals (desayuno, snack, comida, cena)"""
-    
-    # Check if user already used trial
-    existing_trial = await db.meal_plans.find_one(
-        {"user_id": current_user["id"], "plan_type": "trial"},
-        {"_id": 0}
+LLM_PROVIDER = "openai"
+LLM_MODEL = "gpt-5.2"
+
+# One client per process: SDK imported, key read and HTTP pool warmed at startup.
+# LLM_BACKEND=standin answers locally with simulated latency and failures, for load tests without the provider
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'emergent')
+LLM_WARMUP = os.environ.get('LLM_WARMUP', 'true').lower() == 'true'
+llm_client: LlmProvider
+if LLM_BACKEND == 'standin':
+    llm_client = StandInProvider(LLM_MODEL, StandInConfig(
+        ttft_median=float(os.environ.get('LLM_STANDIN_TTFT_MEDIAN', '0.8')),
+        ttft_sigma=float(os.environ.get('LLM_STANDIN_TTFT_SIGMA', '0.5')),
+        tokens_per_second=float(os.environ.get('LLM_STANDIN_TOKENS_PER_SECOND', '80')),
+        failure_rate=float(os.environ.get('LLM_STANDIN_FAILURE_RATE', '0')),
+        truncate_rate=float(os.environ.get('LLM_STANDIN_TRUNCATE_RATE', '0')),
+        seed=int(os.environ.get('LLM_STANDIN_SEED', '0')),
+    ))
+else:
+    llm_client = LlmClient(
+        LLM_PROVIDER, LLM_MODEL, os.environ.get('EMERGENT_LLM_KEY'),
+        max_connections=int(os.environ.get('LLM_MAX_CONNECTIONS', '20'))
     )
-    
-    if existing_trial:
-        raise HTTPException(status_code=400, detail="Ya utilizaste tu plan de prueba gratuito")
-    
-    # Get questionnaire data
-    questionnaire = await db.questionnaire_responses.find_one(
-        {"user_id": current_user["id"]},
-        {"_id": 0},
-        sort=[("created_at", -1)]
+
+# Exact-match cache of LLM responses, keyed by model + system message + prompt
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_TTL_HOURS = int(os.environ.get('LLM_CACHE_TTL_HOURS', '72'))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Deadlines (seconds) and retries of LLM calls; the trial is short and hedged after the p95 latency
+LLM_ATTEMPT_TIMEOUT = float(os.environ.get('LLM_ATTEMPT_TIMEOUT', '90'))
+LLM_TOTAL_TIMEOUT = float(os.environ.get('LLM_TOTAL_TIMEOUT', '180'))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+TRIAL_LLM_ATTEMPT_TIMEOUT = float(os.environ.get('TRIAL_LLM_ATTEMPT_TIMEOUT', '25'))
+TRIAL_LLM_TOTAL_TIMEOUT = float(os.environ.get('TRIAL_LLM_TOTAL_TIMEOUT', '40'))
+TRIAL_LLM_HEDGE = os.environ.get('TRIAL_LLM_HEDGE', 'true').lower() == 'true'
+
+WEEKLY_LLM_POLICY = RetryPolicy(LLM_ATTEMPT_TIMEOUT, LLM_TOTAL_TIMEOUT, LLM_MAX_RETRIES)
+TRIAL_LLM_POLICY = RetryPolicy(TRIAL_LLM_ATTEMPT_TIMEOUT, TRIAL_LLM_TOTAL_TIMEOUT, 1)
+trial_llm_latency = LatencyTracker()
+
+# Provider slots shared by weight: paid plans first, trials degrade to the local plan when their queue is long,
+# background regeneration of already complete plans takes what is left
+llm_scheduler = LlmScheduler(
+    capacity=int(os.environ.get('LLM_MAX_CONCURRENCY', '16')),
+    classes={
+        "paid": ClassLimits(weight=6, max_concurrency=int(os.environ.get('LLM_PAID_CONCURRENCY', '16'))),
+        "trial": ClassLimits(
+            weight=2, max_concurrency=int(os.environ.get('LLM_TRIAL_CONCURRENCY', '4')),
+            max_queue=int(os.environ.get('LLM_TRIAL_MAX_QUEUE', '20')),
+            max_wait=float(os.environ.get('LLM_TRIAL_MAX_WAIT', '5'))
+        ),
+        "background": ClassLimits(weight=1, max_concurrency=int(os.environ.get('LLM_BACKGROUND_CONCURRENCY', '4'))),
+    },
+    per_user=int(os.environ.get('LLM_USER_MAX_CALLS', '8')),
+)
+
+# Models the router may call ("provider/model": quality from 0 to 1) and, per plan type, the candidates in order
+# of preference and the quality floor. Each model has its own breaker: while it is open traffic fails over to the
+# other candidates, and when all of them are open calls fail at once and callers use their local fallback
+LLM_MODELS = json.loads(os.environ.get(
+    'LLM_MODELS', '{"openai/gpt-5.2": 0.9, "gemini/gemini-2.5-pro": 0.85, "gemini/gemini-2.5-flash": 0.7}'
+))
+LLM_ROUTES = json.loads(os.environ.get('LLM_ROUTES', json.dumps({
+    "weekly": {"candidates": [f"{LLM_PROVIDER}/{LLM_MODEL}", "gemini/gemini-2.5-pro"], "min_quality": 0.8},
+    "trial": {"candidates": ["gemini/gemini-2.5-flash", f"{LLM_PROVIDER}/{LLM_MODEL}"], "min_quality": 0.6},
+})))
+
+def llm_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        window=int(os.environ.get('LLM_BREAKER_WINDOW', '20')),
+        error_rate=float(os.environ.get('LLM_BREAKER_ERROR_RATE', '0.5')),
+        cooldown=float(os.environ.get('LLM_BREAKER_COOLDOWN', '30')),
     )
-    
-    if not questionnaire:
-        raise HTTPException(status_code=400, detail="Primero debes completar el cuestionario")
-    
-    q_data = questionnaire["data"]
-    
-    # Calculate BMR using Mifflin-St Jeor
+
+llm_router = LlmRouter(
+    candidates={
+        name: ModelCandidate(name, llm_client.with_model(*name.split("/", 1)), quality, llm_breaker(),
+                             alpha=float(os.environ.get('LLM_ROUTER_EWMA_ALPHA', '0.2')))
+        for name, quality in LLM_MODELS.items()
+    },
+    routes={plan_type: Route(**route) for plan_type, route in LLM_ROUTES.items()},
+    default_route="weekly",
+    explore_rate=float(os.environ.get('LLM_ROUTER_EXPLORE_RATE', '0.05')),
+)
+
+# One event per LLM call, written in batches to `llm_telemetry`; prices in USD per million tokens
+LLM_TELEMETRY_ENABLED = os.environ.get('LLM_TELEMETRY_ENABLED', 'true').lower() == 'true'
+LLM_TELEMETRY_TTL_DAYS = int(os.environ.get('LLM_TELEMETRY_TTL_DAYS', '30'))
+# Calls drawn at random for the latency percentiles of the admin summary
+LLM_TELEMETRY_SAMPLE_SIZE = int(os.environ.get('LLM_TELEMETRY_SAMPLE_SIZE', '10000'))
+LLM_PRICES = TokenPrices(
+    prompt=float(os.environ.get('LLM_PRICE_PROMPT_PER_MTOK', '1.75')),
+    completion=float(os.environ.get('LLM_PRICE_COMPLETION_PER_MTOK', '14.0')),
+)
+LLM_MODEL_PRICES = {
+    name: TokenPrices(*prices) for name, prices in json.loads(os.environ.get(
+        'LLM_MODEL_PRICES', '{"gemini/gemini-2.5-pro": [1.25, 10.0], "gemini/gemini-2.5-flash": [0.3, 2.5]}'
+    )).items()
+}
+llm_telemetry = TelemetryWriter(
+    db.llm_telemetry,
+    batch_size=int(os.environ.get('LLM_TELEMETRY_BATCH_SIZE', '100')),
+    flush_interval=float(os.environ.get('LLM_TELEMETRY_FLUSH_SECONDS', '2')),
+)
+
+def llm_cache_key(system_message: str, prompt: str) -> str:
+    # Keyed by the backend, so stand-in responses are never replayed to real users. Entries carry the
+    # model that answered and its quality: the router may answer a route from any of its candidates
+    digest = hashlib.sha256()
+    for part in (LLM_BACKEND, system_message, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class LlmResponseCache:
+    """Mongo-backed response cache with TTL expiry and a total size bound (LRU eviction).
+
+    Each entry records the model that produced it and that model's quality;
+    a lookup only returns entries at or above the requesting route's floor,
+    and an entry is only replaced by a response of at least its quality.
+    The stored size is a running count, recomputed every RESYNC_SECONDS since
+    TTL expiry and other processes change it behind this one's back.
+    """
+
+    RESYNC_SECONDS = 300.0
+
+    def __init__(self, collection, ttl_hours: int, max_bytes: int):
+        self.collection = collection
+        self.ttl_hours = ttl_hours
+        self.max_bytes = max_bytes
+        # Counters for this process; persisted per-entry hits are reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._bytes: Optional[int] = None
+        self._synced_at = 0.0
+
+    async def get(self, key: str, min_quality: float = 0.0) -> Optional[dict]:
+        """The stored `response` and the `model` that produced it"""
+        now = datetime.now(timezone.utc)
+        entry = await self.collection.find_one_and_update(
+            {"key": key, "expires_at": {"$gt": now}, "quality": {"$gte": min_quality}},
+            {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+            projection={"_id": 0, "response": 1, "model": 1, "bytes": 1}
+        )
+        if not entry:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bytes_saved += entry["bytes"]
+        return entry
+
+    async def put(self, key: str, response: str, model: str, quality: float):
+        now = datetime.now(timezone.utc)
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        try:
+            previous = await self.collection.find_one_and_update(
+                # Never replace a response of a better model
+                {"key": key, "quality": {"$not": {"$gt": quality}}},
+                {
+                    "$set": {
+                        "response": response,
+                        "bytes": size,
+                        "model": model,
+                        "quality": quality,
+                        "last_used_at": now,
+                        "expires_at": now + timedelta(hours=self.ttl_hours)
+                    },
+                    "$setOnInsert": {"key": key, "created_at": now, "hits": 0}
+                },
+                projection={"_id": 0, "bytes": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # A better response is already stored under this key
+            return
+        if self._bytes is not None:
+            self._bytes += size - (previous or {}).get("bytes", 0)
+        if await self._stored_bytes() > self.max_bytes:
+            await self._evict()
+
+    async def _stored_bytes(self) -> int:
+        now = time.monotonic()
+        if self._bytes is None or now - self._synced_at > self.RESYNC_SECONDS:
+            self._bytes = await self._total_bytes()
+            self._synced_at = now
+        return self._bytes
+
+    async def _total_bytes(self) -> int:
+        result = await self.collection.aggregate([
+            {"$group": {"_id": None, "bytes": {"$sum": "$bytes"}}}
+        ]).to_list(1)
+        return result[0]["bytes"] if result else 0
+
+    async def _evict(self):
+        # Recount before deleting anything: the running count may be stale
+        self._bytes = await self._total_bytes()
+        self._synced_at = time.monotonic()
+        excess = self._bytes - self.max_bytes
+        if excess <= 0:
+            return
+        stale = []
+        async for entry in self.collection.find({}, {"_id": 1, "bytes": 1}).sort("last_used_at", 1):
+            stale.append(entry["_id"])
+            excess -= entry["bytes"]
+            self._bytes -= entry["bytes"]
+            if excess <= 0:
+                break
+        await self.collection.delete_many({"_id": {"$in": stale}})
+
+    async def stats(self) -> dict:
+        result = await self.collection.aggregate([
+            {"$group": {
+                "_id": None,
+                "entries": {"$sum": 1},
+                "bytes": {"$sum": "$bytes"},
+                "hits": {"$sum": "$hits"},
+                "bytes_saved": {"$sum": {"$multiply": ["$hits", "$bytes"]}}
+            }}
+        ]).to_list(1)
+        stored = result[0] if result else {"entries": 0, "bytes": 0, "hits": 0, "bytes_saved": 0}
+        stored.pop("_id", None)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "ttl_hours": self.ttl_hours,
+            "max_bytes": self.max_bytes,
+            "stored": stored,
+            "process": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0,
+                "bytes_saved": self.bytes_saved
+            }
+        }
+
+llm_response_cache = LlmResponseCache(db.llm_response_cache, LLM_CACHE_TTL_HOURS, LLM_CACHE_MAX_BYTES)
+
+def parse_plan_response(response: str, allow_truncated: bool = True) -> dict:
+    """Repaired JSON of a plan response, with wire days expanded; `dias` that do not match the schema become None"""
+    plan = parse_json_response(response, allow_truncated=allow_truncated)
+    if "dias" in plan:
+        days = plan["dias"] if isinstance(plan["dias"], list) else []
+        plan["dias"] = validated_days([expand_day(day) for day in days])
+        invalid = sum(1 for day in plan["dias"] if day is None)
+        if invalid:
+            logger.warning(f"Discarded {invalid} plan days that do not match the schema")
+    return plan
+
+async def read_chat_response(new_chat, user_message, on_day=None, on_progress=None,
+                             cache_key: Optional[str] = None, policy: RetryPolicy = WEEKLY_LLM_POLICY,
+                             latency: Optional[LatencyTracker] = None, hedge: bool = False,
+                             llm_class: str = "paid", user_id: Optional[str] = None,
+                             section: str = "days", plan_type: str = "weekly", prompt_tokens: int = 0) -> str:
+    """Collect a streamed response, reporting each completed day of `dias` on the way.
+
+    With a `cache_key` an identical earlier response from a model good enough
+    for the route of `plan_type` is replayed instead of calling the LLM, and a
+    new response is stored with its model once it parses as JSON with every
+    day of `dias` matching the schema.
+    The LLM call runs under `policy` (deadlines and retries), after waiting
+    for a `llm_class` slot of the scheduler; every attempt goes to the model
+    the router picks for `plan_type`. `new_chat(client)` builds a fresh chat
+    on that model's client for every attempt, since a chat keeps the messages
+    already sent. Raises LlmUnavailable when no model answers in time and
+    SchedulerRejected when no slot is granted. Every call
+    that reaches the scheduler is recorded in the LLM telemetry, tagged with
+    `section` and `plan_type`.
+    """
+    use_cache = LLM_CACHE_ENABLED and cache_key is not None
+    route = llm_router.route(plan_type)
+    cached = await llm_response_cache.get(cache_key, route.min_quality) if use_cache else None
+
+    async def read(chunks, timing: Optional[dict] = None) -> str:
+        parser = DayStreamParser()
+        async for chunk in chunks:
+            if timing is not None and "first_chunk" not in timing:
+                timing["first_chunk"] = time.monotonic()
+            for day in parser.feed(chunk):
+                if on_day:
+                    await on_day(len(parser.days) - 1, expand_day(day))
+            if on_progress:
+                await on_progress(len(parser.text))
+        return parser.text
+
+    event = {"section": section, "plan_type": plan_type, "llm_class": llm_class, "prompt_tokens": prompt_tokens}
+    if cached is not None:
+        async def replay():
+            yield cached["response"]
+        record_cache_hit(event, cached.get("model"), cached["response"])
+        return await read(replay())
+
+    started = time.monotonic()
+    attempts: List[dict] = []
+
+    async def attempt(candidate: ModelCandidate) -> str:
+        timing = {"started": time.monotonic(), "model": f"{candidate.client.provider}/{candidate.client.model}"}
+        attempts.append(timing)
+        text = await read(stream_chat(new_chat(candidate.client), user_message), timing)
+        timing["finished"] = time.monotonic()
+        return text
+
+    text = None
+    try:
+        async with llm_scheduler.slot(llm_class, user_id):
+            event["queue_ms"] = (time.monotonic() - started) * 1000
+            # Two hedged streams would report their days twice
+            text = await call_with_resilience(attempt, policy, None, latency=latency,
+                                              hedge=hedge and on_day is None, route=route)
+    except Exception as e:
+        event["error"] = type(e).__name__
+        raise
+    finally:
+        if text is None:
+            record_llm_call(event, started, attempts, text=None, parse_ok=False)
+
+    parse_started = time.monotonic()
+    try:
+        # Truncated or unparseable responses, or ones with days off the schema, are not replayed
+        parsed = parse_plan_response(text, allow_truncated=False)
+        parse_ok = None not in parsed.get("dias", [])
+    except ValueError:
+        parse_ok = False
+    event["parse_ms"] = (time.monotonic() - parse_started) * 1000
+    record_llm_call(event, started, attempts, text=text, parse_ok=parse_ok)
+    if use_cache and parse_ok and route.answered is not None:
+        await llm_response_cache.put(cache_key, text, route.answered.name, route.answered.quality)
+    return text
+
+def record_llm_call(event: dict, started: float, attempts: List[dict], text: Optional[str], parse_ok: bool):
+    """Complete a telemetry event with tokens, cost and timings; the fastest finished attempt is the one that answered"""
+    if not LLM_TELEMETRY_ENABLED:
+        return
+    finished = [a for a in attempts if "finished" in a]
+    answered = min(finished, key=lambda a: a["finished"]) if finished else None
+    # A failed call is attributed to the model of its last attempt
+    model = (answered or attempts[-1])["model"] if attempts else None
+    completion_tokens = count_tokens(text) if text else 0
+    event.update({
+        "created_at": datetime.now(timezone.utc),
+        "model": model,
+        "completion_tokens": completion_tokens,
+        "cost_usd": LLM_MODEL_PRICES.get(model, LLM_PRICES).cost(event["prompt_tokens"], completion_tokens),
+        "latency_ms": (time.monotonic() - started) * 1000,
+        "ttft_ms": (answered["first_chunk"] - answered["started"]) * 1000
+                   if answered and "first_chunk" in answered else None,
+        "attempts": len(attempts),
+        "parse_ok": parse_ok,
+        "fallback": text is None,
+    })
+    for field in ("queue_ms", "parse_ms", "latency_ms", "ttft_ms"):
+        if event.get(field) is not None:
+            event[field] = round(event[field], 1)
+    llm_telemetry.record(event)
+
+def record_cache_hit(event: dict, model: Optional[str], text: str):
+    """Complete a telemetry event for a replayed response: no cost, and the cost of the call it saved"""
+    if not LLM_TELEMETRY_ENABLED:
+        return
+    completion_tokens = count_tokens(text)
+    event.update({
+        "created_at": datetime.now(timezone.utc),
+        "model": model,
+        "completion_tokens": completion_tokens,
+        "cost_usd": 0.0,
+        "saved_usd": LLM_MODEL_PRICES.get(model, LLM_PRICES).cost(event["prompt_tokens"], completion_tokens),
+        "attempts": 0,
+        "parse_ok": True,
+        "fallback": False,
+        "cache_hit": True,
+    })
+    llm_telemetry.record(event)
+
+def calculate_nutrition_targets(q_data: dict):
+    """Daily calories and macros from the questionnaire (Mifflin-St Jeor + activity + goal)"""
     peso = q_data["peso"]
     estatura = q_data["estatura"]
     edad = q_data["edad"]
@@ -535,7 +1322,7 @@ async def generate_trial_plan(current_user: dict = Depends(get_current_user)):
         bmr = 10 * peso + 6.25 * estatura - 5 * edad - 161
     
     # Activity multiplier
-    activity_level = 1.2
+    activity_level = 1.2  # Sedentary default
     if q_data.get("trabajo_fisico"):
         activity_level = 1.55
     if q_data.get("dias_ejercicio", 0) >= 3:
@@ -565,11 +1352,192 @@ async def generate_trial_plan(current_user: dict = Depends(get_current_user)):
         "grasas": round((calories_target * fat_ratio) / 9, 1)
     }
     
-    # Generate trial plan with AI
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    return calories_target, macros
+
+# Single-flight generation: one trial generation per user at a time
+PLAN_RESERVATION_SECONDS = int(os.environ.get('PLAN_RESERVATION_SECONDS', '180'))
+PLAN_RESERVATION_POLL_SECONDS = 0.5
+
+class SingleFlight:
+    """Concurrent calls with the same key in this process share one running task"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, factory):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # A caller that disconnects must not cancel the generation the others are waiting for
+        return await asyncio.shield(task)
+
+trial_flight = SingleFlight()
+
+class PlanReservations:
+    """Atomic reservation documents: only the request holding a key generates its plan.
+
+    A reservation left behind by a request that died is taken over once its
+    deadline passes, and removed by the TTL index shortly after.
+    """
+
+    def __init__(self, collection, ttl_seconds: int):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    async def reserve(self, key: str) -> bool:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        try:
+            await self.collection.insert_one(
+                {"key": key, "status": "pending", "created_at": now, "expires_at": expires_at}
+            )
+            return True
+        except DuplicateKeyError:
+            taken = await self.collection.find_one_and_update(
+                {"key": key, "status": "pending", "expires_at": {"$lte": now}},
+                {"$set": {"created_at": now, "expires_at": expires_at}}
+            )
+            return taken is not None
+
+    async def complete(self, key: str, plan_id: str):
+        # Kept for a while so requests waiting in other processes can read the plan id
+        await self.collection.update_one(
+            {"key": key},
+            {"$set": {"status": "done", "plan_id": plan_id,
+                      "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)}}
+        )
+
+    async def release(self, key: str):
+        await self.collection.delete_one({"key": key, "status": "pending"})
+
+    async def wait(self, key: str) -> Optional[str]:
+        """Plan id once the holder completes; None if it gave up or the deadline passed"""
+        deadline = asyncio.get_running_loop().time() + self.ttl_seconds
+        while asyncio.get_running_loop().time() < deadline:
+            reservation = await self.collection.find_one({"key": key}, {"_id": 0, "status": 1, "plan_id": 1})
+            if not reservation:
+                return None
+            if reservation["status"] == "done":
+                return reservation["plan_id"]
+            await asyncio.sleep(PLAN_RESERVATION_POLL_SECONDS)
+        return None
+
+plan_reservations = PlanReservations(db.plan_reservations, PLAN_RESERVATION_SECONDS)
+
+@api_router.post("/meal-plans/trial")
+async def generate_trial_plan(current_user: dict = Depends(get_current_user)):
+    """Generate a free 1-day trial plan with 4 meals (desayuno, snack, comida, cena)"""
+    
+    # Check if user already used trial
+    existing_trial = await db.meal_plans.find_one(
+        {"user_id": current_user["id"], "plan_type": "trial"},
+        {"_id": 0}
+    )
+    
+    if existing_trial:
+        raise HTTPException(status_code=400, detail="Ya utilizaste tu plan de prueba gratuito")
+    
+    # Get questionnaire data
+    questionnaire = await db.questionnaire_responses.find_one(
+        {"user_id": current_user["id"]},
+        {"_id": 0},
+        sort=[("created_at", -1)]
+    )
+    
+    if not questionnaire:
+        raise HTTPException(status_code=400, detail="Primero debes completar el cuestionario")
     
-    api_key = os.environ.get('EMERGENT_LLM_KEY')
+    q_data = questionnaire["data"]
     
+    # Concurrent clicks share one generation: in this process through trial_flight,
+    # across processes through the reservation document
+    plan_doc = await trial_flight.run(current_user["id"], lambda: reserve_trial_plan(current_user["id"], q_data))
+    return MealPlanResponse(**plan_doc)
+
+async def reserve_trial_plan(user_id: str, q_data: dict) -> dict:
+    key = f"trial:{user_id}"
+    if not await plan_reservations.reserve(key):
+        plan_id = await plan_reservations.wait(key)
+        plan = await db.meal_plans.find_one({"id": plan_id}, {"_id": 0}) if plan_id else None
+        if not plan:
+            raise HTTPException(status_code=409, detail="Tu plan de prueba se está generando, intenta de nuevo en unos segundos")
+        return plan
+    try:
+        plan_doc = await create_trial_plan(user_id, q_data)
+    except Exception:
+        await plan_reservations.release(key)
+        raise
+    await plan_reservations.complete(key, plan_doc["id"])
+    return plan_doc
+
+# Static trial meals per type, first choice first: the user's allergens and unwanted foods pick an alternative
+TRIAL_MEAL_SHARE = {"Desayuno": 0.25, "Snack": 0.15, "Comida": 0.35, "Cena": 0.25}
+TRIAL_FALLBACK_MEALS = {
+    "Desayuno": [
+        ("Avena con frutas y nueces", ["avena", "plátano", "fresas", "nueces", "miel"]),
+        ("Huevos a la mexicana con frijoles", ["huevo", "jitomate", "cebolla", "frijoles", "tortilla de maíz"]),
+        ("Papaya con avena y chía", ["papaya", "avena", "semillas de chía", "miel"]),
+    ],
+    "Snack": [
+        ("Yogur griego con granola", ["yogur griego", "granola", "arándanos"]),
+        ("Manzana con crema de cacahuate", ["manzana", "crema de cacahuate"]),
+        ("Pepino y jícama con limón", ["pepino", "jícama", "limón", "chile en polvo"]),
+    ],
+    "Comida": [
+        ("Pollo a la plancha con verduras", ["pechuga de pollo", "brócoli", "zanahoria", "arroz integral"]),
+        ("Lentejas guisadas con arroz", ["lentejas", "arroz", "jitomate", "zanahoria", "cebolla"]),
+    ],
+    "Cena": [
+        ("Ensalada mediterránea con atún", ["lechuga", "tomate", "pepino", "atún", "aceite de oliva"]),
+        ("Tacos de frijol con aguacate", ["frijoles", "tortilla de maíz", "aguacate", "lechuga"]),
+    ],
+}
+
+def trial_fallback_meal(tipo: str, calories_target: int, q_data: dict) -> Optional[dict]:
+    """First static trial meal of `tipo` without the user's allergens or unwanted foods"""
+    for nombre, ingredientes in TRIAL_FALLBACK_MEALS.get(tipo, []):
+        comida = {"tipo": tipo, "nombre": nombre, "ingredientes": list(ingredientes),
+                  "calorias": int(calories_target * TRIAL_MEAL_SHARE[tipo])}
+        if not scan_conflicts({"dias": [{"comidas": [comida]}]}, q_data):
+            return comida
+    return None
+
+def fallback_trial_plan(calories_target: int, q_data: dict):
+    """Static trial day and recommendations, served when the LLM cannot answer"""
+    comidas = [trial_fallback_meal(tipo, calories_target, q_data) for tipo in TRIAL_FALLBACK_MEALS]
+    plan_data = {"dias": [{"dia": "Plan de Prueba", "comidas": [c for c in comidas if c]}]}
+    recommendations = [
+        "Bebe al menos 2 litros de agua al día",
+        "Come despacio y mastica bien los alimentos",
+        "Este es solo un plan de prueba, suscríbete para obtener tu plan completo"
+    ]
+    return plan_data, recommendations
+
+def remove_trial_conflicts(plan_data: dict, calories_target: int, q_data: dict) -> int:
+    """Replace the trial meals with allergens or unwanted foods by static ones, or drop them; returns how many"""
+    conflicts = scan_conflicts(plan_data, q_data)
+    if not conflicts:
+        return 0
+    emptied = remove_conflicts(plan_data, conflicts)
+    for number, tipos in emptied.items():
+        day = plan_data["dias"][number - 1]
+        day["comidas"] = [
+            trial_fallback_meal(c.get("tipo"), calories_target, q_data) if c.get("tipo") in tipos else c
+            for c in day["comidas"]
+        ]
+        day["comidas"] = [c for c in day["comidas"] if c]
+    return sum(len(tipos) for tipos in emptied.values())
+
+async def create_trial_plan(user_id: str, q_data: dict) -> dict:
+    """Generate and store the trial plan; the unique trial index keeps a single one per user"""
+    calories_target, macros = calculate_nutrition_targets(q_data)
+    objetivo = q_data["objetivo_principal"]
+    peso = q_data["peso"]
+    estatura = q_data["estatura"]
+    
+    # Generate trial plan with AI
     prompt = f"""Genera un plan alimenticio de UN SOLO DÍA (prueba gratuita) en español para una persona con:
 
 DATOS:
@@ -578,6 +1546,7 @@ DATOS:
 - Peso: {peso} kg, Estatura: {estatura} cm
 - Vegetariano: {'Sí' if q_data.get('vegetariano') else 'No'}
 - Alergias: {', '.join(q_data.get('alergias', [])) or 'Ninguna'}
+- Alimentos a evitar: {', '.join(q_data.get('alimentos_no_deseados', [])) or 'Ninguno'}
 
 REQUERIMIENTOS:
 - Calorías objetivo: {calories_target} kcal/día
@@ -601,95 +1570,46 @@ Responde en JSON:
 }}"""
     
     try:
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"trial-{current_user['id']}-{uuid.uuid4()}",
-            system_message="Eres un nutriólogo experto. Responde solo en JSON válido."
-        ).with_model("openai", "gpt-5.2")
+        system_message = "Eres un nutriólogo experto. Responde solo en JSON válido."
         
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        def new_chat(client):
+            return client.chat(f"trial-{user_id}-{uuid.uuid4()}", system_message)
         
-        import json
-        clean_response = response.strip()
-        if clean_response.startswith("```"):
-            clean_response = clean_response.split("```")[1]
-            if clean_response.startswith("json"):
-                clean_response = clean_response[4:]
-        clean_response = clean_response.strip()
+        response = await read_chat_response(
+            new_chat, llm_client.message(prompt), cache_key=llm_cache_key(system_message, prompt),
+            policy=TRIAL_LLM_POLICY, latency=trial_llm_latency, hedge=TRIAL_LLM_HEDGE,
+            llm_class="trial", user_id=user_id, section="trial", plan_type="trial",
+            prompt_tokens=count_tokens(system_message) + count_tokens(prompt)
+        )
         
-        day_data = json.loads(clean_response)
+        day_data = parse_json_response(response, allow_truncated=False)
+        errors = day_errors(day_data)
+        if errors:
+            raise ValueError(f"Trial day does not match the plan schema: {errors[:3]}")
         plan_data = {"dias": [day_data]}
         recommendations = day_data.get("recomendaciones", [])
         
+    except SchedulerRejected as e:
+        # Signup spike: paid plans keep the provider, the trial is served locally
+        logger.warning(f"Trial plan degraded to the local plan: {e}")
+        plan_data, recommendations = fallback_trial_plan(calories_target, q_data)
     except Exception as e:
         logger.error(f"Error generating trial plan: {e}")
-        # Fallback plan
-        plan_data = {
-            "dias": [{
-                "dia": "Plan de Prueba",
-                "comidas": [
-                    {"tipo": "Desayuno", "nombre": "Avena con frutas y nueces", "ingredientes": ["avena", "plátano", "fresas", "nueces", "miel"], "calorias": int(calories_target * 0.25)},
-                    {"tipo": "Snack", "nombre": "Yogur griego con granola", "ingredientes": ["yogur griego", "granola", "arándanos"], "calorias": int(calories_target * 0.15)},
-                    {"tipo": "Comida", "nombre": "Pollo a la plancha con verduras", "ingredientes": ["pechuga de pollo", "brócoli", "zanahoria", "arroz integral"], "calorias": int(calories_target * 0.35)},
-                    {"tipo": "Cena", "nombre": "Ensalada mediterránea con atún", "ingredientes": ["lechuga", "tomate", "pepino", "atún", "aceite de oliva"], "calorias": int(calories_target * 0.25)}
-                ]
-            }]
-        }
-        recommendations = [
-            "Bebe al menos 2 litros de agua al día",
-            "Come despacio y mastica bien los alimentos",
-            "Este es solo un plan de prueba, suscríbete para obtener tu plan completo"
-        ]
+        plan_data, recommendations = fallback_trial_plan(calories_target, q_data)
     
-    # Add exercise guide and shopping list for trial
-    plan_data["lista_super"] = {
-        "proteinas": ["pechuga de pollo 200g", "huevos 4 piezas"],
-        "lacteos": ["yogur griego 300g", "leche 500ml"],
-        "cereales": ["avena 100g"],
-        "verduras": ["brócoli 1 pieza", "lechuga 1 pieza", "tomate 2 piezas"],
-        "frutas": ["plátano 2 piezas", "frutos rojos 100g"],
-        "grasas_semillas": ["aceite de oliva", "nueces 50g"],
-        "basicos": ["sal, pimienta, especias"]
-    }
+    # Same guarantee as the weekly plan: no meal with the user's allergens or unwanted foods
+    replaced = remove_trial_conflicts(plan_data, calories_target, q_data)
+    if replaced:
+        logger.info(f"Replaced {replaced} trial meals with allergens or unwanted foods for {user_id}")
     
-    plan_data["guia_ejercicios"] = {
-        "descripcion": f"Rutina de prueba para {objetivo.lower()}",
-        "dias_recomendados": 3,
-        "rutina_casa": [
-            {
-                "dia": "Día 1 - Cuerpo Completo",
-                "ejercicios": [
-                    {"nombre": "Sentadillas", "series": 3, "repeticiones": "15", "descanso": "45 seg"},
-                    {"nombre": "Lagartijas", "series": 3, "repeticiones": "10-12", "descanso": "45 seg"},
-                    {"nombre": "Plancha", "series": 3, "repeticiones": "30 seg", "descanso": "30 seg"},
-                    {"nombre": "Zancadas", "series": 3, "repeticiones": "10 c/pierna", "descanso": "45 seg"}
-                ],
-                "duracion": "20-25 min",
-                "tips": "Calienta 5 minutos antes de comenzar"
-            }
-        ],
-        "rutina_gimnasio": [
-            {
-                "dia": "Día 1 - Full Body",
-                "ejercicios": [
-                    {"nombre": "Sentadilla con barra", "series": 3, "repeticiones": "12", "descanso": "90 seg"},
-                    {"nombre": "Press de banca", "series": 3, "repeticiones": "10-12", "descanso": "90 seg"},
-                    {"nombre": "Jalón al pecho", "series": 3, "repeticiones": "12", "descanso": "60 seg"},
-                    {"nombre": "Press militar", "series": 3, "repeticiones": "10", "descanso": "60 seg"}
-                ],
-                "duracion": "35-40 min",
-                "tips": "Usa peso moderado para dominar la técnica"
-            }
-        ],
-        "cardio_recomendado": "20 minutos de caminata rápida después del entrenamiento"
-    }
+    # Add exercise guide and shopping list for trial
+    attach_local_sections(plan_data, q_data, max_routines=1)
     
     # Save trial plan
     plan_id = str(uuid.uuid4())
     plan_doc = {
         "id": plan_id,
-        "user_id": current_user["id"],
+        "user_id": user_id,
         "plan_type": "trial",
         "created_at": datetime.now(timezone.utc).isoformat(),
         "plan_data": plan_data,
@@ -697,474 +1617,1054 @@ Responde en JSON:
         "calories_target": calories_target,
         "macros": macros
     }
-    await db.meal_plans.insert_one(plan_doc)
-    
-    return MealPlanResponse(**plan_doc)
-
-@api_router.post("/meal-plans/generate")
-async def generate_meal_plan(current_user: dict = Depends(get_current_user)):
-    # Check subscription
-    subscription_type = current_user.get("subscription_type")
-    subscription_expires = current_user.get("subscription_expires")
-    
-    if not subscription_type:
-        raise HTTPException(status_code=403, detail="Necesitas una suscripción activa para generar planes")
-    
-    if subscription_expires:
-        expires_date = datetime.fromisoformat(subscription_expires)
-        if expires_date < datetime.now(timezone.utc):
-            raise HTTPException(status_code=403, detail="Tu suscripción ha expirado")
-    
-    # Get questionnaire data
-    questionnaire = await db.questionnaire_responses.find_one(
-        {"user_id": current_user["id"]},
-        {"_id": 0},
-        sort=[("created_at", -1)]
+    try:
+        await db.meal_plans.insert_one(plan_doc)
+    except DuplicateKeyError:
+        # A request whose reservation had expired stored its trial first
+        return await db.meal_plans.find_one({"user_id": user_id, "plan_type": "trial"}, {"_id": 0})
+    plan_doc.pop("_id", None)
+    return plan_doc
+
+WEEKLY_PLAN_DAYS = 7
+PLAN_DAYS_PER_CHUNK = int(os.environ.get('PLAN_DAYS_PER_CHUNK', '2'))
+PLAN_FANOUT_CONCURRENCY = int(os.environ.get('PLAN_FANOUT_CONCURRENCY', '5'))
+# Meals regenerated at most once per plan when validation finds them off target
+PLAN_REGENERATE_MAX_MEALS = int(os.environ.get('PLAN_REGENERATE_MAX_MEALS', '8'))
+# Prompt tokens (static prefix + per-user suffix) a weekly sub-request should stay under
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '2000'))
+
+async def generate_plan_section(session_prefix: str, user_id: str, system_message: str, prompt: str,
+                                on_day=None, on_progress=None, llm_class: str = "paid",
+                                use_cache: bool = True) -> dict:
+    """One LLM call for one part of the weekly plan: static `system_message` prefix, per-user `prompt`.
+
+    Without `use_cache` the LLM is always called: a request repeated because
+    its earlier answer was unusable must not be served that answer again.
+    """
+    budget = prompt_budget(system_message, prompt, PROMPT_TOKEN_BUDGET)
+    log = logger.info if budget["within_budget"] else logger.warning
+    log(f"Prompt budget for {session_prefix}: {budget}")
+    
+    def new_chat(client):
+        return client.chat(f"{session_prefix}-{user_id}-{uuid.uuid4()}", system_message)
+    
+    response = await read_chat_response(
+        new_chat, llm_client.message(prompt), on_day=on_day, on_progress=on_progress,
+        cache_key=llm_cache_key(system_message, prompt) if use_cache else None, llm_class=llm_class,
+        user_id=user_id, section=session_prefix, prompt_tokens=budget["total_tokens"]
     )
-    
-    if not questionnaire:
-        raise HTTPException(status_code=400, detail="Primero debes completar el cuestionario")
-    
-    q_data = questionnaire["data"]
-    
-    # Calculate BMR using Mifflin-St Jeor
-    peso = q_data["peso"]
-    estatura = q_data["estatura"]
-    edad = q_data["edad"]
-    sexo = q_data["sexo"]
-    
-    if sexo.lower() == "masculino":
-        bmr = 10 * peso + 6.25 * estatura - 5 * edad + 5
-    else:
-        bmr = 10 * peso + 6.25 * estatura - 5 * edad - 161
-    
-    # Activity multiplier
-    activity_level = 1.2  # Sedentary default
-    if q_data.get("trabajo_fisico"):
-        activity_level = 1.55
-    if q_data.get("dias_ejercicio", 0) >= 3:
-        activity_level = max(activity_level, 1.55)
-    if q_data.get("dias_ejercicio", 0) >= 5:
-        activity_level = 1.725
-    
-    tdee = bmr * activity_level
-    
-    # Adjust for goal
-    objetivo = q_data["objetivo_principal"]
-    if "bajar" in objetivo.lower():
-        calories_target = int(tdee * 0.8)
-    elif "aumentar" in objetivo.lower() or "masa" in objetivo.lower():
-        calories_target = int(tdee * 1.15)
-    else:
-        calories_target = int(tdee)
-    
-    # Calculate macros
-    protein_ratio = 0.30 if "masa" in objetivo.lower() else 0.25
-    fat_ratio = 0.25
-    carb_ratio = 1 - protein_ratio - fat_ratio
-    
-    macros = {
-        "proteinas": round((calories_target * protein_ratio) / 4, 1),
-        "carbohidratos": round((calories_target * carb_ratio) / 4, 1),
-        "grasas": round((calories_target * fat_ratio) / 9, 1)
-    }
-    
-    # Generate plan with AI
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    
-    api_key = os.environ.get('EMERGENT_LLM_KEY')
-    
-    # Get injury/restriction info
-    lesiones = ', '.join(q_data.get('lesiones_restricciones', [])) or 'Ninguna'
-    descripcion_lesion = q_data.get('descripcion_lesion', '')
-    
-    prompt = f"""Genera un plan alimenticio semanal personalizado en español para una persona con las siguientes características:
-
-DATOS PERSONALES:
-- Nombre: {q_data['nombre']}
-- Edad: {edad} años
-- Sexo: {sexo}
-- Peso: {peso} kg
-- Estatura: {estatura} cm
-
-OBJETIVO: {objetivo}
-Objetivos secundarios: {', '.join(q_data.get('objetivos_secundarios', [])) or 'Ninguno'}
-
-ACTIVIDAD:
-- Trabajo oficina: {'Sí' if q_data.get('trabajo_oficina') else 'No'}
-- Trabajo físico: {'Sí' if q_data.get('trabajo_fisico') else 'No'}
-- Turnos rotativos: {'Sí' if q_data.get('turnos_rotativos') else 'No'}
-- Ejercicio: {q_data.get('ejercicio_adicional', 'No especificado')} - {q_data.get('dias_ejercicio', 0)} días/semana
-
-SALUD:
-- Padecimientos: {', '.join(q_data.get('padecimientos', [])) or 'Ninguno'}
-- Medicamentos controlados: {'Sí' if q_data.get('medicamentos_controlados') else 'No'}
-- Lesiones/Restricciones para ejercicio: {lesiones}
-- Detalle de lesión: {descripcion_lesion or 'N/A'}
-- Síntomas reportados: {', '.join(q_data.get('sintomas', [])) or 'Ninguno'}
-
-HÁBITOS:
-- Fuma: {'Sí' if q_data.get('fuma') else 'No'}
-- Alcohol: {'Sí' if q_data.get('consume_alcohol') else 'No'} - {q_data.get('frecuencia_alcohol', '')}
-
-PREFERENCIAS ALIMENTICIAS:
-- Alergias: {', '.join(q_data.get('alergias', [])) or 'Ninguna'}
-- Vegetariano: {'Sí' if q_data.get('vegetariano') else 'No'}
-- Alimentos no deseados: {', '.join(q_data.get('alimentos_no_deseados', [])) or 'Ninguno'}
-- Platillo favorito: {q_data.get('platillo_favorito', 'No especificado')}
-- Frecuencia restaurantes: {q_data.get('frecuencia_restaurantes', 'No especificado')}
-- Presupuesto restaurantes: ${q_data.get('ticket_promedio', 0)} promedio
-
-REQUERIMIENTOS CALCULADOS:
-- Calorías objetivo: {calories_target} kcal/día
-- Proteínas: {macros['proteinas']}g
-- Carbohidratos: {macros['carbohidratos']}g
-- Grasas: {macros['grasas']}g
-
-Genera un plan alimenticio estructurado con 3 OPCIONES por cada comida y recetas DETALLADAS:
-
-ESTRUCTURA DEL PLAN:
-1. Plan para 7 días (Día 1 a Día 7)
-2. Para cada día: 4 tiempos de comida: Desayuno, Comida, Snack, Cena
-3. Para CADA comida genera 3 OPCIONES:
-   - Opción 1: Recomendado (la más nutritiva y balanceada)
-   - Opción 2: Rápido (para días con poco tiempo, max 10 min)
-   - Opción 3: Económico (ingredientes accesibles y económicos)
-
-FORMATO DE CADA RECETA (MUY IMPORTANTE):
-- Nombre creativo y apetitoso
-- Lista de ingredientes con cantidades EXACTAS para 1 porción
-- Preparación paso a paso detallada (4-6 pasos claros)
-- Tiempo de preparación
-- SUSTITUCIONES: 2-3 alternativas para ingredientes principales
-- TIP NUTRIPLAN: Consejo práctico relacionado con el objetivo del usuario
-
-RECOMENDACIONES ADICIONALES (personaliza según el perfil):
-Incluye 8-10 recomendaciones específicas sobre:
-- Sueño y descanso
-- Manejo de antojos
-- Planeación de comidas
-- Opciones para comer fuera
-- Guía para restaurantes según el presupuesto
-- Consideraciones por padecimientos (si los hay)
-- Expectativas de progreso realistas
-- Hidratación
-- Suplementación básica (si aplica)
-
-GUÍA DE EJERCICIOS (adapta según lesiones: {lesiones}):
-- Si hay lesiones, EXCLUYE ejercicios que afecten esa zona
-- Incluye alternativas seguras
-- Cada ejercicio debe tener descripción de técnica correcta
-
-Responde en formato JSON:
-{{
-  "dias": [
-    {{
-      "dia": "Día 1",
-      "comidas": [
-        {{
-          "tipo": "Desayuno",
-          "opciones": [
-            {{
-              "nombre": "Overnight Oats Vainilla + Plátano + Chía",
-              "etiqueta": "Recomendado",
-              "ingredientes": [
-                {{"item": "Avena", "cantidad": "1/2 taza (40g)"}},
-                {{"item": "Leche descremada o vegetal sin azúcar", "cantidad": "3/4 taza"}},
-                {{"item": "Yogurt griego natural", "cantidad": "1/3 taza"}},
-                {{"item": "Plátano", "cantidad": "1/2 pieza (en rodajas)"}},
-                {{"item": "Chía", "cantidad": "1 cda"}},
-                {{"item": "Canela", "cantidad": "1/2 cdita"}},
-                {{"item": "Vainilla", "cantidad": "3-4 gotas"}}
-              ],
-              "preparacion": [
-                "En un frasco, mezcla avena, leche, yogurt, chía, canela y vainilla",
-                "Agrega el plátano en rodajas por encima",
-                "Tapa y refrigera mínimo 4 horas (ideal: toda la noche)",
-                "Antes de comer, mezcla y ajusta la textura con un chorrito extra de leche si lo necesitas"
-              ],
-              "tiempo_prep": "10 min + 4h refrigeración",
-              "sustituciones": [
-                "Plátano: papaya (1 taza) o pera (1/2 pieza en cubos)",
-                "Yogurt griego: kéfir natural (3/4 taza)",
-                "Chía: linaza molida (1 cda)"
-              ],
-              "tip": "Desayuno perfecto para turnos: prepara 2 frascos en 10 minutos y sales con el plan en la bolsa"
-            }}
-          ]
-        }}
-      ]
-    }}
-  ],
-  "recomendaciones_adicionales": {{
-    "sueno": "Busca 7-8 horas cuando sea posible. Si duermes poco, prioriza cena ligera con proteína",
-    "antojos": "Si aparecen a media tarde, revisa que tu comida tenga proteína + carbo medido",
-    "planeacion": "Elige 2 días a la semana para adelantar: arroz/quinoa + pollo + verduras (2 porciones)",
-    "desayunos_fuera": "Arma 2 opciones base por semana: (1) overnight oats o pudín de chía; (2) sándwich o wrap de pavo",
-    "restaurantes": "Regla simple: 1 proteína a la plancha + 1 verdura + 1 carbo medido. Salsas aparte",
-    "padecimientos": "Consideración específica según condiciones del usuario",
-    "progreso": "Energía más estable en 10-14 días; cambios visibles en 8-12 semanas con constancia",
-    "hidratacion": "Mínimo {int(peso * 35 / 1000)}L de agua al día, más si haces ejercicio",
-    "guia_restaurantes": "En taquería: 3 tacos de maíz con carne asada/pollo, sin fritura; agrega nopales/cebolla/cilantro; evita refresco"
-  }},
-  "lista_super": {{
-    "proteinas": ["pechuga de pollo 1 kg", "huevos 18 piezas"],
-    "lacteos": ["leche 2 L", "yogur griego 1 kg"],
-    "cereales": ["avena 500g", "arroz integral 1 kg"],
-    "verduras": ["brócoli 2 piezas", "espinaca 1 bolsa"],
-    "frutas": ["plátano 7 piezas", "manzana 7 piezas"],
-    "grasas_semillas": ["aceite de oliva 500ml", "almendras 200g"],
-    "basicos": ["sal, pimienta, especias"]
-  }},
-  "guia_ejercicios": {{
-    "descripcion": "Guía de ejercicios para {objetivo.lower()}",
-    "nota_lesiones": "Ejercicios adaptados considerando: {lesiones}",
-    "dias_recomendados": 4,
-    "rutina_casa": [
-      {{
-        "dia": "Día 1 - Tren Superior",
-        "objetivo_rutina": "Fortalecer pecho, hombros y brazos para mejorar tu postura y fuerza funcional",
-        "beneficios": ["Mejora la postura", "Aumenta fuerza en brazos", "Tonifica pecho y hombros"],
-        "ejercicios": [
-          {{"nombre": "Lagartijas", "series": 3, "repeticiones": "12-15", "descanso": "60 seg", "musculo": "Pecho", "descripcion": "Fortalece pecho y tríceps", "tecnica": "Manos a la altura de hombros, baja controlado hasta que el pecho casi toque el suelo, sube empujando fuerte"}}
-        ],
-        "duracion": "30 min",
-        "tips": "Mantén el core activado durante todos los ejercicios"
-      }}
-    ],
-    "rutina_gimnasio": [
-      {{
-        "dia": "Día 1 - Pecho y Tríceps",
-        "objetivo_rutina": "Desarrollar masa muscular en pecho y tríceps con ejercicios compuestos",
-        "beneficios": ["Aumenta masa muscular", "Mejora fuerza de empuje", "Define el pecho"],
-        "ejercicios": [
-          {{"nombre": "Press de banca", "series": 4, "repeticiones": "10-12", "descanso": "90 seg", "musculo": "Pecho", "descripcion": "Ejercicio principal para desarrollo de pecho", "tecnica": "Agarra la barra un poco más ancho que los hombros, baja hasta tocar el pecho, empuja de forma explosiva"}}
-        ],
-        "duracion": "45 min",
-        "tips": "Calienta con peso ligero antes de cargar"
-      }}
-    ],
-    "cardio_recomendado": "30 minutos de caminata o trote ligero 3 veces por semana"
-  }}
-}}"""
-    
+    return parse_plan_response(response)
+
+def meal_problems(conflicts: List[dict], validation: Optional[dict]) -> Dict[int, Dict[str, str]]:
+    """Day number -> meal type -> what is wrong with it, as stated in a regeneration request"""
+    problems: Dict[int, Dict[str, List[str]]] = {}
+    for conflict in conflicts:
+        if conflict["campo"] != "sustituciones":
+            found = problems.setdefault(conflict["dia"], {}).setdefault(conflict["tipo"], [])
+            if f"contenía {conflict['restriccion']}" not in found:
+                found.append(f"contenía {conflict['restriccion']}")
+    for number, day in enumerate((validation or {}).get("dias", []), start=1):
+        for meal in day["comidas"]:
+            deviation = max(meal["desviacion_calorias"], key=abs, default=0.0)
+            if not meal["dentro_de_tolerancia"] and deviation:
+                problems.setdefault(number, {}).setdefault(meal["tipo"], []).append(
+                    f"{deviation:+.0%} de las calorías objetivo")
+    return {number: {tipo: ", ".join(found) for tipo, found in meals.items()} for number, meals in problems.items()}
+
+plan_composer = PlanComposer()
+
+def compose_local_days(q_data: dict, calories_target: int, macros: dict) -> List[dict]:
+    """Days composed locally to the user's targets and restrictions; [] when no combination fits"""
     try:
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"meal-plan-{current_user['id']}-{uuid.uuid4()}",
-            system_message="Eres un nutriólogo experto que crea planes alimenticios personalizados. Siempre respondes en JSON válido."
-        ).with_model("openai", "gpt-5.2")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        # Parse JSON from response
-        import json
-        # Clean response if it has markdown code blocks
-        clean_response = response.strip()
-        if clean_response.startswith("```"):
-            clean_response = clean_response.split("```")[1]
-            if clean_response.startswith("json"):
-                clean_response = clean_response[4:]
-        clean_response = clean_response.strip()
-        
-        plan_data = json.loads(clean_response)
-        recommendations = plan_data.get("recomendaciones", [])
-        
+        return plan_composer.compose_days(
+            calories_target, macros,
+            alergias=q_data.get("alergias", []),
+            alimentos_no_deseados=q_data.get("alimentos_no_deseados", []),
+            vegetariano=bool(q_data.get("vegetariano")),
+            days=WEEKLY_PLAN_DAYS
+        )
     except Exception as e:
-        logger.error(f"Error generating meal plan: {e}")
-        # Fallback plan if AI fails - new format with 4 meals
-        plan_data = {
-            "dias": [
-                {
-                    "dia": f"Día {i+1}",
-                    "comidas": [
-                        {
-                            "tipo": "Desayuno",
-                            "nombre": "Avena proteica con frutas",
-                            "ingredientes": [
-                                {"item": "avena", "cantidad": "1/2 taza"},
-                                {"item": "plátano", "cantidad": "1 pieza"},
-                                {"item": "leche", "cantidad": "1 taza"},
-                                {"item": "miel", "cantidad": "1 cdita"}
-                            ],
-                            "preparacion": ["Calienta la leche", "Agrega la avena y cocina 5 min", "Sirve con plátano y miel"],
-                            "tip": "Puedes preparar la noche anterior como overnight oats"
-                        },
-                        {
-                            "tipo": "Comida",
-                            "nombre": "Pollo a la plancha con verduras",
-                            "ingredientes": [
-                                {"item": "pechuga de pollo", "cantidad": "150g"},
-                                {"item": "brócoli", "cantidad": "1 taza"},
-                                {"item": "arroz integral", "cantidad": "1/2 taza"},
-                                {"item": "aceite de oliva", "cantidad": "1 cdita"}
-                            ],
-                            "preparacion": ["Sazona el pollo y cocina a la plancha", "Cuece el arroz", "Saltea el brócoli con aceite"],
-                            "tip": "Puedes sustituir el pollo por pescado o tofu"
-                        },
-                        {
-                            "tipo": "Snack",
-                            "nombre": "Yogur griego con nueces",
-                            "ingredientes": [
-                                {"item": "yogur griego natural", "cantidad": "150g"},
-                                {"item": "nueces", "cantidad": "10 piezas"},
-                                {"item": "frutos rojos", "cantidad": "1/4 taza"}
-                            ],
-                            "preparacion": ["Sirve el yogur en un bowl", "Agrega las nueces y frutos rojos"],
-                            "tip": "El yogur griego tiene más proteína que el regular"
-                        },
-                        {
-                            "tipo": "Cena",
-                            "nombre": "Ensalada mediterránea con atún",
-                            "ingredientes": [
-                                {"item": "atún en agua", "cantidad": "1 lata"},
-                                {"item": "lechuga mixta", "cantidad": "2 tazas"},
-                                {"item": "tomate", "cantidad": "1 pieza"},
-                                {"item": "aceitunas", "cantidad": "5 piezas"},
-                                {"item": "aceite de oliva", "cantidad": "1 cda"}
-                            ],
-                            "preparacion": ["Lava y corta las verduras", "Escurre el atún", "Mezcla todo y adereza con aceite y limón"],
-                            "tip": "Cena ligera ideal para no irte a dormir pesado"
-                        }
-                    ]
-                } for i in range(7)
-            ],
-            "recomendaciones": [
-                "Bebe al menos 2 litros de agua al día",
-                "Evita alimentos procesados y ultraprocesados",
-                "Come despacio y mastica bien cada bocado",
-                "No te saltes comidas, mantén horarios regulares",
-                "Descansa al menos 7-8 horas cada noche"
-            ],
-            "lista_super": {
-                "proteinas": ["pechuga de pollo 1 kg", "atún en agua 7 latas", "huevos 12 piezas"],
-                "lacteos": ["leche 2 L", "yogur griego 1 kg"],
-                "cereales": ["avena 500g", "arroz integral 1 kg"],
-                "verduras": ["brócoli 2 piezas", "lechuga 2 piezas", "tomate 7 piezas"],
-                "frutas": ["plátano 7 piezas", "frutos rojos 500g"],
-                "grasas_semillas": ["aceite de oliva 500ml", "nueces 200g", "aceitunas 1 frasco"],
-                "basicos": ["sal, pimienta, especias al gusto", "limones 4 piezas", "miel 1 frasco"]
-            },
-            "guia_ejercicios": {
-                "descripcion": f"Guía de ejercicios para {objetivo.lower()}",
-                "dias_recomendados": 4,
-                "rutina_casa": [
-                    {
-                        "dia": "Día 1 - Tren Superior",
-                        "ejercicios": [
-                            {"nombre": "Lagartijas", "series": 3, "repeticiones": "10-15", "descanso": "60 seg"},
-                            {"nombre": "Fondos en silla", "series": 3, "repeticiones": "12-15", "descanso": "60 seg"},
-                            {"nombre": "Plancha", "series": 3, "repeticiones": "30 seg", "descanso": "45 seg"},
-                            {"nombre": "Superman", "series": 3, "repeticiones": "12", "descanso": "45 seg"}
-                        ],
-                        "duracion": "25-30 min",
-                        "tips": "Mantén el core activado durante todos los ejercicios"
-                    },
-                    {
-                        "dia": "Día 2 - Tren Inferior",
-                        "ejercicios": [
-                            {"nombre": "Sentadillas", "series": 4, "repeticiones": "15-20", "descanso": "60 seg"},
-                            {"nombre": "Zancadas", "series": 3, "repeticiones": "12 c/pierna", "descanso": "60 seg"},
-                            {"nombre": "Puente de glúteos", "series": 3, "repeticiones": "15", "descanso": "45 seg"},
-                            {"nombre": "Elevación de talones", "series": 3, "repeticiones": "20", "descanso": "30 seg"}
-                        ],
-                        "duracion": "25-30 min",
-                        "tips": "Las rodillas no deben sobrepasar la punta de los pies"
-                    },
-                    {
-                        "dia": "Día 3 - Cardio",
-                        "ejercicios": [
-                            {"nombre": "Jumping jacks", "series": 3, "repeticiones": "30 seg", "descanso": "30 seg"},
-                            {"nombre": "Burpees", "series": 3, "repeticiones": "10", "descanso": "60 seg"},
-                            {"nombre": "Mountain climbers", "series": 3, "repeticiones": "30 seg", "descanso": "30 seg"},
-                            {"nombre": "Rodillas al pecho", "series": 3, "repeticiones": "30 seg", "descanso": "30 seg"}
-                        ],
-                        "duracion": "20-25 min",
-                        "tips": "Mantén un ritmo constante y respira correctamente"
-                    },
-                    {
-                        "dia": "Día 4 - Full Body",
-                        "ejercicios": [
-                            {"nombre": "Sentadilla + press", "series": 3, "repeticiones": "12", "descanso": "60 seg"},
-                            {"nombre": "Plancha lateral", "series": 3, "repeticiones": "20 seg c/lado", "descanso": "45 seg"},
-                            {"nombre": "Burpees suaves", "series": 3, "repeticiones": "8", "descanso": "60 seg"},
-                            {"nombre": "Bicicleta abdominal", "series": 3, "repeticiones": "20", "descanso": "45 seg"}
-                        ],
-                        "duracion": "30 min",
-                        "tips": "Este día es de recuperación activa, no te exijas de más"
-                    }
-                ],
-                "rutina_gimnasio": [
+        logger.error(f"Error composing local plan: {e}")
+        return []
+
+def fallback_weekly_plan() -> dict:
+    """Static plan served when the LLM is unavailable - new format with 4 meals"""
+    return {
+        "dias": [
+            {
+                "dia": f"Día {i+1}",
+                "comidas": [
                     {
-                        "dia": "Día 1 - Pecho y Tríceps",
-                        "ejercicios": [
-                            {"nombre": "Press de banca", "series": 4, "repeticiones": "10-12", "descanso": "90 seg"},
-                            {"nombre": "Aperturas con mancuernas", "series": 3, "repeticiones": "12", "descanso": "60 seg"},
-                            {"nombre": "Press inclinado", "series": 3, "repeticiones": "10-12", "descanso": "75 seg"},
-                            {"nombre": "Extensiones de tríceps", "series": 3, "repeticiones": "12-15", "descanso": "60 seg"},
-                            {"nombre": "Fondos en paralelas", "series": 3, "repeticiones": "al fallo", "descanso": "60 seg"}
+                        "tipo": "Desayuno",
+                        "nombre": "Avena proteica con frutas",
+                        "ingredientes": [
+                            {"item": "avena", "cantidad": "1/2 taza"},
+                            {"item": "plátano", "cantidad": "1 pieza"},
+                            {"item": "leche", "cantidad": "1 taza"},
+                            {"item": "miel", "cantidad": "1 cdita"}
                         ],
-                        "duracion": "45-50 min",
-                        "tips": "Calienta bien antes de cargar peso"
+                        "preparacion": ["Calienta la leche", "Agrega la avena y cocina 5 min", "Sirve con plátano y miel"],
+                        "tip": "Puedes preparar la noche anterior como overnight oats"
                     },
                     {
-                        "dia": "Día 2 - Espalda y Bíceps",
-                        "ejercicios": [
-                            {"nombre": "Jalón al pecho", "series": 4, "repeticiones": "10-12", "descanso": "90 seg"},
-                            {"nombre": "Remo con barra", "series": 4, "repeticiones": "10-12", "descanso": "90 seg"},
-                            {"nombre": "Remo con mancuerna", "series": 3, "repeticiones": "12 c/lado", "descanso": "60 seg"},
-                            {"nombre": "Curl de bíceps", "series": 3, "repeticiones": "12", "descanso": "60 seg"},
-                            {"nombre": "Curl martillo", "series": 3, "repeticiones": "12", "descanso": "60 seg"}
+                        "tipo": "Comida",
+                        "nombre": "Pollo a la plancha con verduras",
+                        "ingredientes": [
+                            {"item": "pechuga de pollo", "cantidad": "150g"},
+                            {"item": "brócoli", "cantidad": "1 taza"},
+                            {"item": "arroz integral", "cantidad": "1/2 taza"},
+                            {"item": "aceite de oliva", "cantidad": "1 cdita"}
                         ],
-                        "duracion": "45-50 min",
-                        "tips": "Contrae bien la espalda en cada repetición"
+                        "preparacion": ["Sazona el pollo y cocina a la plancha", "Cuece el arroz", "Saltea el brócoli con aceite"],
+                        "tip": "Puedes sustituir el pollo por pescado o tofu"
                     },
                     {
-                        "dia": "Día 3 - Piernas",
-                        "ejercicios": [
-                            {"nombre": "Sentadilla con barra", "series": 4, "repeticiones": "10-12", "descanso": "120 seg"},
-                            {"nombre": "Prensa de piernas", "series": 4, "repeticiones": "12-15", "descanso": "90 seg"},
-                            {"nombre": "Extensiones de cuádriceps", "series": 3, "repeticiones": "15", "descanso": "60 seg"},
-                            {"nombre": "Curl femoral", "series": 3, "repeticiones": "12-15", "descanso": "60 seg"},
-                            {"nombre": "Elevación de talones", "series": 4, "repeticiones": "15-20", "descanso": "45 seg"}
+                        "tipo": "Snack",
+                        "nombre": "Yogur griego con nueces",
+                        "ingredientes": [
+                            {"item": "yogur griego natural", "cantidad": "150g"},
+                            {"item": "nueces", "cantidad": "10 piezas"},
+                            {"item": "frutos rojos", "cantidad": "1/4 taza"}
                         ],
-                        "duracion": "50-55 min",
-                        "tips": "Las piernas son el grupo más grande, dale intensidad"
+                        "preparacion": ["Sirve el yogur en un bowl", "Agrega las nueces y frutos rojos"],
+                        "tip": "El yogur griego tiene más proteína que el regular"
                     },
                     {
-                        "dia": "Día 4 - Hombros y Abdomen",
-                        "ejercicios": [
-                            {"nombre": "Press militar", "series": 4, "repeticiones": "10-12", "descanso": "90 seg"},
-                            {"nombre": "Elevaciones laterales", "series": 3, "repeticiones": "15", "descanso": "60 seg"},
-                            {"nombre": "Elevaciones frontales", "series": 3, "repeticiones": "12", "descanso": "60 seg"},
-                            {"nombre": "Crunch en polea", "series": 3, "repeticiones": "15-20", "descanso": "45 seg"},
-                            {"nombre": "Plancha", "series": 3, "repeticiones": "45 seg", "descanso": "30 seg"}
+                        "tipo": "Cena",
+                        "nombre": "Ensalada mediterránea con atún",
+                        "ingredientes": [
+                            {"item": "atún en agua", "cantidad": "1 lata"},
+                            {"item": "lechuga mixta", "cantidad": "2 tazas"},
+                            {"item": "tomate", "cantidad": "1 pieza"},
+                            {"item": "aceitunas", "cantidad": "5 piezas"},
+                            {"item": "aceite de oliva", "cantidad": "1 cda"}
                         ],
-                        "duracion": "40-45 min",
-                        "tips": "Usa peso moderado en hombros para evitar lesiones"
+                        "preparacion": ["Lava y corta las verduras", "Escurre el atún", "Mezcla todo y adereza con aceite y limón"],
+                        "tip": "Cena ligera ideal para no irte a dormir pesado"
                     }
-                ],
-                "cardio_recomendado": "30 minutos de caminata rápida, trote o bicicleta 2-3 veces por semana, preferiblemente en días de descanso de pesas"
+                ]
+            } for i in range(7)
+        ],
+        "recomendaciones": [
+            "Bebe al menos 2 litros de agua al día",
+            "Evita alimentos procesados y ultraprocesados",
+            "Come despacio y mastica bien cada bocado",
+            "No te saltes comidas, mantén horarios regulares",
+            "Descansa al menos 7-8 horas cada noche"
+        ]
+    }
+
+# Weekly plans are shared between users whose questionnaires map to the same key
+PLAN_CACHE_ENABLED = os.environ.get('PLAN_CACHE_ENABLED', 'true').lower() == 'true'
+PLAN_CACHE_TTL_DAYS = int(os.environ.get('PLAN_CACHE_TTL_DAYS', '14'))
+PLAN_CACHE_MAX_ENTRIES = int(os.environ.get('PLAN_CACHE_MAX_ENTRIES', '5000'))
+PLAN_CACHE_CALORIE_BUCKET = 100  # ±50 kcal around the bucket center
+
+def _normalized_set(values) -> List[str]:
+    return sorted({str(v).strip().lower() for v in values or [] if str(v).strip()})
+
+def plan_cache_key(q_data: dict, calories_target: int) -> str:
+    """Canonical key for the inputs that shape a weekly plan; personal fields are left out"""
+    canonical = {
+        "objetivo": q_data.get("objetivo_principal", "").strip().lower(),
+        "calorias": int(round(calories_target / PLAN_CACHE_CALORIE_BUCKET)) * PLAN_CACHE_CALORIE_BUCKET,
+        "vegetariano": bool(q_data.get("vegetariano")),
+        "alergias": _normalized_set(q_data.get("alergias")),
+        "no_deseados": _normalized_set(q_data.get("alimentos_no_deseados")),
+        "padecimientos": _normalized_set(q_data.get("padecimientos")),
+        "lesiones": _normalized_set(q_data.get("lesiones_restricciones")),
+    }
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PlanCache:
+    """Mongo-backed plan cache: TTL index on `expires_at`, LRU eviction on `last_used_at`"""
+
+    def __init__(self, collection, ttl_days: int, max_entries: int):
+        self.collection = collection
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+
+    async def get(self, key: str) -> Optional[dict]:
+        # The TTL monitor runs about once a minute, so expiry is checked here as well
+        now = datetime.now(timezone.utc)
+        entry = await self.collection.find_one_and_update(
+            {"key": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+            projection={"_id": 0, "plan_data": 1}
+        )
+        return entry["plan_data"] if entry else None
+
+    async def contains(self, key: str) -> bool:
+        """Whether get() would hit, without counting a hit"""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one({"key": key, "expires_at": {"$gt": now}}, {"_id": 1}) is not None
+
+    async def put(self, key: str, plan_data: dict):
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "plan_data": plan_data,
+                    "last_used_at": now,
+                    "expires_at": now + timedelta(days=self.ttl_days)
+                },
+                "$setOnInsert": {"key": key, "created_at": now, "hits": 0}
+            },
+            upsert=True
+        )
+        await self._evict()
+
+    async def _evict(self):
+        excess = await self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return
+        stale = await self.collection.find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess).to_list(excess)
+        await self.collection.delete_many({"_id": {"$in": [entry["_id"] for entry in stale]}})
+
+plan_cache = PlanCache(db.plan_cache, PLAN_CACHE_TTL_DAYS, PLAN_CACHE_MAX_ENTRIES)
+
+def personalize_cached_plan(plan_data: dict, user_id: str, q_data: dict) -> dict:
+    """Per-user variation of a shared plan: stable day order and meal options per user"""
+    plan = copy.deepcopy(plan_data)
+    rng = random.Random(user_id)
+
+    dias = plan.get("dias", [])
+    rng.shuffle(dias)
+    for number, day in enumerate(dias, start=1):
+        day["dia"] = f"Día {number}"
+        # Swap the quick and budget options so users sharing a plan do not see identical menus
+        for comida in day.get("comidas", []):
+            opciones = comida.get("opciones")
+            if isinstance(opciones, list) and len(opciones) == 3 and rng.random() < 0.5:
+                opciones[1], opciones[2] = opciones[2], opciones[1]
+
+    # Exercise days are not part of the cache key
+    plan["guia_ejercicios"] = build_exercise_guide(q_data)
+    extras = plan.get("recomendaciones_adicionales")
+    if isinstance(extras, dict) and q_data.get("peso"):
+        extras["hidratacion"] = f"Mínimo {q_data['peso'] * 35 / 1000:.1f}L de agua al día, más si haces ejercicio"
+    return plan
+
+# Options of generated plans are kept as a recipe library and reused before asking the LLM
+RECIPE_LIBRARY_ENABLED = os.environ.get('RECIPE_LIBRARY_ENABLED', 'true').lower() == 'true'
+RECIPE_CALORIE_TOLERANCE = 0.2
+
+class RecipeLibrary:
+    """Deduplicated recipes in `recipes`, filtered by meal type, label, calories and restrictions"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ingest(self, plan_data: dict) -> int:
+        recipes = extract_recipes(plan_data)
+        if not recipes:
+            return 0
+        now = datetime.now(timezone.utc).isoformat()
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"fingerprint": recipe["fingerprint"]},
+                {"$setOnInsert": {**recipe, "created_at": now}, "$inc": {"uses": 1}},
+                upsert=True
+            )
+            for recipe in recipes
+        ], ordered=False)
+        return len(recipes)
+
+    async def candidates(self, tipo: str, etiqueta: str, calories: float, allergens: List[str],
+                         vegetarian: bool, aversions: List[str], limit: int) -> List[dict]:
+        """Up to `limit` distinct random recipes for one slot that respect the user's restrictions"""
+        query = {
+            "tipo": tipo,
+            "etiqueta": etiqueta,
+            "calorias": {
+                "$gte": int(calories * (1 - RECIPE_CALORIE_TOLERANCE)),
+                "$lte": int(calories * (1 + RECIPE_CALORIE_TOLERANCE))
             }
         }
-        recommendations = plan_data["recomendaciones"]
-    
-    # Save plan to database
-    plan_id = str(uuid.uuid4())
+        if vegetarian:
+            query["vegetarian"] = True
+        if allergens:
+            query["allergens"] = {"$nin": allergens}
+        if aversions:
+            query["keywords"] = {"$nin": aversions}
+        return await self.collection.aggregate([
+            {"$match": query},
+            {"$sample": {"size": limit}},
+            {"$project": {"_id": 0, "fingerprint": 1, "option": 1}}
+        ]).to_list(limit)
+
+recipe_library = RecipeLibrary(db.recipes)
+
+async def assemble_from_library(q_data: dict, calories_target: int) -> Dict[int, Dict[str, dict]]:
+    """Meals the library can fill, by day number and meal type.
+
+    A meal counts as filled only when all three labels have a recipe; the
+    same recipe is never used on two days.
+    """
+    allergens = user_allergens(q_data.get("alergias"))
+    aversions = aversion_keywords(q_data.get("alimentos_no_deseados"))
+    vegetarian = bool(q_data.get("vegetariano"))
+
+    slots = [(tipo, etiqueta) for tipo in MEAL_TYPES for etiqueta in OPTION_LABELS]
+    found = await asyncio.gather(*(
+        recipe_library.candidates(
+            tipo, etiqueta, calories_target * MEAL_CALORIE_SHARE[tipo],
+            allergens, vegetarian, aversions, WEEKLY_PLAN_DAYS
+        )
+        for tipo, etiqueta in slots
+    ))
+    by_slot = dict(zip(slots, found))
+
+    filled: Dict[int, Dict[str, dict]] = {}
+    for number in range(1, WEEKLY_PLAN_DAYS + 1):
+        for tipo in MEAL_TYPES:
+            picks = [by_slot[(tipo, etiqueta)] for etiqueta in OPTION_LABELS]
+            if all(len(recipes) >= number for recipes in picks):
+                filled.setdefault(number, {})[tipo] = {
+                    "tipo": tipo,
+                    "opciones": [copy.deepcopy(recipes[number - 1]["option"]) for recipes in picks]
+                }
+    return filled
+
+def validate_plan(plan_data: dict, calories_target: int, macros: dict) -> Optional[dict]:
+    try:
+        return plan_validator.validate(plan_data, calories_target, macros)
+    except Exception as e:
+        logger.error(f"Error validating plan nutrition: {e}")
+        return None
+
+def scan_conflicts(plan_data: dict, q_data: dict) -> List[dict]:
+    try:
+        return conflict_scanner.scan(plan_data, q_data)
+    except Exception as e:
+        logger.error(f"Error scanning plan for allergens: {e}")
+        return []
+
+def attach_local_sections(plan_data: dict, q_data: dict, max_routines: Optional[int] = None) -> dict:
+    """Set `lista_super` (from the plan's own ingredients) and `guia_ejercicios`, built locally, not by the LLM"""
+    try:
+        plan_data["lista_super"] = build_shopping_list(plan_data, food_db)
+    except Exception as e:
+        logger.error(f"Error building shopping list: {e}")
+    plan_data["guia_ejercicios"] = build_exercise_guide(q_data, max_routines=max_routines)
+    return plan_data
+
+async def generate_weekly_plan_data(user_id: str, q_data: dict, calories_target: int, macros: dict, progress=None):
+    """Generate the 7-day plan with concurrent LLM calls and merge them into plan_data.
+
+    Meals are first filled from the recipe library; only the remaining meals
+    are requested, in groups of PLAN_DAYS_PER_CHUNK days, plus one request for
+    recommendations, at most PLAN_FANOUT_CONCURRENCY at a time. Days missing
+    from a truncated or invalid response are requested once more; days that
+    still fail are composed locally to the user's targets (static fallback
+    plan if no combination fits). The merged plan is validated against the
+    targets and scanned for the user's allergens and unwanted foods; only
+    the flagged meals are requested again, and the shopping list and
+    exercise guide are built locally. `progress` (optional) receives
+    `on_day(index, day)` and `on_progress(chars)` callbacks while responses
+    stream in. Plans are first looked up in the shared plan cache by
+    questionnaire profile.
+
+    Returns (plan_data, recommendations, validation report).
+    """
+    cache_key = plan_cache_key(q_data, calories_target)
+    cached = await plan_cache.get(cache_key) if PLAN_CACHE_ENABLED else None
+    if cached:
+        logger.info(f"Plan cache hit for {user_id}")
+        plan_data = personalize_cached_plan(cached, user_id, q_data)
+        if progress:
+            for index, day in enumerate(plan_data["dias"]):
+                await progress.on_day(index, day)
+        return plan_data, plan_data.get("recomendaciones", []), validate_plan(plan_data, calories_target, macros)
+
+    fallback = fallback_weekly_plan()
+    local_days = compose_local_days(q_data, calories_target, macros)
+    if local_days:
+        fallback["dias"] = local_days
+    day_numbers = list(range(1, WEEKLY_PLAN_DAYS + 1))
+
+    library_meals: Dict[int, Dict[str, dict]] = {}
+    if RECIPE_LIBRARY_ENABLED:
+        try:
+            library_meals = await assemble_from_library(q_data, calories_target)
+        except Exception as e:
+            logger.error(f"Error assembling plan from recipe library: {e}")
+    missing = {n: [t for t in MEAL_TYPES if t not in library_meals.get(n, {})] for n in day_numbers}
+
+    def merge_day(number: int, generated: Optional[dict]) -> dict:
+        """Library meals plus the generated ones; gaps come from the fallback day"""
+        if not library_meals.get(number) and isinstance(generated, dict):
+            return {**generated, "dia": f"Día {number}"}
+        meals = dict(library_meals.get(number, {}))
+        for comida in (generated or {}).get("comidas", []):
+            if isinstance(comida, dict) and comida.get("tipo") in missing[number]:
+                meals.setdefault(comida["tipo"], comida)
+        for comida in fallback["dias"][number - 1]["comidas"]:
+            meals.setdefault(comida["tipo"], comida)
+        return {"dia": f"Día {number}", "comidas": [meals[t] for t in MEAL_TYPES if t in meals]}
+
+    if progress:
+        for number in day_numbers:
+            if not missing[number]:
+                await progress.on_day(number - 1, merge_day(number, None))
+
+    profile = build_profile_prompt(q_data, calories_target, macros)
+    semaphore = asyncio.Semaphore(PLAN_FANOUT_CONCURRENCY)
+    received_chars: Dict[int, int] = {}
+
+    def chunked(numbers: List[int]) -> List[List[int]]:
+        return [numbers[i:i + PLAN_DAYS_PER_CHUNK] for i in range(0, len(numbers), PLAN_DAYS_PER_CHUNK)]
+
+    def track_progress(key: int):
+        async def on_progress(chars: int):
+            received_chars[key] = chars
+            if progress:
+                await progress.on_progress(sum(received_chars.values()))
+        return on_progress
+
+    async def days_section(chunk: List[int], meals: Dict[int, List[str]], on_day=None,
+                           meal_calories: Optional[Dict[str, int]] = None,
+                           problems: Optional[Dict[int, Dict[str, str]]] = None, llm_class: str = "paid",
+                           use_cache: bool = True) -> list:
+        prompt = build_days_prompt(profile, chunk, meals, meal_calories, problems)
+        async with semaphore:
+            section = await generate_plan_section(
+                "meal-plan-days", user_id, PLAN_SYSTEM_MESSAGE, prompt,
+                on_day=on_day, on_progress=track_progress(chunk[0]), llm_class=llm_class, use_cache=use_cache
+            )
+        return section.get("dias", [])
+
+    def publish_days(chunk: List[int]):
+        async def on_day(index: int, day: dict):
+            if progress and index < len(chunk) and not day_errors(day):
+                await progress.on_day(chunk[index] - 1, merge_day(chunk[index], day))
+        return on_day
+
+    async def extras_section() -> dict:
+        async with semaphore:
+            return await generate_plan_section(
+                "meal-plan-extras", user_id, PLAN_SYSTEM_MESSAGE, build_extras_prompt(profile, q_data),
+                on_progress=track_progress(0)
+            )
+
+    chunks = chunked([n for n in day_numbers if missing[n]])
+    results = await asyncio.gather(
+        *(days_section(chunk, missing, publish_days(chunk)) for chunk in chunks), extras_section(),
+        return_exceptions=True
+    )
+
+    failures = [r for r in results if isinstance(r, Exception)]
+    for error in failures:
+        logger.error(f"Error generating meal plan section: {error}")
+    if len(failures) == len(results) and not library_meals:
+        attach_local_sections(fallback, q_data)
+        return fallback, fallback["recomendaciones"], validate_plan(fallback, calories_target, macros)
+
+    # Merge in day order regardless of completion order
+    generated: Dict[int, dict] = {}
+
+    def collect(section_chunks: List[List[int]], sections: list):
+        for chunk, section in zip(section_chunks, sections):
+            section = [] if isinstance(section, Exception) else section
+            for offset, number in enumerate(chunk):
+                if offset < len(section) and isinstance(section[offset], dict):
+                    generated[number] = section[offset]
+
+    collect(chunks, results[:-1])
+    # Days lost to a truncated or invalid response are requested once more, on their own and past the
+    # response cache: the prompt may be the one that just produced them
+    lost = [number for chunk in chunks for number in chunk if number not in generated]
+    if lost and len(failures) < len(results):
+        logger.info(f"Requesting {len(lost)} missing plan days again for {user_id}")
+        lost_chunks = chunked(lost)
+        lost_results = await asyncio.gather(
+            *(days_section(chunk, missing, publish_days(chunk), use_cache=False) for chunk in lost_chunks),
+            return_exceptions=True
+        )
+        for error in (r for r in lost_results if isinstance(r, Exception)):
+            logger.error(f"Error generating missing plan days: {error}")
+        collect(lost_chunks, lost_results)
+    dias = [merge_day(number, generated.get(number)) for number in day_numbers]
+
+    extras = results[-1]
+    if isinstance(extras, Exception) or not isinstance(extras, dict):
+        extras = {"recomendaciones": fallback["recomendaciones"]}
+
+    plan_data = {"dias": dias, **{k: v for k, v in extras.items() if k != "dias"}}
+    validation = validate_plan(plan_data, calories_target, macros)
+    conflicts = scan_conflicts(plan_data, q_data)
+
+    # One targeted pass: request again only the meals with allergens or unwanted foods, then the
+    # meals outside tolerance, PLAN_REGENERATE_MAX_MEALS in total
+    regenerate: Dict[int, List[str]] = {}
+    budget = PLAN_REGENERATE_MAX_MEALS
+    off_target = meals_to_regenerate(validation, PLAN_REGENERATE_MAX_MEALS) if validation else {}
+    for flagged in (meals_with_conflicts(conflicts), off_target):
+        for number, tipos in sorted(flagged.items()):
+            for tipo in tipos:
+                if budget and tipo not in regenerate.get(number, []):
+                    regenerate.setdefault(number, []).append(tipo)
+                    budget -= 1
+    if regenerate and len(failures) < len(results):
+        logger.info(f"Regenerating {PLAN_REGENERATE_MAX_MEALS - budget} meals ({len(conflicts)} conflicts) for {user_id}")
+        meal_calories = {tipo: int(calories_target * share) for tipo, share in MEAL_CALORIE_SHARE.items()}
+        problems = meal_problems(conflicts, validation)
+        regen_chunks = chunked(sorted(regenerate))
+        regen_results = await asyncio.gather(
+            # The plan is already complete: polishing it must not hold back other users' first drafts.
+            # Past the response cache, which may hold the very answer being replaced
+            *(days_section(chunk, regenerate, meal_calories=meal_calories, problems=problems,
+                           llm_class="background", use_cache=False)
+              for chunk in regen_chunks),
+            return_exceptions=True
+        )
+        for chunk, section in zip(regen_chunks, regen_results):
+            if isinstance(section, Exception):
+                logger.error(f"Error regenerating meals: {section}")
+                continue
+            for offset, number in enumerate(chunk):
+                if offset >= len(section) or not isinstance(section[offset], dict):
+                    continue
+                replacements = {c.get("tipo"): c for c in section[offset].get("comidas", []) if isinstance(c, dict)}
+                day = dias[number - 1]
+                day["comidas"] = [
+                    replacements[c.get("tipo")] if c.get("tipo") in regenerate[number] and c.get("tipo") in replacements
+                    else c
+                    for c in day["comidas"]
+                ]
+                generated.setdefault(number, day)
+                if progress:
+                    await progress.on_day(number - 1, day)
+        conflicts = scan_conflicts(plan_data, q_data)
+
+    if conflicts:
+        # Still conflicting: drop those options, or use the fallback meal when none is left
+        for number, tipos in remove_conflicts(plan_data, conflicts).items():
+            fallback_meals = {c["tipo"]: c for c in fallback["dias"][number - 1]["comidas"]}
+            dias[number - 1]["comidas"] = [
+                copy.deepcopy(fallback_meals[c.get("tipo")]) if c.get("tipo") in tipos and c.get("tipo") in fallback_meals
+                else c
+                for c in dias[number - 1]["comidas"]
+            ]
+            if progress:
+                await progress.on_day(number - 1, dias[number - 1])
+        conflicts = scan_conflicts(plan_data, q_data)
+    if regenerate or conflicts:
+        validation = validate_plan(plan_data, calories_target, macros)
+    if validation is not None:
+        validation["conflictos"] = conflicts
+    attach_local_sections(plan_data, q_data)
+
+    if RECIPE_LIBRARY_ENABLED and generated:
+        try:
+            await recipe_library.ingest({"dias": [dias[number - 1] for number in sorted(generated)]})
+        except Exception as e:
+            logger.error(f"Error storing recipes in library: {e}")
+    # Only fully generated plans are shared; fallback sections stay with this user
+    if PLAN_CACHE_ENABLED and not failures and not conflicts:
+        await plan_cache.put(cache_key, plan_data)
+    return plan_data, plan_data.get("recomendaciones", []), validation
+
+# Tiered generation: the locally composed week is stored at once as a draft and the LLM adds
+# substitutions, tips and recommendations in the background, updating the plan in place (steps and
+# quantities stay the composer's). Off by default: the week then comes from the composer's dishes
+# instead of LLM recipes, so a plan is only shown right away where this is turned on
+PLAN_TIERED_ENABLED = os.environ.get('PLAN_TIERED_ENABLED', 'false').lower() == 'true'
+
+# Enriched composer weeks are not put in the plan cache, which serves LLM plans to other users
+plan_enricher = PlanEnricher(db.meal_plans, scan_conflicts, validate_plan, PLAN_DAYS_PER_CHUNK,
+                             PLAN_FANOUT_CONCURRENCY)
+
+async def draft_weekly_plan_data(q_data: dict, calories_target: int, macros: dict, progress=None):
+    """Composed week with local recommendations; None when a cached full plan exists or no combination fits"""
+    if PLAN_CACHE_ENABLED and await plan_cache.contains(plan_cache_key(q_data, calories_target)):
+        return None
+    dias = compose_local_days(q_data, calories_target, macros)
+    if not dias:
+        return None
+    plan_data = {"dias": dias, "recomendaciones": fallback_weekly_plan()["recomendaciones"]}
+    if progress:
+        for index, day in enumerate(dias):
+            await progress.on_day(index, day)
+    validation = validate_plan(plan_data, calories_target, macros)
+    if validation is not None:
+        validation["conflictos"] = scan_conflicts(plan_data, q_data)
+    attach_local_sections(plan_data, q_data)
+    return plan_data, plan_data["recomendaciones"], validation
+
+async def create_weekly_plan(user_id: str, plan_type: str, q_data: dict, job_id: Optional[str] = None,
+                             progress=None, tiered: bool = False) -> dict:
+    """Generate and store a weekly plan. With a job id the insert happens at most once.
+
+    With `tiered` the plan is stored as a draft (`stage`) when one can be
+    composed locally; enrich_plan() completes it and bumps `version`.
+    """
+    calories_target, macros = calculate_nutrition_targets(q_data)
+    if progress:
+        await progress.on_start(calories_target, macros)
+    draft = await draft_weekly_plan_data(q_data, calories_target, macros, progress) if tiered else None
+    plan_data, recommendations, validation = draft or await generate_weekly_plan_data(
+        user_id, q_data, calories_target, macros, progress
+    )
+
     plan_doc = {
-        "id": plan_id,
-        "user_id": current_user["id"],
-        "plan_type": subscription_type,
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "plan_type": plan_type,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "plan_data": plan_data,
         "recommendations": recommendations,
         "calories_target": calories_target,
-        "macros": macros
+        "macros": macros,
+        "validation": validation,
+        "version": 1,
+        "stage": "draft" if draft else "full"
     }
-    await db.meal_plans.insert_one(plan_doc)
-    
-    return MealPlanResponse(**plan_doc)
+
+    if not job_id:
+        await db.meal_plans.insert_one(plan_doc)
+        return plan_doc
+
+    # A retried job never inserts a second plan: the unique job_id index keeps the first one
+    plan_doc["job_id"] = job_id
+    await db.meal_plans.update_one({"job_id": job_id}, {"$setOnInsert": plan_doc}, upsert=True)
+    return await db.meal_plans.find_one({"job_id": job_id}, {"_id": 0})
+
+# ============== PLAN GENERATION JOBS ==============
+
+PLAN_JOB_WORKERS = int(os.environ.get('PLAN_JOB_WORKERS', '2'))
+PLAN_JOB_LEASE_SECONDS = int(os.environ.get('PLAN_JOB_LEASE_SECONDS', '120'))
+PLAN_JOB_MAX_ATTEMPTS = int(os.environ.get('PLAN_JOB_MAX_ATTEMPTS', '3'))
+PLAN_JOB_POLL_SECONDS = 2.0
+
+class PlanJobResponse(BaseModel):
+    id: str
+    kind: str = "generate"  # 'generate', or 'enrich' for the background completion of a draft plan
+    status: str  # 'queued', 'running', 'completed' or 'failed'
+    plan_type: str
+    created_at: str
+    updated_at: str
+    attempts: int = 0
+    plan_id: Optional[str] = None
+    enrich_job_id: Optional[str] = None
+    error: Optional[str] = None
+
+def _iso_in(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+async def enqueue_plan_job(user_id: str, plan_type: str, questionnaire_id: str) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": "generate",
+        "priority": 0,
+        "user_id": user_id,
+        "plan_type": plan_type,
+        "questionnaire_id": questionnaire_id,
+        "status": "queued",
+        "attempts": 0,
+        "lease_owner": None,
+        "lease_expires_at": now,
+        "created_at": now,
+        "updated_at": now,
+        # Unique per user while set: a second request attaches to the queued or running job
+        "active": True
+    }
+    try:
+        await db.plan_jobs.insert_one(job)
+    except DuplicateKeyError:
+        active = await db.plan_jobs.find_one({"user_id": user_id, "active": True}, {"_id": 0})
+        if active:
+            return active
+        # The active job finished in between
+        return await enqueue_plan_job(user_id, plan_type, questionnaire_id)
+    plan_job_pool.notify()
+    job.pop("_id", None)
+    return job
+
+async def enqueue_enrich_job(plan: dict, questionnaire_id: str) -> str:
+    """Queue the background completion of a draft plan; a plan has a single enrich job"""
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "id": f"enrich-{plan['id']}",
+        "kind": "enrich",
+        # Drafts are usable: first plans of other users go first
+        "priority": 1,
+        "user_id": plan["user_id"],
+        "plan_type": plan["plan_type"],
+        "plan_id": plan["id"],
+        "questionnaire_id": questionnaire_id,
+        "status": "queued",
+        "attempts": 0,
+        "lease_owner": None,
+        "lease_expires_at": now,
+        "created_at": now,
+        "updated_at": now
+    }
+    try:
+        await db.plan_jobs.insert_one(job)
+    except DuplicateKeyError:
+        return job["id"]
+    plan_job_pool.notify()
+    return job["id"]
+
+async def claim_plan_job(worker_id: str) -> Optional[dict]:
+    """Atomically lease the oldest runnable job of the highest priority: queued, or running with an expired lease"""
+    now = datetime.now(timezone.utc).isoformat()
+    return await db.plan_jobs.find_one_and_update(
+        {
+            "status": {"$in": ["queued", "running"]},
+            "lease_expires_at": {"$lte": now},
+            "attempts": {"$lt": PLAN_JOB_MAX_ATTEMPTS}
+        },
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": _iso_in(PLAN_JOB_LEASE_SECONDS),
+                "updated_at": now
+            },
+            # Days streamed by a previous attempt are not this attempt's
+            "$unset": {"partial_days": "", "received_chars": ""},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("priority", 1), ("created_at", 1)],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def fail_exhausted_plan_jobs():
+    """Jobs whose last allowed lease expired are failed instead of retried forever"""
+    now = datetime.now(timezone.utc).isoformat()
+    await db.plan_jobs.update_many(
+        {"status": "running", "lease_expires_at": {"$lte": now}, "attempts": {"$gte": PLAN_JOB_MAX_ATTEMPTS}},
+        {"$set": {"status": "failed", "error": "Tiempo de generación agotado", "updated_at": now},
+         "$unset": {"active": ""}}
+    )
+
+async def finish_plan_job(job: dict, worker_id: str, update: dict):
+    update["updated_at"] = datetime.now(timezone.utc).isoformat()
+    changes = {"$set": update}
+    if update["status"] in ("completed", "failed"):
+        # The user may queue another plan once this one is done
+        changes["$unset"] = {"active": ""}
+    if update["status"] == "completed":
+        # The stored plan supersedes the streamed partial days
+        changes["$unset"]["partial_days"] = ""
+    # Only the lease of this attempt: a reclaimed job belongs to its new attempt
+    await db.plan_jobs.update_one({"id": job["id"], "lease_owner": worker_id, "attempts": job["attempts"]}, changes)
+    plan_job_events.notify(job["id"])
+
+class PlanJobEvents:
+    """In-process wake-ups for SSE streams following a job on this worker"""
+
+    def __init__(self):
+        self._waiters: Dict[str, set] = {}
+
+    def notify(self, job_id: str):
+        for event in self._waiters.get(job_id, ()):
+            event.set()
+
+    async def wait(self, job_id: str, timeout: float):
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(job_id)
+            waiters.discard(event)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+
+plan_job_events = PlanJobEvents()
+
+class PlanJobProgress:
+    """Persists streaming progress on the job document so any API worker can relay it.
+
+    Writes are conditioned on the lease of the attempt that streams: once the
+    job is reclaimed, a worker that lost its lease no longer touches it.
+    """
+
+    PROGRESS_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, job_id: str, worker_id: str, attempt: int):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self._last_progress = 0.0
+
+    async def _update(self, update: dict):
+        update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc).isoformat()
+        await db.plan_jobs.update_one(
+            {"id": self.job_id, "lease_owner": self.worker_id, "attempts": self.attempt}, update
+        )
+        plan_job_events.notify(self.job_id)
+
+    async def on_start(self, calories_target: int, macros: dict):
+        await self._update({
+            "$set": {"calories_target": calories_target, "macros": macros, "partial_days": [], "received_chars": 0}
+        })
+
+    async def on_day(self, index: int, day: dict):
+        # Day groups finish out of order; Mongo pads the gaps with nulls
+        await self._update({"$set": {f"partial_days.{index}": day}})
+
+    async def on_progress(self, received_chars: int):
+        now = asyncio.get_running_loop().time()
+        if now - self._last_progress < self.PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_progress = now
+        await self._update({"$set": {"received_chars": received_chars}})
+
+async def run_plan_job(job: dict, worker_id: str):
+    if job.get("kind") == "enrich":
+        await run_enrich_job(job, worker_id)
+        return
+
+    # A previous attempt may have stored the plan before losing its lease
+    existing = await db.meal_plans.find_one(
+        {"job_id": job["id"]}, {"_id": 0, "id": 1, "user_id": 1, "plan_type": 1, "stage": 1}
+    )
+    if existing:
+        await finish_plan_job(job, worker_id, await completed_plan_job(existing, job))
+        return
+
+    questionnaire = await db.questionnaire_responses.find_one(
+        {"id": job["questionnaire_id"]},
+        {"_id": 0, "data": 1}
+    )
+    if not questionnaire:
+        await finish_plan_job(job, worker_id, {"status": "failed", "error": "Cuestionario no encontrado"})
+        return
+
+    plan = await create_weekly_plan(
+        job["user_id"], job["plan_type"], questionnaire["data"],
+        job_id=job["id"], progress=PlanJobProgress(job["id"], worker_id, job["attempts"]), tiered=PLAN_TIERED_ENABLED
+    )
+    await finish_plan_job(job, worker_id, await completed_plan_job(plan, job))
+
+async def completed_plan_job(plan: dict, job: dict) -> dict:
+    """Final job update for a stored plan; a draft is handed to its enrich job first"""
+    update = {"status": "completed", "plan_id": plan["id"]}
+    if plan.get("stage") == "draft":
+        update["enrich_job_id"] = await enqueue_enrich_job(plan, job["questionnaire_id"])
+    return update
+
+async def run_enrich_job(job: dict, worker_id: str):
+    plan = await db.meal_plans.find_one({"id": job["plan_id"]}, {"_id": 0})
+    questionnaire = await db.questionnaire_responses.find_one(
+        {"id": job["questionnaire_id"]},
+        {"_id": 0, "data": 1}
+    )
+    if not plan or not questionnaire:
+        error = "Plan no encontrado" if not plan else "Cuestionario no encontrado"
+        await finish_plan_job(job, worker_id, {"status": "failed", "error": error})
+        return
+
+    async def generate(session_prefix: str, system_message: str, prompt: str) -> dict:
+        return await generate_plan_section(session_prefix, plan["user_id"], system_message, prompt,
+                                           llm_class="background")
+
+    if await plan_enricher.enrich(plan, questionnaire["data"], generate):
+        await finish_plan_job(job, worker_id, {"status": "completed", "plan_id": plan["id"]})
+    elif job["attempts"] < PLAN_JOB_MAX_ATTEMPTS:
+        # Retried with backoff by the worker; days already enriched are skipped
+        raise RuntimeError("plan enrichment incomplete")
+    else:
+        error = "No se pudo completar el plan"
+        await plan_enricher.fail(plan["id"], error)
+        await finish_plan_job(job, worker_id, {"status": "failed", "plan_id": plan["id"], "error": error})
+
+
+class PlanJobWorkerPool:
+    """In-process async workers draining `plan_jobs`; one job per worker at a time"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self):
+        base = f"{os.uname().nodename}-{os.getpid()}"
+        self._tasks = [asyncio.create_task(self._worker(f"{base}-{i}")) for i in range(self.size)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _heartbeat(self, job: dict, worker_id: str):
+        while True:
+            await asyncio.sleep(PLAN_JOB_LEASE_SECONDS / 3)
+            await db.plan_jobs.update_one(
+                {"id": job["id"], "lease_owner": worker_id, "attempts": job["attempts"], "status": "running"},
+                {"$set": {"lease_expires_at": _iso_in(PLAN_JOB_LEASE_SECONDS)}}
+            )
+
+    async def _worker(self, worker_id: str):
+        while True:
+            try:
+                job = await claim_plan_job(worker_id)
+                if not job:
+                    await fail_exhausted_plan_jobs()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=PLAN_JOB_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heartbeat = asyncio.create_task(self._heartbeat(job, worker_id))
+                try:
+                    await run_plan_job(job, worker_id)
+                except Exception as e:
+                    logger.error(f"Plan job {job['id']} failed on attempt {job['attempts']}: {e}")
+                    if job["attempts"] >= PLAN_JOB_MAX_ATTEMPTS:
+                        await finish_plan_job(job, worker_id, {"status": "failed", "error": str(e)})
+                    else:
+                        await finish_plan_job(job, worker_id, {
+                            "status": "queued",
+                            "lease_expires_at": _iso_in(2 ** job["attempts"])
+                        })
+                finally:
+                    heartbeat.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Plan job worker {worker_id} error: {e}")
+                await asyncio.sleep(PLAN_JOB_POLL_SECONDS)
+
+plan_job_pool = PlanJobWorkerPool(PLAN_JOB_WORKERS)
+
+@api_router.post("/meal-plans/generate", status_code=202)
+async def generate_meal_plan(current_user: dict = Depends(get_current_user)):
+    """Queue weekly plan generation; poll /meal-plans/jobs/{job_id} for the result"""
+    # Check subscription
+    subscription_type = current_user.get("subscription_type")
+    subscription_expires = current_user.get("subscription_expires")
+
+    if not subscription_type:
+        raise HTTPException(status_code=403, detail="Necesitas una suscripción activa para generar planes")
+
+    if subscription_expires:
+        expires_date = datetime.fromisoformat(subscription_expires)
+        if expires_date < datetime.now(timezone.utc):
+            raise HTTPException(status_code=403, detail="Tu suscripción ha expirado")
+
+    # Get questionnaire data
+    questionnaire = await db.questionnaire_responses.find_one(
+        {"user_id": current_user["id"]},
+        {"_id": 0, "id": 1},
+        sort=[("created_at", -1)]
+    )
+
+    if not questionnaire:
+        raise HTTPException(status_code=400, detail="Primero debes completar el cuestionario")
+
+    job = await enqueue_plan_job(current_user["id"], subscription_type, questionnaire["id"])
+    return PlanJobResponse(**job)
+
+@api_router.get("/meal-plans/jobs/{job_id}")
+async def get_plan_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get the status of a plan generation job"""
+    job = await db.plan_jobs.find_one(
+        {"id": job_id, "user_id": current_user["id"]},
+        {"_id": 0}
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return PlanJobResponse(**job)
+
+PLAN_JOB_STREAM_KEEPALIVE_SECONDS = 15
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@api_router.get("/meal-plans/jobs/{job_id}/events")
+async def stream_plan_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Server-Sent Events for a generation job.
+
+    Emits `targets` (calories and macros), one `day` event per day of `dias`
+    as soon as it has been parsed (not necessarily in day order) and again whenever it changes
+    (regenerated meals, conflicting options removed), `progress` while tokens arrive, and
+    finally `done` with the stored plan id or `error`. When a retry starts over, `reset` tells
+    the client to drop the days it has; they are sent again as the new attempt produces them.
+    """
+    job = await db.plan_jobs.find_one({"id": job_id, "user_id": current_user["id"]}, {"_id": 0, "id": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+    def day_hash(day: dict) -> str:
+        return hashlib.sha1(json.dumps(day, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    async def events():
+        sent_days: Dict[int, str] = {}
+        sent_targets = False
+        last_chars = None
+        attempt = None
+        idle = 0.0
+        while True:
+            job = await db.plan_jobs.find_one({"id": job_id}, {"_id": 0})
+            emitted = False
+
+            if attempt is not None and job.get("attempts") != attempt and job["status"] != "completed":
+                yield sse_event("reset", {"attempt": job.get("attempts")})
+                sent_days.clear()
+                sent_targets = False
+                last_chars = None
+                emitted = True
+            attempt = job.get("attempts")
+
+            if not sent_targets and job.get("calories_target"):
+                yield sse_event("targets", {"calories_target": job["calories_target"], "macros": job.get("macros", {})})
+                sent_targets = emitted = True
+
+            # Days arrive out of order; unfinished slots are null
+            days = job.get("partial_days") or []
+            for index, day in enumerate(days):
+                if not day:
+                    continue
+                digest = day_hash(day)
+                if sent_days.get(index) != digest:
+                    yield sse_event("day", {"index": index, "day": day})
+                    sent_days[index] = digest
+                    emitted = True
+
+            if job.get("received_chars") != last_chars:
+                last_chars = job.get("received_chars")
+                yield sse_event("progress", {
+                    "status": job["status"],
+                    "received_chars": last_chars or 0,
+                    "days_completed": len(sent_days)
+                })
+                emitted = True
+
+            if job["status"] == "completed":
+                yield sse_event("done", {"plan_id": job["plan_id"]})
+                return
+            if job["status"] == "failed":
+                yield sse_event("error", {"detail": job.get("error") or "Error al generar el plan"})
+                return
+
+            idle = 0.0 if emitted else idle + 1.0
+            if idle >= PLAN_JOB_STREAM_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await plan_job_events.wait(job_id, timeout=1.0)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.get("/meal-plans")
 async def get_meal_plans(current_user: dict = Depends(get_current_user)):
@@ -1186,7 +2686,6 @@ async def get_meal_plan(plan_id: str, current_user: dict = Depends(get_current_u
 
 # ============== PDF EXPORT ==============
 
-from fastapi.responses import StreamingResponse
 from fpdf import FPDF
 import io
 
@@ -1585,6 +3084,50 @@ async def get_admin_stats(admin: dict = Depends(get_admin_user)):
         questionnaire_completion_rate=round(completion_rate, 1)
     )
 
+@api_router.get("/admin/llm-scheduler")
+async def get_admin_llm_scheduler(admin: dict = Depends(get_admin_user)):
+    """Running and queued LLM calls per class, queue wait percentiles and rejections"""
+    return llm_scheduler.stats()
+
+@api_router.get("/admin/llm-telemetry")
+async def get_admin_llm_telemetry(days: int = 7, admin: dict = Depends(get_admin_user)):
+    """Per-day latency percentiles, tokens, cost, cache hits and parse-error / fallback rates of LLM calls.
+
+    Counts and sums are grouped in the database; percentiles are estimated
+    from a random sample of at most LLM_TELEMETRY_SAMPLE_SIZE calls.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=max(1, min(days, LLM_TELEMETRY_TTL_DAYS)))
+    groups = await db.llm_telemetry.aggregate(summary_pipeline(since)).to_list(None)
+    sample = await db.llm_telemetry.aggregate(
+        sample_pipeline(since, LLM_TELEMETRY_SAMPLE_SIZE)
+    ).to_list(LLM_TELEMETRY_SAMPLE_SIZE)
+    return {"enabled": LLM_TELEMETRY_ENABLED, "writer": llm_telemetry.stats(),
+            "sample_size": len(sample), "days": summarize(groups, sample)}
+
+@api_router.get("/admin/llm-router")
+async def get_admin_llm_router(admin: dict = Depends(get_admin_user)):
+    """Routes per plan type and, per model, latency / error averages and circuit breaker state"""
+    return llm_router.stats()
+
+@api_router.get("/admin/plan-enrichment")
+async def get_admin_plan_enrichment(admin: dict = Depends(get_admin_user)):
+    """Tiered plans still being enriched, completed, and left as drafts after a failed enrichment"""
+    failed = {"enrichment.status": "failed"}
+    return {
+        "enabled": PLAN_TIERED_ENABLED,
+        "pending": await db.meal_plans.count_documents({"stage": "draft", "enrichment.status": {"$ne": "failed"}}),
+        "complete": await db.meal_plans.count_documents({"enrichment.status": "complete"}),
+        "failed": await db.meal_plans.count_documents(failed),
+        "recent_failures": await db.meal_plans.find(
+            failed, {"_id": 0, "id": 1, "user_id": 1, "created_at": 1, "updated_at": 1, "enrichment": 1}
+        ).sort("updated_at", -1).to_list(20)
+    }
+
+@api_router.get("/admin/llm-cache")
+async def get_admin_llm_cache(admin: dict = Depends(get_admin_user)):
+    """Hit/miss and size metrics of the LLM response cache"""
+    return await llm_response_cache.stats()
+
 @api_router.get("/admin/users")
 async def get_admin_users(
     skip: int = 0,
@@ -1738,6 +3281,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await db.hydration_records.create_index([("user_id", 1), ("date", 1)], unique=True)
+    except OperationFailure as e:
+        # Same-day duplicates from before the index: keep the latest of each and try again
+        logger.warning(f"Removed {await dedupe_hydration_records()} duplicate hydration records: {e}")
+        try:
+            await db.hydration_records.create_index([("user_id", 1), ("date", 1)], unique=True)
+        except OperationFailure as e:
+            logger.error(f"Unique hydration index not created: {e}")
+    await db.hydration_months.create_index([("user_id", 1), ("month", 1)], unique=True)
+    await db.hydration_stats.create_index("user_id", unique=True)
+    await db.plan_jobs.create_index("id", unique=True)
+    # Claim: status filter, (priority, created_at) sort, lease range - no in-memory sort
+    await db.plan_jobs.create_index([("status", 1), ("priority", 1), ("created_at", 1), ("lease_expires_at", 1)])
+    try:
+        # Superseded by the index above
+        await db.plan_jobs.drop_index("status_1_lease_expires_at_1_created_at_1")
+    except OperationFailure:
+        pass
+    await db.meal_plans.create_index(
+        "job_id", unique=True, partialFilterExpression={"job_id": {"$exists": True}}
+    )
+    await db.plan_jobs.create_index("user_id", unique=True, partialFilterExpression={"active": True})
+    try:
+        await db.meal_plans.create_index(
+            [("user_id", 1), ("plan_type", 1)], unique=True, partialFilterExpression={"plan_type": "trial"}
+        )
+    except OperationFailure as e:
+        # Users with duplicate trials from before the reservation must be cleaned up first
+        logger.error(f"Unique trial index not created: {e}")
+    await db.plan_reservations.create_index("key", unique=True)
+    await db.plan_reservations.create_index("expires_at", expireAfterSeconds=0)
+    await db.plan_cache.create_index("key", unique=True)
+    await db.plan_cache.create_index("expires_at", expireAfterSeconds=0)
+    await db.plan_cache.create_index("last_used_at")
+    await db.llm_response_cache.create_index("key", unique=True)
+    await db.llm_response_cache.create_index("expires_at", expireAfterSeconds=0)
+    await db.llm_response_cache.create_index("last_used_at")
+    await db.recipes.create_index("fingerprint", unique=True)
+    await db.recipes.create_index([("tipo", 1), ("etiqueta", 1), ("vegetarian", 1), ("calorias", 1)])
+    await db.recipes.create_index("allergens")
+    await db.llm_telemetry.create_index("created_at", expireAfterSeconds=LLM_TELEMETRY_TTL_DAYS * 86400)
+
+@app.on_event("startup")
+async def start_llm_client():
+    try:
+        await llm_client.start(warm_up=LLM_WARMUP)
+        if not llm_client.streams:
+            logger.info(f"LLM backend {LLM_BACKEND} does not stream: plan days are published as each section completes")
+    except ImportError as e:
+        # Generation falls back to the local plans until the SDK is installed
+        logger.error(f"LLM client unavailable: {e}")
+
+@app.on_event("startup")
+async def start_llm_telemetry():
+    llm_telemetry.start()
+
+@app.on_event("startup")
+async def start_plan_job_workers():
+    plan_job_pool.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await plan_job_pool.stop()
+    await llm_telemetry.close()
+    await llm_client.close()
     client.close()
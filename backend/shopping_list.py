@@ -0,0 +1,89 @@
+"""
+Shopping list built from the ingredients of a plan.
+
+Walks the first option (Recomendado) of every meal, resolves each ingredient
+against the food database and aggregates the parsed quantities per food:
+foods bought by the piece ("2 huevos", "1 lata") are counted, everything else
+is summed in grams (or ml). The result has the `lista_super` shape the
+frontend and the PDF export render: category -> ["item cantidad", ...].
+"""
+import math
+from typing import Dict, List
+
+from food_db import CATEGORIES, FoodDatabase, normalize_food_name
+from ingredients import parse_quantity, grams_for, split_ingredient
+
+# Units counted instead of weighed -> (singular, plural)
+COUNT_UNITS = {
+    "pieza": ("pieza", "piezas"),
+    "rebanada": ("rebanada", "rebanadas"),
+    "lata": ("lata", "latas"),
+    "diente": ("diente", "dientes"),
+}
+LIQUID_UNITS = ("ml", "l")
+
+
+def _first_options(plan_data: dict):
+    for day in plan_data.get("dias") or []:
+        for comida in day.get("comidas") or []:
+            opciones = comida.get("opciones") or [comida]
+            if isinstance(opciones[0], dict):
+                yield opciones[0]
+
+
+def _format_amount(entry: dict) -> str:
+    if not entry["weighed"] and entry["counts"]:
+        unit, count = next(iter(entry["counts"].items()))
+        count = math.ceil(count - 1e-9)
+        singular, plural = COUNT_UNITS[unit]
+        return f"{count} {singular if count == 1 else plural}"
+    if not entry["grams"]:
+        # "al gusto" or no quantity at all: the name is enough on a shopping list
+        return ""
+    small, large = ("ml", "L") if entry["liquid"] else ("g", "kg")
+    if entry["grams"] >= 1000:
+        return f"{entry['grams'] / 1000:.1f}".rstrip("0").rstrip(".") + f" {large}"
+    return f"{max(10, int(math.ceil(entry['grams'] / 10) * 10))}{small}"
+
+
+def build_shopping_list(plan_data: dict, food_db: FoodDatabase) -> Dict[str, List[str]]:
+    """`lista_super` for plan_data: categories in CATEGORIES order, items sorted by name"""
+    entries: Dict[object, dict] = {}
+    for option in _first_options(plan_data):
+        for ingredient in option.get("ingredientes") or []:
+            name, cantidad = split_ingredient(ingredient)
+            food = food_db.match(name)
+            if food:
+                key, piece_grams = food[0], food[1]
+            else:
+                key, piece_grams = normalize_food_name(name), 0
+                if not key:
+                    continue
+
+            if key not in entries:
+                display, category = name.strip(), "basicos"
+                if food:
+                    display, category = food_db.aliases[food[0]][0], CATEGORIES[int(food_db.categories[food[0]])]
+                entries[key] = {"nombre": display, "categoria": category, "grams": 0.0,
+                                "counts": {}, "weighed": False, "liquid": False}
+            entry = entries[key]
+
+            quantity = parse_quantity(cantidad)
+            grams = grams_for(quantity, piece_grams)
+            if grams is None:
+                continue
+            entry["grams"] += grams
+            unit = quantity.unit or "pieza"
+            if quantity.grams is None and unit in COUNT_UNITS:
+                entry["counts"][unit] = entry["counts"].get(unit, 0) + quantity.amount
+            else:
+                entry["weighed"] = True
+                entry["liquid"] = entry["liquid"] or quantity.unit in LIQUID_UNITS
+            # Mixed units ("1 pieza" and "2 rebanadas") are summed by weight
+            if len(entry["counts"]) > 1:
+                entry["weighed"] = True
+
+    lista: Dict[str, List[str]] = {category: [] for category in CATEGORIES}
+    for entry in sorted(entries.values(), key=lambda e: e["nombre"].lower()):
+        lista[entry["categoria"]].append(f"{entry['nombre']} {_format_amount(entry)}".strip())
+    return {category: items for category, items in lista.items() if items}
@@ -4,6 +4,7 @@ Test Admin Panel Features for NutriPlan
 - Admin stats endpoint
 - Admin users endpoint
 - Admin payments endpoint
+- Admin LLM response cache metrics
 """
 
 import pytest
@@ -147,6 +148,21 @@ class TestAdminFeatures:
         
         print(f"✓ Admin payments endpoint returned {data['total']} total transactions")
     
+    def test_admin_llm_cache_metrics(self):
+        """API GET /api/admin/llm-cache returns response cache metrics"""
+        response = self.session.get(f"{BASE_URL}/api/admin/llm-cache")
+        
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        
+        data = response.json()
+        for field in ["enabled", "ttl_hours", "max_bytes", "stored", "process"]:
+            assert field in data, f"Response should contain '{field}' field"
+        for field in ["hits", "misses", "hit_rate", "bytes_saved"]:
+            assert field in data["process"], f"process metrics should contain '{field}'"
+        assert data["stored"]["bytes"] <= data["max_bytes"]
+        
+        print(f"✓ LLM cache: {data['stored']['entries']} entries, {data['process']['hits']} hits")
+    
     def test_non_admin_user_denied_access(self):
         """Non-admin user should be denied access to admin endpoints"""
         # Create a new non-admin user
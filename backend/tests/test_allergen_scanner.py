@@ -0,0 +1,70 @@
+"""
+Unit tests for allergen_scanner: Aho-Corasick conflicts between plans and user restrictions
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from allergen_scanner import Automaton, ConflictScanner, meals_with_conflicts, remove_conflicts  # noqa: E402
+
+Q_DATA = {"alergias": ["Lactosa", "Mariscos"], "alimentos_no_deseados": ["Champiñones"]}
+
+
+def option(nombre, ingredientes, sustituciones=()):
+    return {"nombre": nombre, "ingredientes": [{"item": i, "cantidad": "1 pieza"} for i in ingredientes],
+            "sustituciones": list(sustituciones)}
+
+
+def plan():
+    return {"dias": [{"dia": "Día 1", "comidas": [
+        {"tipo": "Desayuno", "opciones": [
+            option("Avena con leche de almendras", ["Avena", "Leche de almendras", "Crema de cacahuate"],
+                   ["Leche de almendras: leche entera", "Avena: amaranto"]),
+            option("Molletes", ["Bolillo", "Frijoles", "Queso Oaxaca"]),
+        ]},
+        {"tipo": "Cena", "opciones": [
+            option("Tacos de camarón", ["Camarones", "Tortillas de maíz"]),
+            option("Tacos de champiñón", ["Champiñón", "Tortillas de maíz"]),
+        ]},
+    ]}]}
+
+
+def test_automaton_matches_whole_words_and_plurals():
+    automaton = Automaton([("pan", ("alergia", "gluten")), ("huevo", ("alergia", "huevo"))])
+    matches = [(start, end) for start, end, _ in automaton.finditer("panela con huevos y pan")]
+
+    assert matches == [(11, 17), (20, 23)]
+
+
+def test_scan_flags_allergens_aversions_and_substitutions():
+    conflicts = ConflictScanner().scan(plan(), Q_DATA)
+    flagged = {(c["tipo"], c["opcion"], c["campo"], c["restriccion"]) for c in conflicts}
+
+    assert ("Desayuno", 0, "sustituciones", "lactosa") in flagged
+    assert ("Desayuno", 1, "ingredientes", "lactosa") in flagged
+    assert ("Cena", 0, "ingredientes", "mariscos") in flagged
+    assert ("Cena", 1, "ingredientes", "champinones") in flagged
+    # "leche de almendras" and "crema de cacahuate" are not dairy
+    assert not any(c["tipo"] == "Desayuno" and c["opcion"] == 0 and c["campo"] != "sustituciones"
+                   for c in conflicts)
+    assert meals_with_conflicts(conflicts) == {1: ["Desayuno", "Cena"]}
+
+
+def test_remove_conflicts_keeps_clean_options():
+    plan_data = plan()
+    emptied = remove_conflicts(plan_data, ConflictScanner().scan(plan_data, Q_DATA))
+    desayuno, cena = plan_data["dias"][0]["comidas"]
+
+    assert [o["nombre"] for o in desayuno["opciones"]] == ["Avena con leche de almendras"]
+    assert desayuno["opciones"][0]["sustituciones"] == ["Avena: amaranto"]
+    assert emptied == {1: ["Cena"]}
+
+
+def test_automata_are_shared_per_restriction_set():
+    scanner = ConflictScanner({"lactosa": ["Queso Oaxaca"]})
+    scanner.scan(plan(), Q_DATA)
+    scanner.scan(plan(), {"alergias": ["Mariscos", "Lactosa"], "alimentos_no_deseados": ["champiñones"]})
+
+    assert scanner.automaton.cache_info().hits == 1
+    assert scanner.scan(plan(), {"alergias": [], "alimentos_no_deseados": []}) == []
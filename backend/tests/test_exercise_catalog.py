@@ -0,0 +1,59 @@
+"""
+Unit tests for exercise_catalog: local guia_ejercicios from days, goal and injuries
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exercise_catalog import CATALOG, EXERCISES, build_exercise_guide, injury_zones  # noqa: E402
+
+ZONES_BY_NAME = {e["nombre"]: e["zones"] for e in EXERCISES}
+
+
+def all_exercises(guide):
+    return [ej for key in ("rutina_casa", "rutina_gimnasio") for rutina in guide[key] for ej in rutina["ejercicios"]]
+
+
+def test_routines_follow_exercise_days_and_goal():
+    guide = build_exercise_guide({"objetivo_principal": "Aumentar masa muscular", "dias_ejercicio": 4})
+
+    assert guide["dias_recomendados"] == 4
+    assert [r["dia"] for r in guide["rutina_gimnasio"]] == [
+        "Día 1 - Tren Superior", "Día 2 - Tren Inferior", "Día 3 - Tren Superior", "Día 4 - Tren Inferior"]
+    assert len(guide["rutina_casa"]) == 4
+    for ej in all_exercises(guide):
+        assert ej["series"] == 4
+        assert ej["tecnica"] and ej["musculo"]
+    # The same split day repeated later in the week uses different exercises
+    first, third = guide["rutina_gimnasio"][0], guide["rutina_gimnasio"][2]
+    assert [e["nombre"] for e in first["ejercicios"]] != [e["nombre"] for e in third["ejercicios"]]
+
+
+def test_injuries_exclude_exercises_that_load_the_zone():
+    lesiones = ["Lesión de rodilla", "Lesión de hombro"]
+    guide = build_exercise_guide({"objetivo_principal": "Bajar de peso", "dias_ejercicio": 3,
+                                  "lesiones_restricciones": lesiones})
+
+    assert injury_zones(lesiones) == {"rodilla", "hombro"}
+    assert "nota_lesiones" in guide
+    for ej in all_exercises(guide):
+        assert not ZONES_BY_NAME[ej["nombre"]] & {"rodilla", "hombro"}
+
+
+def test_every_routine_has_exercises_with_many_injuries():
+    lesiones = ["Lesión de rodilla", "Lesión de espalda", "Lesión de hombro", "Lesión de tobillo",
+                "Hernia", "Problema de cadera", "Tendinitis"]
+    guide = build_exercise_guide({"objetivo_principal": "Control de peso", "dias_ejercicio": 0,
+                                  "lesiones_restricciones": lesiones})
+
+    assert guide["dias_recomendados"] == 3
+    for key in ("rutina_casa", "rutina_gimnasio"):
+        assert all(len(rutina["ejercicios"]) >= 3 for rutina in guide[key])
+
+
+def test_catalog_index_by_group_and_equipment():
+    excluded = CATALOG.excluded({"rodilla"})
+    for index in CATALOG.candidates("piernas", "gimnasio", excluded):
+        assert "gimnasio" in EXERCISES[index]["equipment"]
+        assert "rodilla" not in EXERCISES[index]["zones"]
@@ -0,0 +1,65 @@
+"""
+Unit tests for food_db: compiled food table and fuzzy ingredient lookup
+"""
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from food_db import FoodDatabase, SOURCE_FILE, normalize_food_name  # noqa: E402
+
+SOURCE = Path(__file__).resolve().parent.parent / "data" / SOURCE_FILE
+
+
+@pytest.fixture(scope="module")
+def foods(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("foods")
+    shutil.copy(SOURCE, data_dir / SOURCE_FILE)
+    return FoodDatabase(data_dir)
+
+
+def test_normalize_strips_quantities():
+    assert normalize_food_name("150g de Pechuga de pollo (sin piel)") == "pechuga de pollo"
+    assert normalize_food_name("1/2 taza de avena") == "avena"
+
+
+def test_values_are_memory_mapped(foods):
+    assert len(foods) > 100
+    assert foods.values.filename is not None
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("pechuga de pollo 150g", "Pechuga de pollo"),
+    ("huevos", "Huevo"),
+    ("platano", "Plátano"),
+    ("quso panela", "Queso panela"),
+    ("Yogurt griego natural", "Yogur griego natural"),
+    ("jitomates", "Jitomate"),
+])
+def test_fuzzy_lookup(foods, query, expected):
+    assert foods.lookup(query)["nombre"] == expected
+
+
+def test_unknown_food_has_no_match(foods):
+    assert foods.lookup("xyz") is None
+
+
+def test_nutrition_and_allergens(foods):
+    egg = foods.lookup("huevo")
+    assert egg["alergenos"] == ["huevo"]
+    assert egg["categoria"] == "proteinas"
+    assert egg["gramos_pieza"] == 50
+    chicken = foods.lookup("pechuga de pollo")
+    assert foods.nutrition(chicken["id"], 200)["proteinas"] == pytest.approx(62, abs=0.5)
+
+
+def test_match_memo_is_bounded(foods):
+    assert foods.match(" Huevo ") == foods.match("huevo") == (foods.lookup("huevo")["id"], 50)
+    for i in range(foods._match.cache_info().maxsize + 10):
+        foods.match(f"ingrediente inventado {i}")
+    info = foods._match.cache_info()
+    assert info.currsize == info.maxsize
@@ -8,7 +8,7 @@ Test suite for NutriPlan new features:
 import pytest
 import requests
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
@@ -199,6 +199,33 @@ class TestHydrationLogEndpoint:
         assert data["glasses"] == 8, "Glasses should be updated to 8"
         print(f"✓ Hydration log upsert works correctly: {data}")
     
+    def test_increment_hydration(self, api_client, user_with_questionnaire, auth_headers):
+        """Test incrementing and decrementing glasses for a day"""
+        day = (datetime.now(timezone.utc) - timedelta(days=20)).strftime("%Y-%m-%d")
+        
+        api_client.post(
+            f"{BASE_URL}/api/hydration/log",
+            json={"glasses": 2, "date": day},
+            headers=auth_headers
+        )
+        response = api_client.post(
+            f"{BASE_URL}/api/hydration/increment",
+            json={"delta": 1, "date": day},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        assert response.json()["glasses"] == 3
+        
+        # Never goes below zero
+        response = api_client.post(
+            f"{BASE_URL}/api/hydration/increment",
+            json={"delta": -10, "date": day},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert response.json()["glasses"] == 0
+        print("✓ Hydration increment works")
+    
     def test_log_hydration_unauthorized(self, api_client):
         """Test hydration log requires authentication"""
         response = api_client.post(
@@ -296,6 +323,96 @@ class TestHydrationHistoryEndpoint:
         assert len(data) <= 3, "Should return at most 3 records"
         print(f"✓ Hydration history with days param: {len(data)} records")
 
+    def test_history_is_gap_filled(self, api_client, user_with_questionnaire, auth_headers):
+        """Test history returns one entry per day, oldest first, with zeros for missing days"""
+        response = api_client.get(
+            f"{BASE_URL}/api/hydration/history?days=10",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 10, f"Expected 10 dense days, got {len(data)}"
+        dates = [d["date"] for d in data]
+        assert dates == sorted(dates), "History should be sorted oldest first"
+        for day in data:
+            assert "glasses" in day and "goal_glasses" in day and "met_goal" in day
+        print(f"✓ Dense hydration history: {dates[0]} .. {dates[-1]}")
+    
+    def test_history_explicit_range(self, api_client, user_with_questionnaire, auth_headers):
+        """Test history with explicit start/end dates"""
+        today = datetime.now(timezone.utc)
+        start = (today - timedelta(days=4)).strftime("%Y-%m-%d")
+        end = today.strftime("%Y-%m-%d")
+        
+        api_client.post(
+            f"{BASE_URL}/api/hydration/log",
+            json={"glasses": 2, "date": start},
+            headers=auth_headers
+        )
+        
+        response = api_client.get(
+            f"{BASE_URL}/api/hydration/history?start={start}&end={end}",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 5
+        assert data[0]["date"] == start and data[0]["glasses"] == 2
+        assert data[-1]["date"] == end
+        print("✓ Explicit hydration range works")
+    
+    def test_history_invalid_range(self, api_client, user_with_questionnaire, auth_headers):
+        """Test inverted or malformed ranges are rejected"""
+        response = api_client.get(
+            f"{BASE_URL}/api/hydration/history?start=2024-02-10&end=2024-02-01",
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+        
+        response = api_client.get(
+            f"{BASE_URL}/api/hydration/history?start=10/02/2024",
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+        print("✓ Invalid hydration ranges rejected")
+
+
+class TestHydrationSummaryEndpoint:
+    """Test GET /api/hydration/summary endpoint"""
+    
+    def test_summary_streaks_and_adherence(self, api_client, user_with_questionnaire, auth_headers):
+        """Test streaks and adherence are computed server-side against the goal"""
+        goal = api_client.get(f"{BASE_URL}/api/hydration/goal", headers=auth_headers).json()
+        today = datetime.now(timezone.utc)
+        
+        # Meet the goal for the last 3 days
+        for offset in range(3):
+            day = (today - timedelta(days=offset)).strftime("%Y-%m-%d")
+            api_client.post(
+                f"{BASE_URL}/api/hydration/log",
+                json={"glasses": goal["daily_glasses"], "date": day},
+                headers=auth_headers
+            )
+        
+        response = api_client.get(f"{BASE_URL}/api/hydration/summary", headers=auth_headers)
+        
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        data = response.json()
+        assert data["goal"]["daily_glasses"] == goal["daily_glasses"]
+        assert data["current_streak"] >= 3
+        assert data["best_streak"] >= data["current_streak"]
+        assert 0 < data["adherence_30"] <= 100
+        assert 0 < data["adherence_90"] <= 100
+        assert data["days_logged"] >= 3
+        print(f"✓ Hydration summary: {data}")
+    
+    def test_summary_unauthorized(self, api_client):
+        """Test summary requires authentication"""
+        response = api_client.get(f"{BASE_URL}/api/hydration/summary")
+        assert response.status_code in [401, 403]
+
 
 class TestMealPlanStructure:
     """Test meal plan structure for 3 options per meal feature"""
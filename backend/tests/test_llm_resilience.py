@@ -0,0 +1,147 @@
+"""
+Unit tests for llm_resilience: deadlines, retries, hedging and the circuit breaker
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_resilience import (  # noqa: E402
+    CircuitBreaker, LatencyTracker, LlmUnavailable, RetryPolicy, call_with_resilience,
+)
+
+FAST = RetryPolicy(attempt_timeout=0.05, total_timeout=1.0, retries=2, base_backoff=0.001, max_backoff=0.002)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def scripted(*outcomes):
+    """Attempt factory: each call sleeps / fails / answers according to the next outcome"""
+    calls = []
+
+    async def attempt():
+        outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(outcome)
+        delay, value = outcome
+        await asyncio.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    return attempt, calls
+
+
+class TestRetries:
+    def test_retries_after_error_and_timeout(self):
+        attempt, calls = scripted((0, RuntimeError("500")), (1.0, "tarde"), (0, "ok"))
+        assert run(call_with_resilience(attempt, FAST, CircuitBreaker())) == "ok"
+        assert len(calls) == 3
+
+    def test_gives_up_after_the_retries(self):
+        attempt, calls = scripted((0, RuntimeError("500")))
+        with pytest.raises(LlmUnavailable):
+            run(call_with_resilience(attempt, FAST, CircuitBreaker()))
+        assert len(calls) == FAST.retries + 1
+
+    def test_total_deadline_bounds_a_hung_provider(self):
+        policy = RetryPolicy(attempt_timeout=10, total_timeout=0.1, retries=5, base_backoff=0.001)
+        attempt, calls = scripted((10, "nunca"))
+
+        async def timed():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(LlmUnavailable):
+                await call_with_resilience(attempt, policy, CircuitBreaker())
+            return loop.time() - started
+
+        assert run(timed()) < 1
+        assert len(calls) == 1
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(1, 10, base_backoff=1, max_backoff=4)
+        samples = [policy.backoff(retry) for retry in range(6) for _ in range(50)]
+        assert all(0 <= s <= 4 for s in samples)
+        assert len(set(samples)) > 1
+
+
+class TestHedging:
+    def test_hedge_wins_over_a_slow_first_attempt(self):
+        latency = LatencyTracker(min_samples=3)
+        for seconds in (0.01, 0.01, 0.01):
+            latency.record(seconds)
+        policy = RetryPolicy(attempt_timeout=2, total_timeout=2, retries=0)
+        attempt, calls = scripted((1.0, "lento"), (0, "rapido"))
+        assert run(call_with_resilience(attempt, policy, CircuitBreaker(), latency, hedge=True)) == "rapido"
+        assert len(calls) == 2
+
+    def test_no_hedge_without_enough_samples(self):
+        policy = RetryPolicy(attempt_timeout=2, total_timeout=2, retries=0)
+        attempt, calls = scripted((0.05, "uno"), (0, "dos"))
+        assert run(call_with_resilience(attempt, policy, CircuitBreaker(), LatencyTracker(), hedge=True)) == "uno"
+        assert len(calls) == 1
+
+
+class TestCircuitBreaker:
+    def test_opens_on_error_rate_and_fails_fast(self):
+        breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, cooldown=30, clock=FakeClock())
+        for ok in (True, False, True, False):
+            breaker.record(ok)
+        assert breaker.state == "open"
+
+        attempt, calls = scripted((0, "ok"))
+        with pytest.raises(LlmUnavailable):
+            run(call_with_resilience(attempt, FAST, breaker))
+        assert calls == []
+
+    def test_half_open_probe_closes_or_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(window=2, min_calls=2, error_rate=0.5, cooldown=30, clock=clock)
+        breaker.record(False)
+        breaker.record(False)
+        clock.now = 31
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+        assert not breaker.allow()  # one probe at a time
+        breaker.record(False)
+        assert breaker.state == "open"
+
+        clock.now = 62
+        assert breaker.allow()
+        breaker.record(True)
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_late_outcomes_of_calls_started_before_opening_are_ignored(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(window=2, min_calls=2, error_rate=0.5, cooldown=30, clock=clock)
+        breaker.record(False)
+        breaker.record(False)
+        breaker.record(True)  # slow call from before the trip
+        assert breaker.state == "open"
+
+        clock.now = 31
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == "open"
+        breaker.record(True)  # no probe in flight
+        assert breaker.state == "open"
+
+    def test_timeouts_count_as_failures(self):
+        breaker = CircuitBreaker(window=3, min_calls=3, error_rate=1.0)
+        attempt, _ = scripted((1.0, "tarde"))
+        with pytest.raises(LlmUnavailable):
+            run(call_with_resilience(attempt, FAST, breaker))
+        assert breaker.state == "open"
@@ -0,0 +1,96 @@
+"""
+Unit tests for llm_router: latency-aware choice, quality floors and failover
+"""
+import asyncio
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_resilience import CircuitBreaker, LlmUnavailable, RetryPolicy, call_with_resilience  # noqa: E402
+from llm_router import LlmRouter, ModelCandidate, Route  # noqa: E402
+
+FAST = RetryPolicy(attempt_timeout=0.05, total_timeout=1.0, retries=2, base_backoff=0.001, max_backoff=0.002)
+
+
+def make_router(explore_rate=0.0, **routes):
+    candidates = {
+        name: ModelCandidate(name, client=name, quality=quality,
+                             breaker=CircuitBreaker(window=2, min_calls=2, error_rate=0.5, cooldown=30), alpha=0.5)
+        for name, quality in (("openai/gpt-5.2", 0.9), ("gemini/gemini-2.5-pro", 0.85), ("gemini/flash", 0.7))
+    }
+    routes = routes or {"weekly": Route(["openai/gpt-5.2", "gemini/gemini-2.5-pro", "gemini/flash"], 0.8)}
+    return LlmRouter(candidates, routes, "weekly", explore_rate=explore_rate, rng=random.Random(0))
+
+
+class TestChoice:
+    def test_route_order_until_measured_then_lowest_expected_latency(self):
+        router = make_router()
+        assert router.route("weekly").pick().name == "openai/gpt-5.2"
+        router.candidates["openai/gpt-5.2"].observe(True, 4.0)
+        router.candidates["gemini/gemini-2.5-pro"].observe(True, 2.0)
+        assert router.route("weekly").pick().name == "gemini/gemini-2.5-pro"
+        # Errors make a fast model more expensive than a reliable one
+        router.candidates["gemini/gemini-2.5-pro"].observe(False)
+        router.candidates["gemini/gemini-2.5-pro"].observe(True, 2.0)
+        assert router.candidates["gemini/gemini-2.5-pro"].expected_latency() == pytest.approx(2.0 / 0.75)
+
+    def test_quality_floor_and_per_plan_type_routes(self):
+        router = make_router(weekly=Route(["gemini/flash", "openai/gpt-5.2"], 0.8),
+                             trial=Route(["gemini/flash", "openai/gpt-5.2"], 0.6))
+        assert router.route("weekly").pick().name == "openai/gpt-5.2"
+        assert router.route("trial").pick().name == "gemini/flash"
+        assert router.route("unknown").pick().name == "openai/gpt-5.2"
+        # Cached responses are served to a route only from models above its floor
+        assert (router.route("weekly").min_quality, router.route("trial").min_quality) == (0.8, 0.6)
+
+    def test_unknown_candidates_are_rejected(self):
+        with pytest.raises(ValueError):
+            make_router(weekly=Route(["anthropic/nope"]))
+
+
+class TestFailover:
+    def test_retry_goes_to_another_candidate(self):
+        router = make_router()
+        route = router.route("weekly")
+        calls = []
+
+        async def attempt(candidate):
+            calls.append(candidate.name)
+            if candidate.name == "openai/gpt-5.2":
+                raise RuntimeError("503")
+            return candidate.name
+
+        assert asyncio.run(call_with_resilience(attempt, FAST, None, route=route)) == "gemini/gemini-2.5-pro"
+        assert calls == ["openai/gpt-5.2", "gemini/gemini-2.5-pro"]
+        assert route.answered.name == "gemini/gemini-2.5-pro"
+        assert router.candidates["openai/gpt-5.2"].error_rate == 0.5
+
+    def test_open_breaker_moves_traffic_and_all_open_fails_fast(self):
+        router = make_router()
+        for name in ("openai/gpt-5.2", "openai/gpt-5.2", "gemini/gemini-2.5-pro", "gemini/gemini-2.5-pro"):
+            router.candidates[name].observe(False)
+        assert router.candidates["openai/gpt-5.2"].breaker.state == "open"
+        assert not router.route("weekly").available()
+
+        async def attempt(candidate):
+            return "nunca"
+
+        with pytest.raises(LlmUnavailable):
+            asyncio.run(call_with_resilience(attempt, FAST, None, route=router.route("weekly")))
+
+    def test_timeouts_count_against_the_candidate(self):
+        router = make_router()
+
+        async def attempt(candidate):
+            if candidate.name == "openai/gpt-5.2":
+                await asyncio.sleep(1)
+            return "ok"
+
+        assert asyncio.run(call_with_resilience(attempt, FAST, None, route=router.route("weekly"))) == "ok"
+        stats = router.stats()["candidates"]
+        assert stats["openai/gpt-5.2"]["error_rate"] == 0.5 and stats["openai/gpt-5.2"]["latency_s"] is None
+        assert stats["gemini/gemini-2.5-pro"]["calls"] == 1
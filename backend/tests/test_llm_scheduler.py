@@ -0,0 +1,116 @@
+"""
+Unit tests for llm_scheduler: weighted fair sharing, class caps and rejections
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_scheduler import ClassLimits, LlmScheduler, SchedulerRejected  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def hold_slots(scheduler, klass, count, user_id=None):
+    for _ in range(count):
+        await scheduler.acquire(klass, user_id)
+
+
+def test_grants_follow_class_weights():
+    async def scenario():
+        scheduler = LlmScheduler(1, {"paid": ClassLimits(3, 10), "background": ClassLimits(1, 10)}, per_user=100)
+        await scheduler.acquire("paid")
+        order = []
+
+        async def caller(klass):
+            async with scheduler.slot(klass):
+                order.append(klass)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(caller(k)) for k in ["paid"] * 6 + ["background"] * 6]
+        await settle()
+        scheduler.release("paid")
+        await asyncio.gather(*tasks)
+        return order
+
+    order = run(scenario())
+    assert order[:8].count("paid") == 6
+    assert order[8:] == ["background"] * 4
+
+
+def test_class_cap_leaves_capacity_to_other_classes():
+    async def scenario():
+        scheduler = LlmScheduler(4, {"paid": ClassLimits(6, 4), "trial": ClassLimits(2, 1)}, per_user=100)
+        await hold_slots(scheduler, "trial", 1)
+        waiting = asyncio.create_task(scheduler.acquire("trial"))
+        await settle()
+        assert not waiting.done() and scheduler.queued("trial") == 1
+        await hold_slots(scheduler, "paid", 3)
+        assert scheduler.running == 4
+        waiting.cancel()
+
+    run(scenario())
+
+
+def test_user_quota_counts_running_and_queued_calls():
+    async def scenario():
+        scheduler = LlmScheduler(1, {"paid": ClassLimits(1, 1)}, per_user=2)
+        await scheduler.acquire("paid", "u1")
+        waiting = asyncio.create_task(scheduler.acquire("paid", "u1"))
+        await settle()
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire("paid", "u1")
+        assert rejected.value.reason == "user_quota"
+        scheduler.release("paid", "u1")
+        await waiting
+        return scheduler.stats()
+
+    stats = run(scenario())
+    assert stats["classes"]["paid"]["rejected"] == {"user_quota": 1}
+    assert stats["classes"]["paid"]["granted"] == 2
+
+
+def test_full_queue_rejects_at_once_and_waits_time_out():
+    async def scenario():
+        scheduler = LlmScheduler(1, {"trial": ClassLimits(1, 1, max_queue=1, max_wait=0.02)}, per_user=100)
+        await scheduler.acquire("trial")
+        waiting = asyncio.create_task(scheduler.acquire("trial"))
+        await settle()
+        with pytest.raises(SchedulerRejected) as full:
+            await scheduler.acquire("trial")
+        with pytest.raises(SchedulerRejected) as timed_out:
+            await waiting
+        return full.value.reason, timed_out.value.reason, scheduler
+
+    full, timed_out, scheduler = run(scenario())
+    assert (full, timed_out) == ("queue_full", "queue_timeout")
+    assert scheduler.queued("trial") == 0
+    assert scheduler.stats()["classes"]["trial"]["rejected"] == {"queue_full": 1, "queue_timeout": 1}
+
+
+def test_cancelled_waiters_leave_no_trace():
+    async def scenario():
+        scheduler = LlmScheduler(1, {"paid": ClassLimits(1, 1)}, per_user=1)
+        await scheduler.acquire("paid", "u1")
+        waiting = asyncio.create_task(scheduler.acquire("paid", "u2"))
+        await settle()
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        scheduler.release("paid", "u1")
+        # u2 holds nothing now, so its quota is free again
+        await scheduler.acquire("paid", "u2")
+        return scheduler
+
+    scheduler = run(scenario())
+    assert scheduler.running == 1 and scheduler.queued("paid") == 0
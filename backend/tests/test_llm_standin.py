@@ -0,0 +1,145 @@
+"""
+Unit tests for llm_standin: schema-valid responses, streaming, simulated failures
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_standin import StandInConfig, StandInError, StandInProvider, parse_targets, respond  # noqa: E402
+from plan_prompts import build_days_prompt, build_enrich_prompt, build_extras_prompt, build_profile_prompt  # noqa: E402
+from plan_wire import apply_enrichment, expand_day  # noqa: E402
+
+Q_DATA = {"edad": 30, "sexo": "Femenino", "peso": 60, "estatura": 165, "objetivo_principal": "Bajar de peso",
+          "alergias": ["Lácteos"], "vegetariano": True}
+MACROS = {"proteinas": 110, "carbohidratos": 180, "grasas": 60}
+PROFILE = build_profile_prompt(Q_DATA, 1800, MACROS)
+FAST = StandInConfig(ttft_median=0, tokens_per_second=1e6, chunk_tokens=8)
+
+
+def stream(provider, prompt):
+    async def collect():
+        chat = provider.chat("test", "system")
+        return [chunk async for chunk in chat.stream_message(provider.message(prompt))]
+    return asyncio.run(collect())
+
+
+def test_reads_targets_from_the_profile():
+    targets = parse_targets(PROFILE)
+    assert (targets.calories, dict(targets.macros)) == (1800, MACROS)
+    assert (targets.alergias, targets.vegetariano) == (("Lácteos",), True)
+
+
+def test_days_are_schema_valid_and_limited_to_the_requested_meals():
+    pytest.importorskip("jsonschema")
+    from plan_schema import day_errors
+
+    prompt = build_days_prompt(PROFILE, [2, 3], {2: ["Cena"], 3: ["Desayuno", "Comida", "Snack", "Cena"]}, {"Cena": 450})
+    days = [expand_day(day) for day in json.loads(respond(prompt))["dias"]]
+    assert [day_errors(day) for day in days] == [[], []]
+    assert [[c["tipo"] for c in day["comidas"]] for day in days] == [["Cena"], ["Desayuno", "Comida", "Snack", "Cena"]]
+
+
+def test_trial_and_extras_responses():
+    pytest.importorskip("jsonschema")
+    from plan_schema import day_errors
+
+    trial = json.loads(respond("Genera un plan alimenticio de UN SOLO DÍA\n- Calorías objetivo: 1600 kcal/día"))
+    assert day_errors(trial) == [] and len(trial["recomendaciones"]) == 3
+    extras = json.loads(respond(build_extras_prompt(PROFILE, Q_DATA)))
+    assert "2.1L" in extras["recomendaciones_adicionales"]["hidratacion"]
+
+
+def test_enriches_every_listed_option():
+    wire = json.loads(respond(build_days_prompt(PROFILE, [1, 2])))["dias"]
+    days = {number: expand_day(day) for number, day in enumerate(wire, 1)}
+    enriched = json.loads(respond(build_enrich_prompt(PROFILE, days)))["enriquecidos"]
+    assert [d["d"] for d in enriched] == [1, 2]
+    for day, extra in zip(days.values(), enriched):
+        assert apply_enrichment(day, extra) == sum(len(c["opciones"]) for c in day["comidas"])
+
+
+def test_incomplete_providers_cannot_be_instantiated():
+    from llm_client import LlmProvider
+
+    class NoMessage(LlmProvider):
+        def chat(self, session_id, system_message):
+            return None
+
+    with pytest.raises(TypeError):
+        NoMessage("test", "model")
+
+
+def test_streams_the_response_in_chunks():
+    prompt = build_days_prompt(PROFILE, [1])
+    chunks = stream(StandInProvider("gpt-5.2", FAST), prompt)
+    assert len(chunks) > 1 and "".join(chunks) == respond(prompt)
+
+
+def days_per_chunk(chat, message):
+    """Days DayStreamParser completes with each chunk stream_chat yields"""
+    from llm_client import stream_chat
+    from plan_json import DayStreamParser
+
+    async def collect():
+        parser = DayStreamParser()
+        return [len(parser.feed(chunk)) async for chunk in stream_chat(chat, message)]
+    return asyncio.run(collect())
+
+
+def test_days_of_a_non_streaming_chat_arrive_together_once_it_answers():
+    class WholeResponseChat:
+        """Like the SDK's LlmChat: only send_message"""
+
+        def __init__(self):
+            self.answered = False
+
+        async def send_message(self, message):
+            await asyncio.sleep(0)
+            self.answered = True
+            return respond(message.text)
+
+    provider = StandInProvider("gpt-5.2", FAST)
+    message = provider.message(build_days_prompt(PROFILE, [1, 2]))
+    chat = WholeResponseChat()
+    assert days_per_chunk(chat, message) == [2]
+    assert chat.answered
+    # The same response streamed completes Day 1 before the end
+    streamed = days_per_chunk(provider.chat("test", "system"), message)
+    first_day = next(i for i, days in enumerate(streamed) if days)
+    assert sum(streamed) == 2 and first_day < len(streamed) - 1
+
+
+def test_failures_and_truncation():
+    prompt = build_days_prompt(PROFILE, [1])
+    truncated = "".join(stream(StandInProvider("gpt-5.2", FAST._replace(truncate_rate=1)), prompt))
+    assert len(truncated) == len(respond(prompt)) // 2
+    with pytest.raises(StandInError):
+        stream(StandInProvider("gpt-5.2", FAST._replace(failure_rate=1)), prompt)
+
+
+def test_same_seed_same_outcomes():
+    def outcomes(seed):
+        provider = StandInProvider("gpt-5.2", FAST._replace(failure_rate=0.5, seed=seed))
+        results = []
+        for _ in range(20):
+            try:
+                results.append(len("".join(stream(provider, "hola"))))
+            except StandInError:
+                results.append(None)
+        return results
+
+    assert outcomes(7) == outcomes(7)
+    assert None in outcomes(7) and 2 in outcomes(7)
+
+
+def test_model_views_stay_local():
+    provider = StandInProvider("gpt-5.2", FAST)
+    view = provider.with_model("gemini", "gemini-2.5-flash")
+    assert (view.provider, view.model, view.rng) == ("standin", "gemini/gemini-2.5-flash", provider.rng)
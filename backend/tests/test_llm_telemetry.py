@@ -0,0 +1,110 @@
+"""
+Unit tests for llm_telemetry: batched writes, cost and the per-day summary
+"""
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_telemetry import (  # noqa: E402
+    TelemetryWriter, TokenPrices, percentile, sample_pipeline, summarize, summary_pipeline,
+)
+
+
+class FakeCollection:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.batches.append(list(documents))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestWriter:
+    def test_writes_in_batches_and_flushes_on_close(self):
+        async def scenario():
+            collection = FakeCollection()
+            writer = TelemetryWriter(collection, batch_size=3, flush_interval=60)
+            writer.start()
+            for i in range(4):
+                writer.record({"n": i})
+            await asyncio.sleep(0.01)
+            full_batches = [len(b) for b in collection.batches]
+            await writer.close()
+            return full_batches, collection, writer
+
+        full_batches, collection, writer = run(scenario())
+        assert full_batches == [3]
+        assert [len(b) for b in collection.batches] == [3, 1]
+        assert writer.stats() == {"recorded": 4, "written": 4, "pending": 0, "dropped": 0, "failed_batches": 0}
+
+    def test_bounded_buffer_drops_oldest_and_counts_failures(self):
+        async def scenario():
+            writer = TelemetryWriter(FakeCollection(fail=True), batch_size=10, max_pending=2)
+            for i in range(3):
+                writer.record({"n": i})
+            assert [e["n"] for e in writer._pending] == [1, 2]
+            await writer.close()
+            return writer.stats()
+
+        stats = run(scenario())
+        assert stats["dropped"] == 3 and stats["failed_batches"] == 1 and stats["pending"] == 0
+
+
+def test_cost_per_million_tokens():
+    assert TokenPrices(prompt=2.0, completion=10.0).cost(1000, 500) == 0.007
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99)) == (50, 95, 99)
+    assert percentile([], 0.5) is None
+
+
+def test_summary_rows_from_grouped_counts_and_a_latency_sample():
+    def group(day, plan_type, calls, cache_hits=0, parse_errors=0, fallbacks=0):
+        return {"_id": {"day": day, "model": "openai/gpt-5.2", "plan_type": plan_type}, "calls": calls,
+                "cache_hits": cache_hits, "prompt_tokens": 100 * calls, "completion_tokens": 50 * calls,
+                "cost_usd": 0.001 * calls, "saved_usd": 0.0015 * cache_hits, "parse_errors": parse_errors,
+                "fallbacks": fallbacks}
+
+    def sampled(day, plan_type, latency):
+        return {"created_at": datetime(2026, 3, day, 12, tzinfo=timezone.utc), "model": "openai/gpt-5.2",
+                "plan_type": plan_type, "latency_ms": latency, "ttft_ms": None}
+
+    summary = summarize(
+        [group("2026-03-02", "weekly", 1), group("2026-03-01", "weekly", 2, cache_hits=2, parse_errors=1),
+         group("2026-03-01", "trial", 1, parse_errors=1, fallbacks=1), group("2026-03-01", "extras", 0, cache_hits=3)],
+        [sampled(2, "weekly", 300), sampled(1, "weekly", 100), sampled(1, "weekly", 200), sampled(1, "trial", 50)],
+    )
+    assert [(row["day"], row["plan_type"], row["calls"]) for row in summary] == [
+        ("2026-03-01", "extras", 0), ("2026-03-01", "trial", 1), ("2026-03-01", "weekly", 2),
+        ("2026-03-02", "weekly", 1),
+    ]
+    weekly = summary[2]
+    assert weekly["latency_ms"] == {"p50": 100, "p95": 200, "p99": 200}
+    assert weekly["ttft_ms"] == {"p50": None, "p95": None, "p99": None}
+    assert (weekly["prompt_tokens"], weekly["completion_tokens"], weekly["cost_usd"]) == (200, 100, 0.002)
+    assert (weekly["cache_hit_rate"], weekly["saved_usd"]) == (0.5, 0.003)
+    assert (weekly["parse_error_rate"], weekly["fallback_rate"]) == (0.5, 0.0)
+    assert summary[1]["fallback_rate"] == 1.0
+    # Only cache hits: no rates to divide by, no latencies
+    assert (summary[0]["cache_hit_rate"], summary[0]["parse_error_rate"]) == (1.0, 0.0)
+    assert summary[0]["latency_ms"]["p50"] is None
+
+
+def test_pipelines_group_in_the_database_and_cap_the_sample():
+    since = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    stages = [next(iter(stage)) for stage in summary_pipeline(since)]
+    assert stages == ["$match", "$group"]
+    sample = sample_pipeline(since, 500)
+    assert {"$sample": {"size": 500}} in sample
+    assert sample[0]["$match"]["cache_hit"] == {"$ne": True}
@@ -0,0 +1,55 @@
+"""
+Unit tests for plan_composer: local plan days that respect targets and restrictions
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plan_composer import PlanComposer, CALORIE_TOLERANCE  # noqa: E402
+from recipe_library import detect_allergens, is_vegetarian, ingredient_names  # noqa: E402
+
+MACROS_1900 = {"proteinas": 140, "carbohidratos": 190, "grasas": 63}
+
+
+def all_options(days):
+    return [option for day in days for comida in day["comidas"] for option in comida["opciones"]]
+
+
+def test_days_hit_calorie_target():
+    days = PlanComposer().compose_days(1900, MACROS_1900)
+
+    assert len(days) == 7
+    assert [day["dia"] for day in days] == [f"Día {n}" for n in range(1, 8)]
+    for day in days:
+        assert [comida["tipo"] for comida in day["comidas"]] == ["Desayuno", "Comida", "Snack", "Cena"]
+        assert abs(day["totales"]["calorias"] - 1900) <= 1900 * CALORIE_TOLERANCE
+        assert day["dentro_de_tolerancia"]
+
+
+def test_restrictions_are_respected():
+    days = PlanComposer().compose_days(
+        1600, {"proteinas": 90, "carbohidratos": 200, "grasas": 50},
+        alergias=["Gluten", "Lactosa"], alimentos_no_deseados=["lentejas"], vegetariano=True
+    )
+
+    assert days
+    for option in all_options(days):
+        names = ingredient_names(option)
+        assert not {"gluten", "lactosa"} & set(detect_allergens(names)), option["nombre"]
+        assert is_vegetarian(names), option["nombre"]
+        assert "lentejas" not in option["nombre"].lower()
+
+
+def test_dishes_vary_across_the_week():
+    days = PlanComposer().compose_days(2200, {"proteinas": 150, "carbohidratos": 240, "grasas": 70})
+    breakfasts = {day["comidas"][0]["opciones"][0]["nombre"] for day in days}
+    assert len(breakfasts) >= 4
+
+
+def test_no_candidates_returns_empty():
+    composer = PlanComposer([d for d in PlanComposer().dishes if d["tipo"] != "Snack"])
+    assert composer.compose_days(1900, MACROS_1900) == []
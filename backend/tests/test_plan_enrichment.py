@@ -0,0 +1,148 @@
+"""
+Unit tests for plan_enrichment: in-place versions of a draft plan, retries and allergen checks
+"""
+import asyncio
+import copy
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from allergen_scanner import ConflictScanner  # noqa: E402
+from plan_enrichment import PlanEnricher, enriched_days  # noqa: E402
+
+Q_DATA = {"edad": 30, "sexo": "Femenino", "peso": 60, "estatura": 165, "objetivo_principal": "Bajar de peso",
+          "alergias": ["Lactosa"], "alimentos_no_deseados": []}
+MACROS = {"proteinas": 120, "carbohidratos": 180, "grasas": 60}
+
+
+def draft_plan(days=3):
+    option = {"nombre": "Pollo con arroz", "ingredientes": [{"item": "Pechuga de pollo", "cantidad": "120g"}],
+              "calorias": 450}
+    return {
+        "id": "plan-1", "version": 1, "stage": "draft", "calories_target": 1800, "macros": MACROS,
+        "plan_data": {"dias": [{"dia": f"Día {n}", "comidas": [{"tipo": "Cena", "opciones": [dict(option)]}]}
+                               for n in range(1, days + 1)]},
+    }
+
+
+class FakeCollection:
+    """update_one with $set (dotted paths), $inc and $addToSet on a single document"""
+
+    def __init__(self, document):
+        self.document = copy.deepcopy(document)
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append(update)
+        for path, value in update.get("$set", {}).items():
+            parent, key = self._parent(path)
+            parent[key] = value
+        for path, value in update.get("$inc", {}).items():
+            parent, key = self._parent(path)
+            parent[key] = parent.get(key, 0) + value
+        for path, value in update.get("$addToSet", {}).items():
+            parent, key = self._parent(path)
+            if value not in parent.setdefault(key, []):
+                parent[key].append(value)
+
+    def _parent(self, path):
+        *keys, last = path.split(".")
+        node = self.document
+        for key in keys:
+            node = node[int(key)] if isinstance(node, list) else node.setdefault(key, {})
+        return node, int(last) if isinstance(node, list) else last
+
+
+class FakeModel:
+    """Answers enrichment requests; `fail_days` fail while listed, `substitution` is offered for every option"""
+
+    def __init__(self, fail_days=(), substitution="Pollo: tofu firme", numbering=lambda number: number):
+        self.fail_days = set(fail_days)
+        self.substitution = substitution
+        self.numbering = numbering
+        self.requested = []
+
+    async def generate(self, session_prefix, system_message, prompt):
+        if session_prefix == "meal-plan-extras":
+            return {"recomendaciones_adicionales": {"sueno": "Duerme 8 horas"}}
+        numbers = [int(line.split()[1]) for line in prompt.splitlines() if line.startswith("Día ")]
+        self.requested.append(numbers)
+        if self.fail_days & set(numbers):
+            raise RuntimeError("provider down")
+        return {"enriquecidos": [
+            {"d": self.numbering(n), "c": [{"t": "Cena", "o": [{"s": [self.substitution], "x": "Cocina al vapor"}]}]}
+            for n in numbers
+        ]}
+
+
+def enricher(collection):
+    return PlanEnricher(collection, ConflictScanner().scan, lambda plan_data, calories, macros: {"dias": []},
+                        days_per_chunk=2)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_each_day_is_stored_as_a_version_and_the_plan_becomes_full():
+    plan = draft_plan()
+    collection = FakeCollection(plan)
+
+    assert run(enricher(collection).enrich(plan, Q_DATA, FakeModel().generate)) is True
+    stored = collection.document
+    # One version per day, one for the recommendations, one for the final stage
+    assert stored["version"] == 1 + 3 + 1 + 1
+    assert (stored["stage"], stored["enrichment"]["status"]) == ("full", "complete")
+    assert sorted(stored["enrichment"]["days"]) == [1, 2, 3]
+    option = stored["plan_data"]["dias"][2]["comidas"][0]["opciones"][0]
+    assert (option["sustituciones"], option["tip"]) == (["Pollo: tofu firme"], "Cocina al vapor")
+    assert stored["plan_data"]["recomendaciones_adicionales"] == {"sueno": "Duerme 8 horas"}
+    assert stored["validation"] == {"dias": [], "conflictos": []}
+
+
+def test_partial_failure_is_retried_without_the_days_already_enriched():
+    plan = draft_plan()
+    collection = FakeCollection(plan)
+    model = FakeModel(fail_days=[3])
+
+    assert run(enricher(collection).enrich(plan, Q_DATA, model.generate)) is False
+    stored = collection.document
+    assert (stored["stage"], sorted(stored["enrichment"]["days"])) == ("draft", [1, 2])
+    assert "sustituciones" not in stored["plan_data"]["dias"][2]["comidas"][0]["opciones"][0]
+
+    # The job retries with the stored plan
+    model.fail_days.clear()
+    model.requested.clear()
+    assert run(enricher(collection).enrich(copy.deepcopy(stored), Q_DATA, model.generate)) is True
+    assert model.requested == [[3]]
+    assert collection.document["stage"] == "full"
+
+
+def test_substitutions_with_an_allergen_are_dropped():
+    plan = draft_plan(days=1)
+    collection = FakeCollection(plan)
+
+    assert run(enricher(collection).enrich(plan, Q_DATA, FakeModel(substitution="Pollo: queso panela").generate))
+    option = collection.document["plan_data"]["dias"][0]["comidas"][0]["opciones"][0]
+    assert option["sustituciones"] == []
+    assert option["tip"] == "Cocina al vapor"
+    assert collection.document["validation"]["conflictos"] == []
+
+
+def test_misnumbered_days_are_matched_by_position():
+    plan = draft_plan()
+    collection = FakeCollection(plan)
+
+    # Numbered from 1 in every response, as strings
+    model = FakeModel(numbering=lambda number: str((number - 1) % 2 + 1))
+    assert run(enricher(collection).enrich(plan, Q_DATA, model.generate)) is True
+    assert sorted(collection.document["enrichment"]["days"]) == [1, 2, 3]
+
+
+def test_enriched_days_trust_only_distinct_numbers_of_the_chunk():
+    first, second = {"d": "4", "c": []}, {"d": 3, "c": []}
+    assert enriched_days([3, 4], {"enriquecidos": [first, second]}) == {4: first, 3: second}
+    assert enriched_days([3, 4], {"enriquecidos": [{"d": 1}, {"d": 1}]}) == {3: {"d": 1}, 4: {"d": 1}}
+    assert enriched_days([3, 4], {"enriquecidos": [{"d": "tres"}]}) == {3: {"d": "tres"}}
+    assert enriched_days([3], None) == {}
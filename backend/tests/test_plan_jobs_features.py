@@ -0,0 +1,146 @@
+"""
+Test suite for asynchronous weekly plan generation:
+- POST /api/meal-plans/generate enqueues a job and returns immediately
+- GET /api/meal-plans/jobs/{job_id} reports status until the plan is stored
+"""
+import pytest
+import requests
+import os
+import time
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Admin credentials (see test_admin_features.py), used to grant a subscription
+ADMIN_EMAIL = "bmi_test@test.com"
+ADMIN_PASSWORD = "Test123456"
+
+QUESTIONNAIRE = {
+    "nombre": "Usuario Jobs Test",
+    "edad": 32,
+    "fecha_nacimiento": "1993-03-10",
+    "sexo": "Femenino",
+    "estatura": 162,
+    "peso": 64,
+    "objetivo_principal": "Bajar de peso",
+    "dias_ejercicio": 3,
+    "alergias": [],
+    "vegetariano": False
+}
+
+
+def wait_for_job(job_id, headers, timeout=240):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = requests.get(f"{BASE_URL}/api/meal-plans/jobs/{job_id}", headers=headers)
+        assert response.status_code == 200, f"Job status failed: {response.text}"
+        job = response.json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(2)
+    pytest.fail(f"Job {job_id} did not finish in {timeout}s")
+
+
+class TestPlanJobs:
+    """Tests for queued plan generation"""
+
+    @pytest.fixture(scope="class")
+    def subscriber(self):
+        """Register a user, complete the questionnaire and grant a weekly subscription"""
+        email = f"test_jobs_{int(time.time())}@test.com"
+        response = requests.post(f"{BASE_URL}/api/auth/register", json={
+            "email": email,
+            "password": "testpass123",
+            "name": "Jobs Test User"
+        })
+        assert response.status_code == 200, f"Registration failed: {response.text}"
+        data = response.json()
+        headers = {"Authorization": f"Bearer {data['token']}"}
+
+        response = requests.post(f"{BASE_URL}/api/questionnaire", json=QUESTIONNAIRE, headers=headers)
+        assert response.status_code == 200
+
+        admin = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        if admin.status_code != 200:
+            pytest.skip("Admin user not available to grant a subscription")
+        response = requests.put(
+            f"{BASE_URL}/api/admin/users/{data['user']['id']}/subscription",
+            params={"subscription_type": "weekly", "days": 7},
+            headers={"Authorization": f"Bearer {admin.json()['token']}"}
+        )
+        if response.status_code != 200:
+            pytest.skip(f"Could not grant subscription: {response.text}")
+        return headers
+
+    def test_generate_requires_subscription(self):
+        """Users without a subscription cannot enqueue jobs"""
+        email = f"test_jobs_nosub_{int(time.time())}@test.com"
+        token = requests.post(f"{BASE_URL}/api/auth/register", json={
+            "email": email,
+            "password": "testpass123",
+            "name": "No Sub"
+        }).json()["token"]
+
+        response = requests.post(
+            f"{BASE_URL}/api/meal-plans/generate",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 403
+
+    def test_generate_returns_job_immediately(self, subscriber):
+        """POST returns a queued job instead of holding the request open"""
+        start = time.time()
+        response = requests.post(f"{BASE_URL}/api/meal-plans/generate", headers=subscriber)
+        elapsed = time.time() - start
+
+        assert response.status_code == 202, f"Expected 202, got {response.status_code}: {response.text}"
+        job = response.json()
+        assert job["id"]
+        assert job["status"] in ("queued", "running")
+        assert job["plan_type"] == "weekly"
+        assert elapsed < 5, f"Enqueue took {elapsed:.1f}s"
+        print(f"✓ Job {job['id']} enqueued in {elapsed:.2f}s")
+
+    def test_job_completes_with_single_plan(self, subscriber):
+        """The finished job points at exactly one stored plan"""
+        job = requests.post(f"{BASE_URL}/api/meal-plans/generate", headers=subscriber).json()
+        job = wait_for_job(job["id"], subscriber)
+
+        assert job["status"] == "completed", f"Job failed: {job.get('error')}"
+        assert job["plan_id"]
+
+        plan = requests.get(f"{BASE_URL}/api/meal-plans/{job['plan_id']}", headers=subscriber)
+        assert plan.status_code == 200
+        assert len(plan.json()["plan_data"]["dias"]) == 7
+
+        plans = requests.get(f"{BASE_URL}/api/meal-plans", headers=subscriber).json()
+        assert sum(1 for p in plans if p.get("job_id") == job["id"]) == 1
+        print(f"✓ Job {job['id']} produced plan {job['plan_id']}")
+
+    def test_job_status_not_found(self, subscriber):
+        response = requests.get(f"{BASE_URL}/api/meal-plans/jobs/non-existent-job", headers=subscriber)
+        assert response.status_code == 404
+
+    def test_job_event_stream(self, subscriber):
+        """SSE stream emits the days of the plan and ends with done"""
+        job = requests.post(f"{BASE_URL}/api/meal-plans/generate", headers=subscriber).json()
+
+        events = []
+        with requests.get(
+            f"{BASE_URL}/api/meal-plans/jobs/{job['id']}/events",
+            headers=subscriber,
+            stream=True,
+            timeout=300
+        ) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("event: "):
+                    events.append(line[len("event: "):])
+                    if events[-1] in ("done", "error"):
+                        break
+
+        assert events[-1] == "done", f"Stream ended with {events[-1]}"
+        print(f"✓ Job stream events: {events}")
@@ -0,0 +1,84 @@
+"""
+Unit tests for plan_json: incremental extraction of `dias` and tolerant parsing of LLM output
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plan_json import DayStreamParser, parse_json_response  # noqa: E402
+
+
+def sample_plan(days=7):
+    return {
+        "dias": [
+            {"dia": f"Día {i}", "comidas": [{"tipo": "Cena", "nombre": f'Tacos "{i}" {{}} [] \\\\ fin'}]}
+            for i in range(1, days + 1)
+        ],
+        "recomendaciones_adicionales": {"sueno": "7-8 horas"},
+        "guia_ejercicios": {"dias": [{"dia": "no es un día del plan"}]}
+    }
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+class TestDayStreamParser:
+    def test_emits_each_day_once_in_order(self):
+        text = json.dumps(sample_plan(), ensure_ascii=False, indent=2)
+        parser = DayStreamParser()
+        days = feed_in_chunks(parser, text, 5)
+        assert [d["dia"] for d in days] == [f"Día {i}" for i in range(1, 8)]
+        assert parser.days == days
+        assert parser.text == text
+
+    def test_day_available_before_response_ends(self):
+        text = json.dumps(sample_plan(), ensure_ascii=False)
+        first_day_end = text.index('"Día 2"')
+        parser = DayStreamParser()
+        assert len(parser.feed(text[:first_day_end])) == 1
+
+    def test_ignores_code_fences_and_nested_dias(self):
+        text = "```json\n" + json.dumps(sample_plan(3)) + "\n```"
+        parser = DayStreamParser()
+        days = feed_in_chunks(parser, text, 1)
+        assert len(days) == 3
+        assert all(d["dia"].startswith("Día") for d in days)
+
+    def test_truncated_day_is_not_emitted(self):
+        text = json.dumps(sample_plan(2), ensure_ascii=False)
+        cut = text.index('"Día 2"') + 10
+        parser = DayStreamParser()
+        assert len(parser.feed(text[:cut])) == 1
+
+
+class TestParseJsonResponse:
+    def test_extracts_object_from_prose_and_fences(self):
+        plan = sample_plan(2)
+        text = "Claro, aquí está tu plan:\n```json\n" + json.dumps(plan, ensure_ascii=False) + "\n```\n¡Buen provecho!"
+        assert parse_json_response(text) == plan
+
+    def test_repairs_trailing_commas_and_raw_newlines(self):
+        text = '{"dias": [{"dia": "Día 1", "comidas": [{"tipo": "Cena", "nombre": "Tacos\nde pollo"},]},], "x": 1,}'
+        plan = parse_json_response(text)
+        assert plan["dias"][0]["comidas"][0]["nombre"] == "Tacos\nde pollo"
+        assert plan["x"] == 1
+
+    def test_truncated_response_keeps_complete_days(self):
+        text = json.dumps(sample_plan(3), ensure_ascii=False)
+        cut = text[:text.index('"Día 3"') + 15]
+        plan = parse_json_response(cut)
+        assert [d["dia"] for d in plan["dias"]] == ["Día 1", "Día 2"]
+        with pytest.raises(ValueError):
+            parse_json_response(cut, allow_truncated=False)
+
+    def test_no_object_raises(self):
+        with pytest.raises(ValueError):
+            parse_json_response("Lo siento, no puedo ayudarte con eso")
@@ -0,0 +1,88 @@
+"""
+Unit tests for plan_prompts: compact per-user suffixes and the token budget report
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plan_prompts import (  # noqa: E402
+    PLAN_SYSTEM_MESSAGE, build_days_prompt, build_enrich_prompt, build_extras_prompt, build_profile_prompt,
+    count_tokens, prompt_budget,
+)
+
+MACROS = {"proteinas": 120, "carbohidratos": 180, "grasas": 60}
+
+
+def questionnaire(**overrides):
+    q_data = {"nombre": "Ana", "edad": 30, "sexo": "Femenino", "peso": 60, "estatura": 165,
+              "objetivo_principal": "Bajar de peso", "alergias": ["Ninguna"], "padecimientos": [],
+              "vegetariano": False, "fuma": False}
+    q_data.update(overrides)
+    return q_data
+
+
+class TestProfile:
+    def test_leaves_out_fields_with_nothing_to_report(self):
+        profile = build_profile_prompt(questionnaire(), 1800, MACROS)
+        assert profile.splitlines() == [
+            "PERFIL: 30 años, Femenino, 60 kg, 165 cm",
+            "OBJETIVO: Bajar de peso",
+            "META: 1800 kcal/día | proteínas 120g | carbohidratos 180g | grasas 60g",
+        ]
+
+    def test_lists_restrictions_and_never_the_name(self):
+        profile = build_profile_prompt(
+            questionnaire(alergias=["Lácteos"], vegetariano=True, alimentos_no_deseados=["Brócoli"],
+                          lesiones_restricciones=["Rodilla"], descripcion_lesion="Menisco"),
+            1800, MACROS,
+        )
+        assert "ALIMENTACIÓN: alergias: Lácteos; vegetariano; evitar: Brócoli" in profile
+        assert "SALUD: lesiones: Rodilla (Menisco)" in profile
+        assert "Ana" not in profile
+
+
+class TestRequests:
+    def test_days_prompt_is_a_short_suffix(self):
+        profile = build_profile_prompt(questionnaire(), 1800, MACROS)
+        prompt = build_days_prompt(profile, [3, 4])
+        assert prompt.startswith("GENERA: Días 3 a 4\n")
+        assert profile in prompt
+        assert count_tokens(prompt) < count_tokens(PLAN_SYSTEM_MESSAGE) / 4
+
+    def test_days_prompt_lists_only_missing_meals(self):
+        prompt = build_days_prompt("PERFIL", [2], {2: ["Cena"], 5: ["Snack"]}, {"Cena": 450})
+        assert "- Día 2: Cena (~450 kcal)" in prompt
+        assert "Día 5" not in prompt
+
+    def test_regeneration_prompt_lists_whole_days_with_their_problems(self):
+        every_meal = ["Desayuno", "Comida", "Snack", "Cena"]
+        first = build_days_prompt("PERFIL", [2], {2: every_meal})
+        meal_calories = {"Desayuno": 450, "Comida": 630, "Snack": 180, "Cena": 540}
+        prompt = build_days_prompt("PERFIL", [2], {2: every_meal}, meal_calories, {2: {"Cena": "contenía Lactosa"}})
+        assert prompt != first
+        assert "Cena (~540 kcal; antes: contenía Lactosa)" in prompt
+        assert "Desayuno (~450 kcal)" in prompt
+
+    def test_extras_prompt_states_water(self):
+        prompt = build_extras_prompt("PERFIL", questionnaire(peso=80))
+        assert prompt.startswith("RECOMENDACIONES\n") and prompt.endswith("AGUA MÍNIMA: 2.8L al día")
+
+    def test_enrich_prompt_lists_the_chosen_options(self):
+        day = {"comidas": [{"tipo": "Cena", "opciones": [{"nombre": "Tacos", "calorias": 450},
+                                                         {"nombre": "Sopa", "calorias": 380}]}]}
+        prompt = build_enrich_prompt("PERFIL", {4: day, 3: day})
+        assert prompt.splitlines() == [
+            "ENRIQUECE: Días 3 a 4", "PERFIL",
+            "Día 3", "- Cena: Tacos (450 kcal) | Sopa (380 kcal)",
+            "Día 4", "- Cena: Tacos (450 kcal) | Sopa (380 kcal)",
+        ]
+
+
+def test_prompt_budget_report():
+    report = prompt_budget(PLAN_SYSTEM_MESSAGE, "GENERA: Día 1", budget=10)
+    assert report["prefix_tokens"] == count_tokens(PLAN_SYSTEM_MESSAGE)
+    assert report["total_tokens"] == report["prefix_tokens"] + report["suffix_tokens"]
+    assert report["within_budget"] is False
+    # One system message for every section, long enough for the provider to cache
+    assert report["prefix_cacheable"] is True
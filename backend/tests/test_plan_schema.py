@@ -0,0 +1,36 @@
+"""
+Unit tests for plan_schema: compiled validation of LLM plan days
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("jsonschema")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plan_schema import day_errors, validated_days  # noqa: E402
+
+
+def weekly_day(**option_changes):
+    option = {"nombre": "Avena con plátano", "etiqueta": "Recomendado", "calorias": 330,
+              "ingredientes": [{"item": "Avena", "cantidad": "40g"}], "preparacion": ["Cocina la avena"]}
+    option.update(option_changes)
+    return {"dia": "Día 1", "comidas": [{"tipo": "Desayuno", "opciones": [option]}]}
+
+
+def test_weekly_and_trial_days_are_valid():
+    trial_day = {"dia": "Plan de Prueba", "comidas": [
+        {"tipo": "Cena", "nombre": "Ensalada", "ingredientes": ["lechuga", "atún"], "calorias": 400}]}
+    assert day_errors(weekly_day()) == []
+    assert day_errors(trial_day) == []
+
+
+def test_invalid_days_become_none_in_place():
+    no_ingredients = weekly_day(ingredientes=[])
+    unknown_meal = {"dia": "Día 3", "comidas": [{"tipo": "Merienda", "opciones": [weekly_day()["comidas"][0]]}]}
+    days = validated_days([weekly_day(), no_ingredients, "texto", unknown_meal])
+
+    assert days[0] == weekly_day()
+    assert days[1:] == [None, None, None]
+    assert any("ingredientes" in error for error in day_errors(no_ingredients))
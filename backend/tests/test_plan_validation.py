@@ -0,0 +1,68 @@
+"""
+Unit tests for ingredient quantity parsing and plan nutrition validation
+"""
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from food_db import FoodDatabase  # noqa: E402
+from ingredients import Quantity, parse_quantity, grams_for  # noqa: E402
+from plan_composer import PlanComposer  # noqa: E402
+from plan_validation import PlanValidator, meals_to_regenerate  # noqa: E402
+
+MACROS_1900 = {"proteinas": 140, "carbohidratos": 190, "grasas": 63}
+
+
+@pytest.fixture(scope="module")
+def validator():
+    return PlanValidator(FoodDatabase())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("150g", Quantity(150, "g", None)),
+    ("1/2 taza (40g)", Quantity(0.5, "taza", 40)),
+    ("1 1/2 piezas", Quantity(1.5, "pieza", None)),
+    ("3-4 gotas", Quantity(3.5, "gota", None)),
+    ("½ taza", Quantity(0.5, "taza", None)),
+    ("al gusto", Quantity(None, None, None)),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+
+def test_grams_for_units_and_pieces():
+    assert grams_for(parse_quantity("1/2 taza (40g)")) == 40
+    assert grams_for(parse_quantity("2 cdas")) == 30
+    assert grams_for(parse_quantity("2 piezas"), piece_grams=50) == 100
+    assert grams_for(parse_quantity("al gusto")) is None
+
+
+def test_composed_plan_is_within_tolerance(validator):
+    plan = {"dias": PlanComposer().compose_days(1900, MACROS_1900)}
+    report = validator.validate(plan, 1900, MACROS_1900)
+
+    assert len(report["dias"]) == 7
+    for day in report["dias"]:
+        assert day["cobertura"] >= 0.6
+        assert abs(day["desviacion"]["calorias"]) <= 0.15
+    assert report["max_desviacion_calorias"] <= 0.15
+
+
+def test_inflated_meal_is_flagged_for_regeneration(validator):
+    plan = {"dias": PlanComposer().compose_days(1900, MACROS_1900)}
+    plan = copy.deepcopy(plan)
+    cena = next(c for c in plan["dias"][2]["comidas"] if c["tipo"] == "Cena")
+    for option in cena["opciones"]:
+        for ingredient in option["ingredientes"]:
+            if isinstance(ingredient, dict):
+                ingredient["cantidad"] = "1 kg"
+
+    report = validator.validate(plan, 1900, MACROS_1900)
+    assert not report["dias"][2]["dentro_de_tolerancia"]
+    assert "Cena" in meals_to_regenerate(report, limit=8).get(3, [])
+    assert meals_to_regenerate(report, limit=0) == {}
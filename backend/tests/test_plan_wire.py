@@ -0,0 +1,83 @@
+"""
+Unit tests for plan_wire: expansion of the compact wire days into plan_data days
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plan_wire import apply_enrichment, compact_day, expand_day  # noqa: E402
+
+WIRE_DAY = {
+    "c": [{
+        "t": "Cena",
+        "o": [
+            {"n": "Tacos de pollo", "i": [["Tortilla de maíz", "3 piezas"], ["Pechuga de pollo", "120g"], ["Sal"]],
+             "p": ["Asa el pollo", "Arma los tacos"], "m": "15 min", "k": 450, "s": ["Pollo: tofu"], "x": "Usa limón"},
+            {"n": "Quesadillas", "i": [["Tortilla de maíz", "2 piezas"], "Queso Oaxaca"], "k": 420},
+            {"n": "Ensalada de atún", "i": [["Atún en agua", "1 lata"]], "k": 380},
+        ],
+    }]
+}
+
+
+def test_expands_keys_ingredients_and_labels():
+    day = expand_day(WIRE_DAY)
+    recommended, quick, cheap = day["comidas"][0]["opciones"]
+    assert day["comidas"][0]["tipo"] == "Cena"
+    assert recommended == {
+        "nombre": "Tacos de pollo",
+        "etiqueta": "Recomendado",
+        "ingredientes": [{"item": "Tortilla de maíz", "cantidad": "3 piezas"},
+                         {"item": "Pechuga de pollo", "cantidad": "120g"}, {"item": "Sal"}],
+        "preparacion": ["Asa el pollo", "Arma los tacos"],
+        "tiempo_prep": "15 min",
+        "calorias": 450,
+        "sustituciones": ["Pollo: tofu"],
+        "tip": "Usa limón",
+    }
+    assert (quick["etiqueta"], cheap["etiqueta"]) == ("Rápido", "Económico")
+    assert quick["ingredientes"][1] == "Queso Oaxaca"
+
+
+def test_enrichment_fills_options_by_meal_and_position():
+    day = expand_day({"c": [{"t": t["t"], "o": [{k: v for k, v in o.items() if k not in ("s", "x")} for o in t["o"]]}
+                            for t in WIRE_DAY["c"]]})
+    enriched = {"d": 1, "c": [
+        {"t": "Desayuno", "o": [{"s": ["Huevo: tofu"], "x": "Sin este tiempo de comida"}]},
+        {"t": "Cena", "o": [{"s": ["Pollo: tofu"], "x": "Usa limón"}, {"s": [], "x": " "}, {"x": "Sin queso extra"}]},
+    ]}
+    assert apply_enrichment(day, enriched) == 2
+    recommended, quick, cheap = day["comidas"][0]["opciones"]
+    assert (recommended["sustituciones"], recommended["tip"]) == (["Pollo: tofu"], "Usa limón")
+    assert "sustituciones" not in quick and "tip" not in quick
+    assert cheap["tip"] == "Sin queso extra" and cheap["nombre"] == "Ensalada de atún"
+    assert apply_enrichment(day, None) == 0
+
+
+def test_full_days_pass_through():
+    full = expand_day(WIRE_DAY)
+    assert expand_day(full) is full
+    assert expand_day("no es un día") == "no es un día"
+
+
+def test_round_trip_of_composed_days():
+    pytest.importorskip("numpy")
+    from plan_composer import PlanComposer
+
+    days = PlanComposer().compose_days(1800, {"proteinas": 120, "carbohidratos": 180, "grasas": 60})
+    for day in days:
+        wire = json.loads(json.dumps(compact_day(day)))
+        assert expand_day(wire)["comidas"] == day["comidas"]
+
+
+def test_prompt_example_expands_to_a_valid_day():
+    pytest.importorskip("jsonschema")
+    from plan_prompts import PLAN_SYSTEM_MESSAGE
+    from plan_schema import day_errors
+
+    example, _ = json.JSONDecoder().raw_decode(PLAN_SYSTEM_MESSAGE, PLAN_SYSTEM_MESSAGE.index('{\n  "dias"'))
+    assert day_errors(expand_day(example["dias"][0])) == []
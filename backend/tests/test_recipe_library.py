@@ -0,0 +1,53 @@
+"""
+Unit tests for recipe_library: normalization of plan options into library recipes
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recipe_library import (  # noqa: E402
+    extract_recipes, detect_allergens, is_vegetarian, user_allergens, aversion_keywords, parse_calories
+)
+
+
+def option(nombre, etiqueta, ingredientes, calorias=None):
+    return {
+        "nombre": nombre,
+        "etiqueta": etiqueta,
+        "ingredientes": [{"item": item, "cantidad": "1 porción"} for item in ingredientes],
+        "calorias": calorias
+    }
+
+
+def test_extract_recipes_deduplicates_across_days():
+    avena = option("Avena con Plátano", "Recomendado", ["Avena", "Leche descremada", "Plátano"], 350)
+    same_avena = option("avena con platano", "Recomendado", ["plátano", "avena", "leche descremada"], 350)
+    plan = {"dias": [
+        {"dia": "Día 1", "comidas": [{"tipo": "Desayuno", "opciones": [avena]}]},
+        {"dia": "Día 2", "comidas": [{"tipo": "Desayuno", "opciones": [same_avena]}]},
+        {"dia": "Día 3", "comidas": [{"tipo": "Desayuno", "nombre": "Formato anterior sin opciones"}]}
+    ]}
+
+    recipes = extract_recipes(plan)
+
+    assert len(recipes) == 1
+    assert recipes[0]["tipo"] == "Desayuno"
+    assert recipes[0]["etiqueta"] == "Recomendado"
+    assert recipes[0]["calorias"] == 350
+    assert recipes[0]["allergens"] == ["lactosa"]
+    assert recipes[0]["vegetarian"] is True
+
+
+def test_allergens_and_vegetarian_flag():
+    assert detect_allergens(["Huevos", "Pan integral", "Panela"]) == ["gluten", "huevo"]
+    assert detect_allergens(["Cacahuates tostados", "Camarones"]) == ["mani", "mariscos"]
+    assert is_vegetarian(["Tofu", "Arroz integral"]) is True
+    assert is_vegetarian(["Pechuga de pollo", "Brócoli"]) is False
+
+
+def test_user_restrictions_are_normalized():
+    assert user_allergens(["Maní", "Lactosa", "Ninguna"]) == ["lactosa", "mani"]
+    assert aversion_keywords(["Pimiento morrón", "hígado de res"]) == ["higado", "morron", "pimiento", "res"]
+    assert parse_calories("420 kcal") == 420
+    assert parse_calories(None) is None
@@ -0,0 +1,65 @@
+"""
+Unit tests for shopping_list: lista_super aggregated from the plan's ingredients
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from food_db import CATEGORIES, FoodDatabase  # noqa: E402
+from ingredients import parse_quantity  # noqa: E402
+from shopping_list import build_shopping_list  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def foods():
+    return FoodDatabase()
+
+
+def meal(tipo, *ingredientes):
+    return {"tipo": tipo, "opciones": [
+        {"nombre": tipo, "ingredientes": [{"item": i, "cantidad": c} for i, c in ingredientes]},
+        {"nombre": "Otra opción", "ingredientes": [{"item": "salmón", "cantidad": "1 kg"}]},
+    ]}
+
+
+def test_aggregates_first_options_by_food_and_category(foods):
+    plan = {"dias": [
+        {"dia": "Día 1", "comidas": [
+            meal("Desayuno", ("huevos", "2 piezas"), ("avena", "1/2 taza (40g)"), ("leche", "1 taza")),
+            meal("Comida", ("pechuga de pollo", "150g"), ("pollo", "200 g"), ("sal", "al gusto")),
+        ]},
+        {"dia": "Día 2", "comidas": [
+            meal("Desayuno", ("huevo", "1"), ("avena", "1/2 taza (40g)"), ("leche entera", "500 ml")),
+        ]},
+    ]}
+    lista = build_shopping_list(plan, foods)
+
+    assert list(lista) == [c for c in CATEGORIES if c in lista]
+    assert "Huevo 3 piezas" in lista["proteinas"]
+    assert "Pechuga de pollo 350g" in lista["proteinas"]
+    assert "Avena 80g" in lista["cereales"]
+    assert "Leche entera 740ml" in lista["lacteos"]
+    assert "Sal" in lista["basicos"]
+    # Only the first (Recomendado) option of each meal is bought
+    assert not any("salm" in item.lower() for items in lista.values() for item in items)
+
+
+def test_plain_string_meals_without_options(foods):
+    plan = {"dias": [{"dia": "Plan de Prueba", "comidas": [
+        {"tipo": "Desayuno", "nombre": "Avena", "ingredientes": ["avena", "plátano", "miel"]},
+    ]}]}
+    lista = build_shopping_list(plan, foods)
+
+    assert lista["cereales"] == ["Avena"]
+    assert lista["frutas"] == ["Plátano"]
+
+
+def test_parse_quantity_is_memoized():
+    parse_quantity.cache_clear()
+    parse_quantity("1 1/2 tazas")
+    parse_quantity("1 1/2 tazas")
+    assert parse_quantity.cache_info().hits == 1
@@ -17,6 +17,8 @@ import { Button } from '../components/ui/button';
 import { Progress } from '../components/ui/progress';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const PLAN_JOB_POLL_MS = 2000;
+const PLAN_JOB_MAX_POLLS = 150;
 
 const Dashboard = () => {
   const { user, refreshUser } = useAuth();
@@ -61,6 +63,67 @@ const Dashboard = () => {
     }
   };
 
+  // Follow the job's event stream, showing each day as soon as it is generated
+  const streamPlanJob = async (jobId) => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API}/meal-plans/jobs/${jobId}/events`, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    if (!response.ok || !response.body) throw new Error('Stream no disponible');
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const messages = buffer.split('\n\n');
+      buffer = messages.pop();
+
+      for (const message of messages) {
+        const event = message.match(/^event: (.*)$/m)?.[1];
+        const data = message.match(/^data: (.*)$/m)?.[1];
+        if (!event || !data) continue;
+        const payload = JSON.parse(data);
+
+        if (event === 'targets') {
+          setSelectedDay(0);
+          setCurrentPlan({ partial: true, ...payload, plan_data: { dias: [] }, recommendations: [] });
+        } else if (event === 'day') {
+          setCurrentPlan((prev) => {
+            const base = prev?.partial ? prev : { partial: true, plan_data: { dias: [] }, recommendations: [] };
+            // Day groups are generated in parallel, so keep the received days in plan order
+            const received = { ...base.receivedDays, [payload.index]: payload.day };
+            const dias = Object.keys(received)
+              .sort((a, b) => a - b)
+              .map((index) => received[index]);
+            return { ...base, receivedDays: received, plan_data: { ...base.plan_data, dias } };
+          });
+        } else if (event === 'done') {
+          return payload.plan_id;
+        } else if (event === 'error') {
+          const error = new Error(payload.detail);
+          error.jobFailed = true;
+          throw error;
+        }
+      }
+    }
+    throw new Error('Stream interrumpido');
+  };
+
+  // Plan generation runs as a background job; poll until it finishes
+  const waitForPlanJob = async (jobId) => {
+    for (let attempt = 0; attempt < PLAN_JOB_MAX_POLLS; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, PLAN_JOB_POLL_MS));
+      const { data: job } = await axios.get(`${API}/meal-plans/jobs/${jobId}`);
+      if (job.status === 'completed') return job.plan_id;
+      if (job.status === 'failed') throw new Error(job.error || 'Error al generar el plan');
+    }
+    throw new Error('La generación está tardando más de lo esperado, revisa tu historial en unos minutos');
+  };
+
   const generatePlan = async () => {
     if (!questionnaire) {
       toast.error('Primero completa el cuestionario');
@@ -76,12 +139,20 @@ const Dashboard = () => {
 
     setGenerating(true);
     try {
-      const response = await axios.post(`${API}/meal-plans/generate`);
+      const { data: job } = await axios.post(`${API}/meal-plans/generate`);
+      let planId;
+      try {
+        planId = await streamPlanJob(job.id);
+      } catch (streamError) {
+        if (streamError.jobFailed) throw streamError;
+        planId = await waitForPlanJob(job.id);
+      }
+      const response = await axios.get(`${API}/meal-plans/${planId}`);
       setCurrentPlan(response.data);
       toast.success('¡Plan generado exitosamente!');
       await refreshUser();
     } catch (error) {
-      const message = error.response?.data?.detail || 'Error al generar el plan';
+      const message = error.response?.data?.detail || error.message || 'Error al generar el plan';
       toast.error(message);
       if (error.response?.status === 403) {
         navigate('/precios');
@@ -537,7 +608,7 @@ const Dashboard = () => {
                   Plan de la Semana
                 </h2>
                 <div className="flex items-center gap-2">
-                  {currentPlan && (
+                  {currentPlan && !currentPlan.partial && (
                     <Button
                       variant="outline"
                       size="sm"
@@ -684,7 +755,7 @@ const Dashboard = () => {
                   <span className="text-sm font-medium">Registrar mi peso</span>
                   <ChevronRight className="w-4 h-4" />
                 </Link>
-                {currentPlan && (
+                {currentPlan && !currentPlan.partial && (
                   <>
                     <button
                       onClick={() => setShowPlanModal(true)}